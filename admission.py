@@ -0,0 +1,160 @@
+"""
+Допуск передач видео по бюджетам временного диска и памяти.
+"""
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+import metrics
+
+
+class AdmissionError(Exception):
+    """Передача не поместится в бюджет, даже если других передач не будет."""
+
+
+class Reservation:
+    """Зарезервированные для передачи место на диске и память."""
+
+    def __init__(self, controller: 'AdmissionController', disk: int, memory: int):
+        self.controller = controller
+        self.disk = disk
+        self.memory = memory
+
+    def release_memory(self):
+        """Освобождает память (место на диске остается за передачей)."""
+        if self.memory:
+            self.controller._release(0, self.memory)
+            self.memory = 0
+
+    def release(self):
+        """Освобождает все, что еще зарезервировано. Повторный вызов ничего не делает."""
+        if self.disk or self.memory:
+            self.controller._release(self.disk, self.memory)
+            self.disk = self.memory = 0
+
+
+class AdmissionController:
+    """
+    Бюджеты временного диска и памяти для передач, выполняемых одновременно.
+
+    Перед передачей резервируется место под временный файл (известен размер
+    видео) и память под буферы. Если бюджета не хватает, передача ждет,
+    пока другие передачи не освободят его; ожидающие допускаются строго по
+    очереди, чтобы большие видео не пропускали вперед бесконечно.
+    Запросы urgent (стадии, которые освобождают бюджет, например загрузка
+    уже скачанного файла) встают в начало очереди: иначе они могли бы ждать
+    передачу, которой не хватает места, занятого ими же.
+    Используется из одного цикла событий.
+    """
+
+    def __init__(self, disk_capacity: Optional[int] = None, memory_capacity: Optional[int] = None):
+        """
+        Args:
+            disk_capacity: байт временного диска для передач (None - без ограничения)
+            memory_capacity: байт памяти под буферы передач (None - без ограничения)
+        """
+        self.disk_capacity = disk_capacity
+        self.memory_capacity = memory_capacity
+        self.disk_reserved = 0
+        self.memory_reserved = 0
+        self._waiters = deque()
+        metrics.ADMISSION_RESERVED.set_function(lambda: self.disk_reserved, resource='disk')
+        metrics.ADMISSION_RESERVED.set_function(lambda: self.memory_reserved, resource='memory')
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._waiters), queue='admission')
+
+    @property
+    def waiting(self) -> int:
+        """Сколько передач ждут бюджета."""
+        return len(self._waiters)
+
+    def _fits(self, disk: int, memory: int) -> bool:
+        return (self.disk_capacity is None or self.disk_reserved + disk <= self.disk_capacity) and \
+            (self.memory_capacity is None or self.memory_reserved + memory <= self.memory_capacity)
+
+    def available(self, disk: int = 0, memory: int = 0, urgent: bool = False) -> bool:
+        """Будет ли передача допущена без ожидания."""
+        ahead = self._urgent_waiters() if urgent else len(self._waiters)
+        return not ahead and self._fits(disk, self._clamp_memory(memory))
+
+    def _urgent_waiters(self) -> int:
+        count = 0
+        for waiter in self._waiters:
+            if not waiter[3]:
+                break
+            count += 1
+        return count
+
+    def _clamp_memory(self, memory: int) -> int:
+        # Буферы больше всего бюджета допускаются, когда других передач нет
+        if self.memory_capacity is None:
+            return memory
+        return min(memory, self.memory_capacity)
+
+    def _grant(self, disk: int, memory: int) -> Reservation:
+        self.disk_reserved += disk
+        self.memory_reserved += memory
+        return Reservation(self, disk, memory)
+
+    def check(self, disk: int):
+        """
+        Проверяет, что место на диске вообще может быть выделено.
+
+        Raises:
+            AdmissionError: место больше всего бюджета диска
+        """
+        if self.disk_capacity is not None and disk > self.disk_capacity:
+            raise AdmissionError(
+                f"нужно {disk / (1024*1024):.0f} MB временного диска, "
+                f"доступно {self.disk_capacity / (1024*1024):.0f} MB"
+            )
+
+    async def reserve(self, disk: int = 0, memory: int = 0, urgent: bool = False) -> Reservation:
+        """
+        Резервирует место на диске и память, ожидая своей очереди.
+
+        Args:
+            urgent: встать в очередь перед обычными запросами
+
+        Raises:
+            AdmissionError: место на диске больше всего бюджета диска
+        """
+        self.check(disk)
+        if self.available(disk, memory, urgent=urgent):
+            return self._grant(disk, self._clamp_memory(memory))
+
+        future = asyncio.get_event_loop().create_future()
+        waiter = (future, disk, self._clamp_memory(memory), urgent)
+        if urgent:
+            self._waiters.insert(self._urgent_waiters(), waiter)
+        else:
+            self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Бюджет выдан одновременно с отменой
+                future.result().release()
+            else:
+                future.cancel()
+                self._wake()
+            raise
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started)
+
+    def _release(self, disk: int, memory: int):
+        self.disk_reserved -= disk
+        self.memory_reserved -= memory
+        self._wake()
+
+    def _wake(self):
+        """Допускает ожидающие передачи по порядку, пока им хватает бюджета."""
+        while self._waiters:
+            future, disk, memory, _ = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(disk, memory):
+                break
+            self._waiters.popleft()
+            future.set_result(self._grant(disk, memory))
@@ -0,0 +1,281 @@
+"""
+Имитация Google Drive API для бенчмарков: files().list/get/create/copy,
+пакетные запросы и resumable-загрузка с настраиваемой задержкой,
+пропускной способностью и долей ошибок.
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import urllib.parse
+from collections import Counter
+from typing import Dict, Optional, Tuple
+import httplib2
+from googleapiclient.discovery import build
+
+from google_drive_uploader import GoogleDriveUploader
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+UPLOAD_HOST = 'upload.fake-drive.local'
+
+
+def _response(status: int, headers: Optional[Dict] = None) -> httplib2.Response:
+    info = {'status': str(status)}
+    info.update(headers or {})
+    return httplib2.Response(info)
+
+
+def _json_response(status: int, payload: Dict) -> Tuple[httplib2.Response, bytes]:
+    return _response(status, {'content-type': 'application/json'}), json.dumps(payload).encode()
+
+
+def _error_response(status: int, message: str, reason: str = 'backendError') -> Tuple[httplib2.Response, bytes]:
+    return _json_response(status, {
+        'error': {'code': status, 'message': message, 'errors': [{'reason': reason, 'message': message}]}
+    })
+
+
+class FakeDriveHttp:
+    """
+    HTTP-бэкенд в памяти, подменяющий Google Drive для googleapiclient.
+
+    Содержимое загруженных файлов не хранится: для них считаются только
+    размер и MD5. Все обращения подсчитываются в calls по видам запросов.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, page_size: int = 1000,
+                 corrupt_rate: float = 0.0):
+        """
+        Args:
+            latency: задержка каждого запроса в секундах
+            bandwidth: скорость приема данных одной загрузки, байт/с (0 - без ограничения)
+            error_rate: доля запросов, завершающихся ответом 503
+            seed: начальное значение генератора ошибок
+            page_size: максимальный размер страницы files().list
+            corrupt_rate: доля загрузок, сохраняемых с искаженным MD5
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.corrupt_rate = corrupt_rate
+        self.page_size = page_size
+        self.calls = Counter()
+        self.files = {}
+        self._sessions = {}
+        self._next_id = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reset_calls(self):
+        """Обнуляет счетчики запросов (например, между прогонами сценария)."""
+        with self._lock:
+            self.calls.clear()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+
+    def _new_id(self, prefix: str) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"{prefix}{self._next_id}"
+
+    def _should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=1, connection_type=None):
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        if body is not None and hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode()
+
+        parsed = urllib.parse.urlparse(uri)
+        if parsed.path.endswith('/batch/drive/v3'):
+            self._count('batch')
+            if self.latency:
+                time.sleep(self.latency)
+            return self._batch(headers, body or b'')
+
+        if self.latency:
+            time.sleep(self.latency)
+        return self._dispatch(parsed, method, headers, body)
+
+    def _dispatch(self, parsed, method: str, headers: Dict, body: Optional[bytes]):
+        query = urllib.parse.parse_qs(parsed.query)
+        path = parsed.path
+
+        if parsed.netloc == UPLOAD_HOST:
+            return self._upload_chunk(path.rsplit('/', 1)[-1], headers, body)
+
+        if query.get('uploadType') == ['resumable'] and method == 'POST':
+            self._count('upload_start')
+            if self._should_fail():
+                return _error_response(503, 'Service unavailable')
+            session_id = self._new_id('s')
+            with self._lock:
+                self._sessions[session_id] = {
+                    'metadata': json.loads(body or b'{}'), 'size': 0,
+                    'md5': hashlib.md5(), 'file': None
+                }
+            return _response(200, {'location': f"https://{UPLOAD_HOST}/upload/{session_id}"}), b''
+
+        copy_match = re.match(r'.*/files/([^/]+)/copy$', path)
+        file_match = re.match(r'.*/files/([^/]+)$', path)
+
+        if path.endswith('/files') and method == 'GET':
+            self._count('list')
+        elif copy_match and method == 'POST':
+            self._count('copy')
+        elif path.endswith('/files') and method == 'POST':
+            self._count('create')
+        elif file_match and method == 'GET':
+            self._count('get')
+        elif file_match and method == 'PATCH':
+            self._count('update')
+        else:
+            return _error_response(400, f"Неподдерживаемый запрос {method} {path}", 'badRequest')
+
+        if self._should_fail():
+            return _error_response(503, 'Service unavailable')
+
+        if path.endswith('/files') and method == 'GET':
+            return self._list(query)
+        if copy_match:
+            source = self.files.get(copy_match.group(1))
+            if source is None:
+                return _error_response(404, 'File not found', 'notFound')
+            metadata = json.loads(body or b'{}')
+            return _json_response(200, self._create(
+                metadata, size=source.get('size'), md5=source.get('md5Checksum')
+            ))
+        if method == 'POST':
+            return _json_response(200, self._create(json.loads(body or b'{}')))
+
+        file = self.files.get(file_match.group(1))
+        if file is None:
+            return _error_response(404, 'File not found', 'notFound')
+        if method == 'PATCH':
+            with self._lock:
+                file.update(json.loads(body or b'{}'))
+        return _json_response(200, dict({'trashed': False}, **file))
+
+    def _create(self, metadata: Dict, size=None, md5: Optional[str] = None) -> Dict:
+        file = {'id': self._new_id('f'), 'name': metadata.get('name', ''),
+                'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+                'parents': metadata.get('parents', [])}
+        if size is not None:
+            file['size'] = str(size)
+        if md5 is not None:
+            file['md5Checksum'] = md5
+        with self._lock:
+            self.files[file['id']] = file
+        return file
+
+    def _list(self, query: Dict):
+        conditions = query.get('q', [''])[0]
+        names = re.findall(r"name='((?:[^'\\]|\\.)*)'", conditions)
+        parents = re.findall(r"'([^']*)' in parents", conditions)
+        folders_only = f"mimeType='{FOLDER_MIME_TYPE}'" in conditions
+
+        with self._lock:
+            files = [
+                file for file in self.files.values()
+                if all(file['name'] == name.replace("\\'", "'") for name in names)
+                and all(parent in file['parents'] for parent in parents)
+                and (not folders_only or file['mimeType'] == FOLDER_MIME_TYPE)
+                and not file.get('trashed', False)
+            ]
+
+        page_size = min(int(query.get('pageSize', [self.page_size])[0]), self.page_size)
+        start = int(query.get('pageToken', ['0'])[0])
+        result = {'files': files[start:start + page_size]}
+        if start + page_size < len(files):
+            result['nextPageToken'] = str(start + page_size)
+        return _json_response(200, result)
+
+    def _upload_chunk(self, session_id: str, headers: Dict, body: Optional[bytes]):
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            return _error_response(404, 'Upload session not found', 'notFound')
+
+        content_range = headers.get('content-range', '')
+        status_query = content_range.startswith('bytes */')
+        self._count('upload_status' if status_query else 'upload_chunk')
+
+        if session['file'] is not None:
+            return _json_response(200, session['file'])
+
+        if not status_query:
+            if self.bandwidth and body:
+                time.sleep(len(body) / self.bandwidth)
+            if self._should_fail():
+                return _error_response(503, 'Service unavailable')
+            match = re.match(r'bytes (\d+)-(\d+)/', content_range)
+            if match and int(match.group(1)) == session['size']:
+                session['md5'].update(body or b'')
+                session['size'] += len(body or b'')
+
+        total = content_range.rsplit('/', 1)[-1]
+        if total != '*' and session['size'] == int(total):
+            md5 = session['md5'].hexdigest()
+            with self._lock:
+                corrupt = self.corrupt_rate and self._random.random() < self.corrupt_rate
+            if corrupt:
+                md5 = hashlib.md5(md5.encode()).hexdigest()
+            session['file'] = self._create(session['metadata'], size=session['size'], md5=md5)
+            return _json_response(200, session['file'])
+
+        headers = {'range': f"bytes=0-{session['size'] - 1}"} if session['size'] else {}
+        return _response(308, headers), b''
+
+    def _batch(self, headers: Dict, body: bytes):
+        boundary = headers['content-type'].split('boundary=', 1)[1].strip('"')
+        parts = []
+        for part in body.decode().split(f"--{boundary}")[1:]:
+            if part.strip() in ('', '--'):
+                continue
+            part = part.replace('\r\n', '\n')
+            part_headers, _, inner = part.partition('\n\n')
+            content_id = re.search(r'Content-ID: <([^>]*)>', part_headers).group(1)
+            request_line, _, rest = inner.partition('\n')
+            method, path, _ = request_line.split(' ')
+            _, _, inner_body = rest.partition('\n\n')
+            self._count('batch_item')
+
+            parsed = urllib.parse.urlparse(f"https://www.googleapis.com{path}")
+            response, content = self._dispatch(parsed, method, {}, inner_body.strip().encode() or None)
+            parts.append(
+                f"--BATCH\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {response.status} {response.reason}\r\n"
+                f"Content-Type: application/json\r\n\r\n{content.decode()}\r\n"
+            )
+        content = (''.join(parts) + '--BATCH--').encode()
+        return _response(200, {'content-type': 'multipart/mixed; boundary=BATCH'}), content
+
+
+class FakeDriveUploader(GoogleDriveUploader):
+    """GoogleDriveUploader, работающий с FakeDriveHttp вместо Google Drive."""
+
+    def __init__(self, http: FakeDriveHttp, **kwargs):
+        self.http = http
+        self._fake_service = build('drive', 'v3', http=http, static_discovery=True)
+        super().__init__(**kwargs)
+
+    def _authenticate(self):
+        self.credentials = None
+        self._service = self._fake_service
+
+    def _new_http(self) -> FakeDriveHttp:
+        # Имитация потокобезопасна: все клиенты пула работают с одной
+        return self.http
@@ -0,0 +1,200 @@
+"""
+Имитация клиента Telegram для бенчмарков: синтетические сообщения с видео
+настраиваемого размера, задержка запросов, ограничение скорости и FloodWait.
+"""
+import random
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List, Optional
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.messages import SearchRequest
+from telethon.tl.types import InputMessagesFilterVideo
+
+
+# Размер страницы истории и части файла, как у настоящего клиента
+HISTORY_PAGE_SIZE = 100
+REQUEST_SIZE = 512 * 1024
+
+# Общий буфер для содержимого файлов, чтобы не выделять память на каждую часть
+_ZEROS = bytes(REQUEST_SIZE)
+
+
+class FakeDocument:
+    """Документ Telegram с видео."""
+
+    def __init__(self, document_id: int, size: int, mime_type: str = 'video/mp4'):
+        self.id = document_id
+        self.size = size
+        self.mime_type = mime_type
+        self.access_hash = 0
+
+
+class FakeMessage:
+    """Сообщение топика с видео-документом или текстовое (document=None)."""
+
+    def __init__(self, client: 'FakeTelegramClient', message_id: int, topic_id: int,
+                 document: Optional[FakeDocument]):
+        self.id = message_id
+        self.client = client
+        self.date = datetime.now(timezone.utc)
+        self.document = document
+        self.media = None
+        self.video = SimpleNamespace(mime_type=document.mime_type) if document else None
+        self.file = SimpleNamespace(size=document.size, ext='.mp4') if document else None
+        self.reply_to = SimpleNamespace(reply_to_msg_id=topic_id, reply_to_top_id=None)
+
+    def _finish_init(self, client, entities, input_chat):
+        """Как у сообщений Telethon, полученных сырым запросом."""
+
+    async def download_media(self, file: str):
+        with open(file, 'wb') as f:
+            async for chunk in self.client.iter_download(self.document):
+                f.write(chunk)
+        return file
+
+
+class FakeTelegramClient:
+    """
+    Клиент Telegram в памяти с методами, которые использует конвейер:
+    get_entity, iter_messages, get_messages, iter_download и поиск
+    messages.search по медиа-фильтру в топике.
+
+    Содержимое файла - нули с ID документа в начале, поэтому у разных
+    документов разный MD5. Все запросы подсчитываются в calls.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0.0,
+                 flood_wait_rate: float = 0.0, flood_wait_seconds: int = 1, seed: int = 0,
+                 shared_with: Optional['FakeTelegramClient'] = None):
+        """
+        Args:
+            latency: задержка каждого запроса в секундах
+            bandwidth: скорость скачивания аккаунта, байт/с, общая для всех
+                одновременных скачиваний (0 - без ограничения)
+            flood_wait_rate: доля запросов, на которые приходит FloodWait
+            flood_wait_seconds: длительность FloodWait в секундах
+            seed: начальное значение генератора FloodWait
+            shared_with: клиент другого аккаунта в тех же чатах (для пула аккаунтов)
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.calls = Counter()
+        self._chats = shared_with._chats if shared_with else {'messages': {}, 'documents': 0}
+        self._random = random.Random(seed)
+        # Когда канал аккаунта освободится от уже запрошенных частей
+        self._link_free_at = 0.0
+
+    def add_videos(self, chat_id: int, topic_id: int, sizes: List[int],
+                   chatter: int = 0) -> List[FakeMessage]:
+        """
+        Публикует в топике сообщения с видео указанных размеров.
+
+        Args:
+            chatter: сколько текстовых сообщений публикуется перед каждым видео
+        """
+        messages = self._chats['messages'].setdefault((chat_id, topic_id), [])
+        added = []
+        for size in sizes:
+            for _ in range(chatter):
+                self._chats['documents'] += 1
+                messages.append(FakeMessage(self, self._chats['documents'], topic_id, None))
+            self._chats['documents'] += 1
+            document = FakeDocument(self._chats['documents'], size)
+            added.append(FakeMessage(self, self._chats['documents'], topic_id, document))
+            messages.append(added[-1])
+        return added
+
+    def reset_calls(self):
+        """Обнуляет счетчики запросов (например, между прогонами сценария)."""
+        self.calls.clear()
+
+    async def _request(self, kind: str, size: int = 0):
+        self.calls[kind] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_wait_rate and self._random.random() < self.flood_wait_rate:
+            self.calls['flood_wait'] += 1
+            raise FloodWaitError(None, capture=self.flood_wait_seconds)
+        if self.bandwidth and size:
+            loop = asyncio.get_event_loop()
+            self._link_free_at = max(self._link_free_at, loop.time()) + size / self.bandwidth
+            await asyncio.sleep(self._link_free_at - loop.time())
+
+    async def get_entity(self, chat_id: int):
+        await self._request('get_entity')
+        return SimpleNamespace(id=chat_id, title=f"Fake chat {chat_id}")
+
+    async def get_input_entity(self, chat_id: int):
+        # Telethon берет входную сущность из кэша сессии без запроса
+        return chat_id
+
+    async def __call__(self, request):
+        if not isinstance(request, SearchRequest):
+            raise NotImplementedError(type(request).__name__)
+        await self._request('search')
+        # Все видео имитации отправлены как видео: другие фильтры их не находят
+        matched = [
+            message for message in self._chats['messages'].get((request.peer, request.top_msg_id), [])
+            if message.document and isinstance(request.filter, InputMessagesFilterVideo)
+        ]
+        # Как в Telegram: сообщения по убыванию ID, страница начинается с первого
+        # сообщения старше offset_id, сдвинутого на add_offset
+        newest_first = matched[::-1]
+        start = sum(1 for message in newest_first if message.id >= request.offset_id) + request.add_offset
+        page = newest_first[max(0, start):max(0, start + request.limit)]
+        return SimpleNamespace(
+            messages=[self._own(message) for message in page],
+            users=[], chats=[], count=len(matched)
+        )
+
+    async def iter_messages(self, chat_id: int, reply_to: Optional[int] = None,
+                            reverse: bool = False, min_id: int = 0, **kwargs):
+        messages = [
+            self._own(message) for message in self._chats['messages'].get((chat_id, reply_to), [])
+            if message.id > min_id
+        ]
+        if not reverse:
+            messages.reverse()
+        for start in range(0, len(messages), HISTORY_PAGE_SIZE):
+            await self._request('get_history')
+            for message in messages[start:start + HISTORY_PAGE_SIZE]:
+                yield message
+        if not messages:
+            await self._request('get_history')
+
+    async def get_messages(self, chat_id: int, ids):
+        # Как в Telethon: для списка ids - список сообщений (None для ненайденных)
+        await self._request('get_messages')
+        found = {}
+        for (chat, _), messages in self._chats['messages'].items():
+            if chat != chat_id:
+                continue
+            for message in messages:
+                found[message.id] = message
+        if isinstance(ids, list):
+            return [self._own(found[id_]) if id_ in found else None for id_ in ids]
+        return self._own(found[ids]) if ids in found else None
+
+    def _own(self, message: FakeMessage) -> FakeMessage:
+        """Сообщение, полученное этим клиентом."""
+        if message.client is self:
+            return message
+        topic_id = message.reply_to.reply_to_msg_id
+        return FakeMessage(self, message.id, topic_id, message.document)
+
+    async def iter_download(self, document: FakeDocument, offset: int = 0,
+                            request_size: int = REQUEST_SIZE, **kwargs):
+        header = document.id.to_bytes(8, 'big')
+        position = offset
+        while position < document.size:
+            size = min(request_size, document.size - position)
+            await self._request('get_file', size)
+            chunk = _ZEROS[:size] if size <= len(_ZEROS) else bytes(size)
+            if position < len(header):
+                chunk = (header[position:] + chunk[len(header) - position:])[:size]
+            yield chunk
+            position += size
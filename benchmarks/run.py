@@ -0,0 +1,395 @@
+"""
+Офлайн-бенчмарк конвейера на имитациях Telegram и Google Drive.
+
+Сценарии запускают ту же последовательность, что и download_videos():
+пакетная подготовка папок, подготовка каналов, сканирование топиков и
+передача через общий TransferPipeline. Каждый сценарий выполняется в
+отдельном процессе во временном каталоге, поэтому пиковый расход памяти
+(RSS) измеряется для каждого сценария отдельно.
+
+Запуск из корня репозитория:
+    python benchmarks/run.py
+    python benchmarks/run.py --scenario many_small --mode stream
+    python benchmarks/run.py --json baseline.json
+    python benchmarks/run.py --baseline baseline.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import contextlib
+from collections import Counter
+from typing import Dict, List, Tuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from scheduler import SCHEDULE_POLICIES
+
+MB = 1024 * 1024
+
+# Сценарии: число каналов, видео в канале и размер видео в байтах.
+# new_videos - сколько видео появится в каждом канале перед измеряемым
+# повторным запуском (инкрементальная синхронизация).
+SCENARIOS = {
+    'cold_start': {
+        'description': 'Первый запуск: пустая база и пустой Google Drive',
+        'channels': 4, 'videos': 10, 'size': 4 * MB
+    },
+    'incremental': {
+        'description': 'Повторный запуск после появления нескольких новых видео',
+        'channels': 4, 'videos': 50, 'size': 1 * MB, 'new_videos': 3
+    },
+    'large_files': {
+        'description': 'Несколько больших файлов в одном канале',
+        'channels': 1, 'videos': 3, 'size': 128 * MB
+    },
+    'many_small': {
+        'description': 'Много маленьких файлов в нескольких каналах',
+        'channels': 4, 'videos': 100, 'size': 256 * 1024
+    },
+}
+
+# Метрики для сравнения с базовым прогоном: (ключ, True если больше - лучше)
+COMPARED_METRICS = (
+    ('throughput_mb_s', True),
+    ('latency_p50', False),
+    ('latency_p99', False),
+    ('telegram_requests', False),
+    ('drive_requests', False),
+    ('peak_rss_mb', False),
+)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Пиковый расход памяти текущего процесса в MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    return peak / MB if platform.system() == 'Darwin' else peak / 1024
+
+
+async def sync_channels(clients: List, drive_http, channels: List[Tuple[int, int, str]],
+                        args) -> Tuple[Dict, List[float], float]:
+    """
+    Один запуск синхронизации всех каналов, как в download_videos().
+
+    Returns:
+        (суммарная статистика, задержки видео в секундах, длительность запуска)
+    """
+    import download_videos as dv
+    from fake_drive import FakeDriveUploader
+    from progress_store import DownloadProgress
+    from rate_limit import TokenBucket
+    from telegram_pool import TelegramSession, TelegramSessionPool
+
+    sessions = TelegramSessionPool([
+        TelegramSession(f"account{index + 1}", client, rate_limit=args.telegram_rate_limit)
+        for index, client in enumerate(clients)
+    ])
+    client = sessions.primary.client
+    progress = DownloadProgress(dv.PROGRESS_DB)
+    # Новый загрузчик на каждый запуск, как при перезапуске программы
+    drive_uploader = FakeDriveUploader(
+        drive_http,
+        chunk_min_size=args.upload_chunk_min_kb * 1024,
+        chunk_max_size=args.upload_chunk_max_mb * MB,
+        rate_limiter=TokenBucket(args.drive_rate_limit, burst=max(1, int(args.drive_rate_limit))),
+        pool_size=args.drive_pool_size or args.upload_workers + 4
+    )
+    pipeline = dv.TransferPipeline(
+        progress,
+        download_workers=args.download_workers,
+        upload_workers=args.upload_workers,
+        queue_size=args.queue_size,
+        transfer_mode=args.mode,
+        telegram_limiter=sessions.primary.limiter,
+        schedule_policy=args.schedule_policy,
+        sessions=sessions
+    )
+
+    # Задержка видео - от постановки в конвейер до завершения
+    latencies = []
+    submit = pipeline.submit
+
+    async def timed_submit(task):
+        submitted = time.monotonic()
+        task.done.add_done_callback(lambda _: latencies.append(time.monotonic() - submitted))
+        await submit(task)
+
+    pipeline.submit = timed_submit
+
+    started = time.monotonic()
+    pipeline.start()
+    syncs = [
+        dv.ChannelSync(client, chat_id, topic_id, folder_path, progress, pipeline,
+                       max_in_flight=args.per_channel_transfers)
+        for chat_id, topic_id, folder_path in channels
+    ]
+    try:
+        await asyncio.get_event_loop().run_in_executor(
+            None, drive_uploader.prefetch_folders, [sync.folder_path for sync in syncs]
+        )
+        await asyncio.gather(*(sync.prepare(drive_uploader) for sync in syncs))
+
+        async def process(sync):
+            await sync.scan()
+            await sync.wait()
+
+        await asyncio.gather(*(process(sync) for sync in syncs))
+    finally:
+        await pipeline.close()
+        progress.close()
+    elapsed = time.monotonic() - started
+
+    stats = {'video_count': 0, 'downloaded': 0, 'deduplicated': 0, 'skipped': 0}
+    for sync in syncs:
+        for key in stats:
+            stats[key] += sync.stats[key]
+    return stats, latencies, elapsed
+
+
+async def run_scenario(name: str, args) -> Dict:
+    """Выполняет сценарий в текущем каталоге и возвращает результаты измерений."""
+    import download_videos as dv
+    from fake_drive import FakeDriveHttp
+    from fake_telegram import FakeTelegramClient
+
+    spec = SCENARIOS[name]
+    dv.PARTIAL_DIR = os.path.join(os.getcwd(), 'partial')
+    dv.TASK_RETRY_DELAY = args.retry_delay
+    dv.DEDUP_MODE = 'copy'
+    dv.SCAN_MODE = args.scan_mode
+    # Параллельному скачиванию нужны настоящие соединения MTProto
+    dv.PARALLEL_DOWNLOAD_THRESHOLD = 0
+    dv.TEMP_DISK_RESERVE = 0
+    dv.TEMP_DISK_LIMIT = args.temp_disk_limit_mb * MB
+    dv.MEMORY_LIMIT = args.memory_limit_mb * MB
+
+    clients = []
+    for index in range(max(1, args.telegram_sessions)):
+        clients.append(FakeTelegramClient(
+            latency=args.telegram_latency,
+            bandwidth=args.telegram_bandwidth_mb * MB,
+            flood_wait_rate=args.flood_wait_rate,
+            flood_wait_seconds=args.flood_wait_seconds,
+            seed=args.seed + index,
+            shared_with=clients[0] if clients else None
+        ))
+    client = clients[0]
+    drive_http = FakeDriveHttp(
+        latency=args.drive_latency,
+        bandwidth=args.drive_bandwidth_mb * MB,
+        error_rate=args.drive_error_rate,
+        seed=args.seed,
+        corrupt_rate=args.drive_corrupt_rate
+    )
+
+    videos = max(1, int(spec['videos'] * args.scale))
+    channels = [(-1001000000000 - index, 1, f"Benchmark/{name}_{index}") for index in range(spec['channels'])]
+    for chat_id, topic_id, _ in channels:
+        client.add_videos(chat_id, topic_id, [spec['size']] * videos, chatter=args.chatter)
+
+    if spec.get('new_videos'):
+        # Первый запуск переносит историю и не измеряется
+        await sync_channels(clients, drive_http, channels, args)
+        for chat_id, topic_id, _ in channels:
+            client.add_videos(chat_id, topic_id, [spec['size']] * spec['new_videos'], chatter=args.chatter)
+        for telegram_client in clients:
+            telegram_client.reset_calls()
+        drive_http.reset_calls()
+
+    stats, latencies, elapsed = await sync_channels(clients, drive_http, channels, args)
+    telegram_calls = Counter()
+    for telegram_client in clients:
+        telegram_calls.update(telegram_client.calls)
+    transferred = (stats['downloaded'] + stats['deduplicated']) * spec['size']
+
+    return {
+        'scenario': name,
+        'files': stats['downloaded'] + stats['deduplicated'],
+        'skipped': stats['skipped'],
+        'failed': stats['video_count'] - stats['skipped'] - stats['downloaded'] - stats['deduplicated'],
+        'megabytes': round(transferred / MB, 2),
+        'seconds': round(elapsed, 3),
+        'throughput_mb_s': round(transferred / MB / elapsed, 2) if elapsed else 0.0,
+        'latency_p50': round(percentile(latencies, 0.5), 3),
+        'latency_p99': round(percentile(latencies, 0.99), 3),
+        'telegram_requests': sum(telegram_calls.values()),
+        'telegram_calls': dict(telegram_calls),
+        'drive_requests': sum(count for kind, count in drive_http.calls.items() if kind != 'batch_item'),
+        'drive_calls': dict(drive_http.calls),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def run_child(args):
+    """Выполняет один сценарий (в отдельном процессе) и сохраняет результат."""
+    random.seed(args.seed)
+    output = sys.stdout if args.verbose else open(os.devnull, 'w')
+    with contextlib.redirect_stdout(output):
+        result = asyncio.run(run_scenario(args.child, args))
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_isolated(name: str, argv: List[str]) -> Dict:
+    """Запускает сценарий в отдельном процессе во временном каталоге."""
+    with tempfile.TemporaryDirectory(prefix=f"tvd-bench-{name}-") as workdir:
+        result_file = os.path.join(workdir, 'result.json')
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *argv,
+             '--child', name, '--result-file', result_file],
+            cwd=workdir,
+            check=True
+        )
+        with open(result_file, encoding='utf-8') as f:
+            return json.load(f)
+
+
+def print_report(results: List[Dict]):
+    print(f"\n{'сценарий':<13} {'файлов':>7} {'MB':>8} {'сек':>8} {'MB/s':>8} "
+          f"{'p50, с':>8} {'p99, с':>8} {'Telegram':>9} {'Drive':>7} {'RSS, MB':>8}")
+    for result in results:
+        print(f"{result['scenario']:<13} {result['files']:>7} {result['megabytes']:>8} "
+              f"{result['seconds']:>8} {result['throughput_mb_s']:>8} "
+              f"{result['latency_p50']:>8} {result['latency_p99']:>8} "
+              f"{result['telegram_requests']:>9} {result['drive_requests']:>7} {result['peak_rss_mb']:>8}")
+    print()
+    for result in results:
+        drive_calls = ', '.join(f"{kind}={count}" for kind, count in sorted(result['drive_calls'].items()))
+        telegram_calls = ', '.join(f"{kind}={count}" for kind, count in sorted(result['telegram_calls'].items()))
+        print(f"{result['scenario']}: Telegram: {telegram_calls}")
+        print(f"{' ' * len(result['scenario'])}  Drive: {drive_calls}")
+        if result['failed']:
+            print(f"{' ' * len(result['scenario'])}  ⚠ Не обработано видео: {result['failed']}")
+
+
+def compare_with_baseline(results: List[Dict], baseline_file: str, tolerance: float) -> List[str]:
+    """
+    Сравнивает результаты с сохраненным прогоном.
+
+    Returns:
+        Описания метрик, ухудшившихся больше чем на tolerance
+    """
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = {result['scenario']: result for result in json.load(f)['results']}
+
+    regressions = []
+    for result in results:
+        base = baseline.get(result['scenario'])
+        if base is None:
+            continue
+        for key, higher_is_better in COMPARED_METRICS:
+            old, new = base.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{result['scenario']}.{key}: {old} → {new} ({change:+.0%})")
+    return regressions
+
+
+def parse_args(argv: List[str]):
+    parser = argparse.ArgumentParser(description='Офлайн-бенчмарк конвейера Telegram → Google Drive')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='сценарий (можно указать несколько раз; по умолчанию все)')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель числа видео в сценариях')
+    parser.add_argument('--seed', type=int, default=1, help='начальное значение генераторов случайных чисел')
+    parser.add_argument('--json', help='сохранить результаты в JSON-файл')
+    parser.add_argument('--baseline', help='сравнить с результатами из JSON-файла')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='допустимое ухудшение метрик относительно базового прогона (доля)')
+    parser.add_argument('--verbose', action='store_true', help='показывать вывод конвейера')
+
+    pipeline = parser.add_argument_group('конвейер')
+    pipeline.add_argument('--mode', choices=('file', 'stream'), default='file', help='TRANSFER_MODE')
+    pipeline.add_argument('--download-workers', type=int, default=2)
+    pipeline.add_argument('--upload-workers', type=int, default=2)
+    pipeline.add_argument('--queue-size', type=int, default=2)
+    pipeline.add_argument('--per-channel-transfers', type=int, default=2)
+    pipeline.add_argument('--schedule-policy', choices=SCHEDULE_POLICIES, default='newest', help='SCHEDULE_POLICY')
+    pipeline.add_argument('--scan-mode', choices=('filter', 'full'), default='filter', help='SCAN_MODE')
+    pipeline.add_argument('--upload-chunk-min-kb', type=int, default=256)
+    pipeline.add_argument('--upload-chunk-max-mb', type=int, default=32)
+    pipeline.add_argument('--telegram-rate-limit', type=float, default=30)
+    pipeline.add_argument('--drive-rate-limit', type=float, default=10)
+    pipeline.add_argument('--drive-pool-size', type=int, default=0,
+                          help='DRIVE_POOL_SIZE (0 - upload-workers + 4)')
+    pipeline.add_argument('--retry-delay', type=float, default=1, help='TASK_RETRY_DELAY в секундах')
+    pipeline.add_argument('--temp-disk-limit-mb', type=int, default=0, help='TEMP_DISK_LIMIT_MB (0 - без ограничения)')
+    pipeline.add_argument('--memory-limit-mb', type=int, default=512, help='MEMORY_LIMIT_MB (0 - без ограничения)')
+
+    telegram = parser.add_argument_group('имитация Telegram')
+    telegram.add_argument('--telegram-latency', type=float, default=0.02, help='задержка запроса, с')
+    telegram.add_argument('--telegram-bandwidth-mb', type=float, default=40, help='скорость скачивания аккаунта, MB/s')
+    telegram.add_argument('--flood-wait-rate', type=float, default=0.0, help='доля запросов с FloodWait')
+    telegram.add_argument('--flood-wait-seconds', type=int, default=1)
+    telegram.add_argument('--telegram-sessions', type=int, default=1, help='число аккаунтов (SESSION_STRINGS)')
+    telegram.add_argument('--chatter', type=int, default=0,
+                          help='текстовых сообщений в топике на каждое видео')
+
+    drive = parser.add_argument_group('имитация Google Drive')
+    drive.add_argument('--drive-latency', type=float, default=0.03, help='задержка запроса, с')
+    drive.add_argument('--drive-bandwidth-mb', type=float, default=25, help='скорость загрузки файла, MB/s')
+    drive.add_argument('--drive-error-rate', type=float, default=0.0, help='доля запросов с ответом 503')
+    drive.add_argument('--drive-corrupt-rate', type=float, default=0.0,
+                       help='доля загрузок с несовпадающим MD5 (проверка сверки)')
+
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    argv = sys.argv[1:]
+    args = parse_args(argv)
+    if args.child:
+        run_child(args)
+        return
+
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        print(f"▶ {name}: {SCENARIOS[name]['description']}", flush=True)
+        results.append(run_isolated(name, argv))
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'options': {key: value for key, value in vars(args).items()
+                            if key not in ('child', 'result_file', 'json', 'baseline')},
+                'results': results
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\n✓ Результаты сохранены в {args.json}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Ухудшение больше {args.tolerance:.0%} относительно {args.baseline}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"\n✓ Без ухудшений относительно {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
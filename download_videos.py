@@ -2,33 +2,159 @@
 Скрипт для скачивания видео из Telegram супергруппы и загрузки на Google Drive.
 """
 import os
-import sys
 import json
+import time
 import asyncio
+import argparse
 import tempfile
+import shutil
+import socket
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Optional
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-from telethon.tl.types import MessageMediaDocument, MessageMediaPhoto
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
-from google_drive_uploader import GoogleDriveUploader
+from admission import AdmissionController, AdmissionError, Reservation
+from integrity import IntegrityError, TransferChecksum, check_drive_file
+from progress_store import (
+    DownloadProgress, STATUS_UPLOADED, STATUS_FOUND_ON_DRIVE, STATUS_COPIED,
+    VERIFY_OK, VERIFY_SIZE, VERIFY_MISMATCH, VERIFY_MISSING
+)
+from stream_buffer import ChunkRingBuffer
+from rate_limit import TokenBucket, backoff_delay
+from scheduler import BacklogScheduler
+from telegram_pool import TelegramSession, TelegramSessionPool
+from work_queue import ITEM_PENDING, ITEM_LEASED, WorkItem, WorkQueue, open_work_queue
+import metrics
+
+# Telethon и Google API (telethon, google_drive_uploader, parallel_download,
+# topic_scan) импортируются там, где нужны: их загрузка занимает заметную
+# долю секунды, а команды вроде добавления канала без них обходятся
+if TYPE_CHECKING:
+    from google_drive_uploader import GoogleDriveUploader
 
 # Загружаем переменные окружения
 load_dotenv()
 
 # Конфигурация
-API_ID = int(os.getenv('API_ID'))
+# API_ID проверяется перед подключением к Telegram, а не при импорте
+API_ID = os.getenv('API_ID', '')
 API_HASH = os.getenv('API_HASH')
 SESSION_STRING = os.getenv('SESSION_STRING')
+# Дополнительные аккаунты Telegram (строки сессий через запятую): скачивание
+# видео распределяется между всеми аккаунтами, у каждого свой лимит
+# TELEGRAM_RATE_LIMIT и свой FloodWait. Аккаунты должны состоять в чатах
+SESSION_STRINGS = [value.strip() for value in os.getenv('SESSION_STRINGS', '').split(',') if value.strip()]
 
 # Файл конфигурации каналов
 CHANNELS_CONFIG_FILE = 'channels_config.json'
 
-# Файл для отслеживания прогресса
+# База для отслеживания прогресса и старый JSON-файл прогресса (для переноса)
+PROGRESS_DB = 'download_progress.db'
 PROGRESS_FILE = 'download_progress.json'
 
+# Параметры конвейера: число воркеров скачивания из Telegram, загрузки
+# на Google Drive и размер очередей между стадиями
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '2'))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '2'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+
+# Сколько каналов обрабатывается одновременно и сколько видео одного канала
+# может одновременно находиться в конвейере
+MAX_PARALLEL_CHANNELS = int(os.getenv('MAX_PARALLEL_CHANNELS', '6'))
+PER_CHANNEL_TRANSFERS = int(os.getenv('PER_CHANNEL_TRANSFERS', '2'))
+
+# Порядок передачи найденных видео: newest - сначала новые, smallest - сначала
+# маленькие, priority - по полю priority каналов в channels_config.json,
+# round_robin - по очереди из каждого канала, fifo - по порядку сообщений.
+# Файлы от LARGE_FILE_THRESHOLD_MB считаются большими: пока есть маленькие
+# видео, большие занимают не больше половины воркеров скачивания
+SCHEDULE_POLICY = os.getenv('SCHEDULE_POLICY', 'newest')
+LARGE_FILE_THRESHOLD = int(os.getenv('LARGE_FILE_THRESHOLD_MB', '500')) * 1024 * 1024
+
+# Режим передачи: 'file' - через временный файл, 'stream' - напрямую из Telegram
+# в Google Drive через буфер в памяти из STREAM_BUFFER_CHUNKS фрагментов
+TRANSFER_MODE = os.getenv('TRANSFER_MODE', 'file')
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE_KB', '1024')) * 1024
+STREAM_BUFFER_CHUNKS = int(os.getenv('STREAM_BUFFER_CHUNKS', '4'))
+
+# Размер фрагмента загрузки на Google Drive подбирается по скорости от
+# UPLOAD_CHUNK_MIN_KB до UPLOAD_CHUNK_MAX_MB (в потоковом режиме - не больше
+# STREAM_CHUNK_SIZE_KB). UPLOAD_CHUNK_FIXED_KB > 0 отключает подбор
+UPLOAD_CHUNK_MIN_SIZE = int(os.getenv('UPLOAD_CHUNK_MIN_KB', '256')) * 1024
+UPLOAD_CHUNK_MAX_SIZE = int(os.getenv('UPLOAD_CHUNK_MAX_MB', '32')) * 1024 * 1024
+UPLOAD_CHUNK_FIXED_SIZE = int(os.getenv('UPLOAD_CHUNK_FIXED_KB', '0')) * 1024 or None
+
+# Параллельное скачивание больших видео: файлы от PARALLEL_DOWNLOAD_THRESHOLD_MB
+# (0 - отключено) скачиваются частями по PARALLEL_DOWNLOAD_CONNECTIONS соединениям
+PARALLEL_DOWNLOAD_THRESHOLD = int(os.getenv('PARALLEL_DOWNLOAD_THRESHOLD_MB', '50')) * 1024 * 1024
+PARALLEL_DOWNLOAD_CONNECTIONS = int(os.getenv('PARALLEL_DOWNLOAD_CONNECTIONS', '4'))
+PARALLEL_DOWNLOAD_PART_SIZE = int(os.getenv('PARALLEL_DOWNLOAD_PART_KB', '1024')) * 1024
+
+# Незавершенные скачивания хранятся в TEMP_DIR (по умолчанию - системный
+# каталог временных файлов) и продолжаются после перезапуска.
+# Контрольная точка скачивания сохраняется каждые TRANSFER_CHECKPOINT_MB,
+# брошенные передачи удаляются через STALE_TRANSFER_DAYS дней
+TEMP_DIR = os.getenv('TEMP_DIR') or tempfile.gettempdir()
+PARTIAL_DIR = os.path.join(TEMP_DIR, 'telegram-video-downloader')
+TRANSFER_CHECKPOINT_BYTES = int(os.getenv('TRANSFER_CHECKPOINT_MB', '8')) * 1024 * 1024
+STALE_TRANSFER_DAYS = int(os.getenv('STALE_TRANSFER_DAYS', '7'))
+
+# Допуск передач: перед скачиванием видео резервируется место во временном
+# каталоге по размеру файла и память под буферы передачи. Видео, которым не
+# хватает места, ждут завершения других передач. Для временных файлов
+# доступно свободное место TEMP_DIR за вычетом TEMP_DISK_RESERVE_MB, но не
+# больше TEMP_DISK_LIMIT_MB (0 - без ограничения); под буферы - MEMORY_LIMIT_MB
+# (0 - без ограничения)
+TEMP_DISK_RESERVE = int(os.getenv('TEMP_DISK_RESERVE_MB', '1024')) * 1024 * 1024
+TEMP_DISK_LIMIT = int(os.getenv('TEMP_DISK_LIMIT_MB', '0')) * 1024 * 1024
+MEMORY_LIMIT = int(os.getenv('MEMORY_LIMIT_MB', '512')) * 1024 * 1024
+
+# Ограничение частоты запросов (в секунду, 0 - без ограничения) к Telegram и
+# Google Drive, общее для всех каналов и воркеров. Для Telegram запросом
+# считается и каждая часть скачиваемого файла. Видео, не переданные из-за
+# ошибки, повторяются в этом же запуске до TASK_RETRIES раз с растущей
+# паузой от TASK_RETRY_DELAY секунд (при FloodWait - сколько просит Telegram)
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '30'))
+DRIVE_RATE_LIMIT = float(os.getenv('DRIVE_RATE_LIMIT', '10'))
+TASK_RETRIES = int(os.getenv('TASK_RETRIES', '3'))
+TASK_RETRY_DELAY = int(os.getenv('TASK_RETRY_DELAY', '30'))
+
+# Сколько HTTP-соединений с Google Drive держится открытыми для загрузок и
+# запросов метаданных (по умолчанию - на 4 больше, чем UPLOAD_WORKERS)
+DRIVE_POOL_SIZE = int(os.getenv('DRIVE_POOL_SIZE', '0')) or UPLOAD_WORKERS + 4
+
+# Дедупликация репостов: если такое же видео (тот же документ Telegram или
+# тот же MD5 после скачивания) уже загружено, оно копируется на Google Drive
+# без повторной передачи. DEDUP_MODE: copy - копия файла, shortcut - ярлык,
+# off - отключено
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'copy')
+
+# Метрики: METRICS_PORT > 0 включает HTTP-эндпоинт /metrics на localhost,
+# сводка метрик сохраняется в METRICS_SUMMARY_FILE в конце запуска
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_SUMMARY_FILE = os.getenv('METRICS_SUMMARY_FILE', 'metrics_summary.json')
+
+# Сканирование топиков: filter - Telegram возвращает только видео и файлы
+# (серверный поиск в топике), full - перебираются все сообщения
+SCAN_MODE = os.getenv('SCAN_MODE', 'filter')
+
+# Режим наблюдения: как часто (в секундах) досканировать топики на случай
+# пропущенных событий о новых сообщениях
+WATCH_RESCAN_INTERVAL = int(os.getenv('WATCH_RESCAN_INTERVAL', '3600'))
+
+# Распределенный режим (--coordinator/--worker): адрес общей очереди
+# (путь к базе SQLite или 'схема://...'), срок аренды видео воркером в
+# секундах, число выдач видео до отметки неудачным, имя воркера и интервал
+# опроса очереди, когда она пуста
+WORK_QUEUE = os.getenv('WORK_QUEUE', 'work_queue.db')
+WORK_LEASE_SECONDS = int(os.getenv('WORK_LEASE_SECONDS', '300'))
+WORK_MAX_ATTEMPTS = int(os.getenv('WORK_MAX_ATTEMPTS', '3'))
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+WORK_POLL_INTERVAL = int(os.getenv('WORK_POLL_INTERVAL', '10'))
+
 
 class ChannelConfig:
     """Класс для работы с конфигурацией каналов."""
@@ -81,187 +207,1768 @@ class ChannelConfig:
         return True
 
 
-class DownloadProgress:
-    """Класс для отслеживания прогресса скачивания."""
+class VideoTask:
+    """Видео, ожидающее скачивания из Telegram и загрузки на Google Drive."""
+
+    def __init__(self, message, chat_id: int, topic_id: int, number: int,
+                 filename: str, mime_type: str,
+                 drive_uploader: 'GoogleDriveUploader', stats: Dict,
+                 folder_path: str = ''):
+        self.message = message
+        self.chat_id = chat_id
+        self.topic_id = topic_id
+        self.number = number
+        self.filename = filename
+        self.mime_type = mime_type
+        self.drive_uploader = drive_uploader
+        self.stats = stats
+        self.folder_path = folder_path
+        self.file_size_mb = message.file.size / (1024*1024) if message.file else 0
+        self.temp_filepath = None
+        # URI сессии загрузки на Drive, оставшейся от прерванного запуска
+        self.upload_session_uri = None
+        # Сколько раз видео уже ставилось в очередь повторно после ошибки
+        self.attempts = 0
+        # Аккаунт Telegram, через который скачивается видео (при пуле аккаунтов)
+        self.session = None
+        # Место во временном каталоге, зарезервированное до завершения видео
+        self.reservation = None
+        self.succeeded = False
+        # ID файла на Google Drive после успешной загрузки
+        self.drive_file_id = None
+        # MD5 и размер данных, вычисленные по ходу скачивания или потоковой передачи
+        self.checksum = None
+        # Результат сверки загруженного файла с Google Drive (VERIFY_*)
+        self.verified = None
+        # Завершается, когда видео обработано конвейером (успешно или с ошибкой)
+        self.done = asyncio.get_event_loop().create_future()
+
+    @property
+    def label(self) -> str:
+        """Короткая метка видео для вывода."""
+        if self.folder_path:
+            return f"{self.folder_path} #{self.number}"
+        return str(self.number)
+
+    @property
+    def size(self) -> int:
+        """Размер видео в байтах (0, если неизвестен)."""
+        return self.message.file.size if self.message.file else 0
+
+    @property
+    def document_id(self) -> Optional[int]:
+        """ID документа Telegram; у репостов одного файла он совпадает."""
+        return getattr(self.message.document, 'id', None)
+
+    def finish(self):
+        """
+        Отмечает задачу завершенной.
+
+        Временный файл удаляется только после успешной загрузки: частично
+        скачанный файл остается, чтобы продолжить передачу в следующий раз.
+        """
+        if self.succeeded:
+            self.remove_temp_file()
+        if not self.done.done():
+            self.done.set_result(None)
+
+    def remove_temp_file(self):
+        """Удаляет временный файл задачи, если он есть."""
+        if self.temp_filepath and os.path.exists(self.temp_filepath):
+            os.remove(self.temp_filepath)
+        self.temp_filepath = None
+
+
+class ScanWatermark:
+    """
+    Отметка обработанных сообщений канала (high-water mark).
+
+    Видео завершаются в конвейере не по порядку, поэтому отметка - это
+    последнее просканированное сообщение, перед которым нет незавершенных
+    или неудачных видео. Следующий запуск начнет сканирование после нее.
+    """
+
+    def __init__(self, start_id: int = 0):
+        self.last_scanned_id = start_id
+        self._open_ids = set()
+
+    def scanned(self, message_id: int):
+        """Отмечает сообщение как просмотренное при сканировании."""
+        self.last_scanned_id = max(self.last_scanned_id, message_id)
+
+    def started(self, message_id: int):
+        """Отмечает видео, отправленное в конвейер."""
+        self._open_ids.add(message_id)
+
+    def finished(self, message_id: int, succeeded: bool):
+        """Отмечает завершение видео; неудачные видео продолжают держать отметку."""
+        if succeeded:
+            self._open_ids.discard(message_id)
+
+    @property
+    def value(self) -> int:
+        if self._open_ids:
+            return min(self.last_scanned_id, min(self._open_ids) - 1)
+        return self.last_scanned_id
+
+
+class TransferPipeline:
+    """
+    Конвейер скачивания и загрузки видео.
+
+    Пул асинхронных воркеров скачивает видео из Telegram во временные файлы,
+    пул воркеров в потоках загружает их на Google Drive. Между стадиями стоят
+    ограниченные очереди: когда загрузка не успевает, скачивание
+    приостанавливается и не заполняет диск временными файлами.
+
+    В режиме 'stream' видео не сохраняется на диск: воркер скачивания
+    передает фрагменты из Telegram в загрузку на Google Drive через
+    ChunkRingBuffer.
+
+    Видео, на котором стадия завершилась ошибкой, возвращается в ее очередь
+    после паузы (до TASK_RETRIES раз), а передача продолжается с контрольной
+    точки. Запросы к Telegram ограничиваются общим telegram_limiter.
+
+    С пулом аккаунтов (sessions) каждое видео скачивается одним из
+    аккаунтов со своим ограничителем; аккаунт, получивший FloodWait,
+    выводится из ротации, и видео сразу переходит к другому аккаунту.
 
-    def __init__(self, progress_file: str):
-        self.progress_file = progress_file
-        self.downloaded_ids = {}  # Изменено на словарь {channel_key: set(message_ids)}
-        self.load_progress()
+    Если такое же видео уже загружено (см. DEDUP_MODE), оно копируется на
+    стороне Google Drive; одинаковые документы, пришедшие одновременно,
+    ждут завершения первого из них.
 
-    def load_progress(self):
-        """Загружает прогресс из файла."""
-        if os.path.exists(self.progress_file):
+    Поставленные видео сначала попадают в BacklogScheduler. Пока каналы
+    сканируются, очередь только собирается (кроме политики fifo), затем
+    видео передаются в порядке schedule_policy с учетом лимита видео
+    каждого канала.
+
+    Перед скачиванием видео AdmissionController резервирует место во
+    временном каталоге по размеру файла (до завершения видео) и память
+    под буферы стадии; видео, которому не хватает места, ждет.
+    """
+
+    def __init__(self, progress: DownloadProgress,
+                 download_workers: int = DOWNLOAD_WORKERS,
+                 upload_workers: int = UPLOAD_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 transfer_mode: str = TRANSFER_MODE,
+                 telegram_limiter: Optional[TokenBucket] = None,
+                 schedule_policy: str = SCHEDULE_POLICY,
+                 sessions: Optional[TelegramSessionPool] = None):
+        self.progress = progress
+        self.transfer_mode = transfer_mode
+        self.sessions = sessions
+        self.telegram_limiter = telegram_limiter or TokenBucket(
+            TELEGRAM_RATE_LIMIT, burst=max(1, int(TELEGRAM_RATE_LIMIT))
+        )
+        self.download_workers = max(1, download_workers)
+        self.upload_workers = max(1, upload_workers)
+        self.download_queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.upload_queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.scheduler = BacklogScheduler(
+            schedule_policy,
+            large_file_size=LARGE_FILE_THRESHOLD,
+            max_large=self.download_workers // 2
+        )
+        # Видео, поставленные в конвейер и еще не завершенные
+        self._pending = set()
+        # Сколько каналов сейчас сканируется (очередь еще собирается)
+        self._collecting = 0
+        self._backlog_changed = asyncio.Event()
+        self._executor = None
+        self._workers = []
+        self._retries = set()
+        self._documents_in_flight = {}
+        self._parallel_downloaders = {}
+        self.admission = None
+        # Место под временные файлы неудачных видео: {путь файла: резерв}
+        self._kept_reservations = {}
+
+    def start(self):
+        """Запускает воркеры конвейера."""
+        # Удаляем файлы передач, которые давно не продолжались
+        for transfer in self.progress.pop_stale_transfers(STALE_TRANSFER_DAYS):
+            if transfer['temp_path'] and os.path.exists(transfer['temp_path']):
+                os.remove(transfer['temp_path'])
+
+        self.admission = AdmissionController(
+            disk_capacity=self._temp_disk_capacity(),
+            memory_capacity=MEMORY_LIMIT or None
+        )
+
+        metrics.QUEUE_DEPTH.set_function(self.download_queue.qsize, queue='download')
+        metrics.QUEUE_DEPTH.set_function(self.upload_queue.qsize, queue='upload')
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._retries), queue='retry')
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self.scheduler), queue='backlog')
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.upload_workers,
+            thread_name_prefix='drive-upload'
+        )
+        self._workers = [
+            asyncio.ensure_future(self._dispatch_worker())
+        ] + [
+            asyncio.ensure_future(self._download_worker())
+            for _ in range(self.download_workers)
+        ] + [
+            asyncio.ensure_future(self._upload_worker())
+            for _ in range(self.upload_workers)
+        ]
+
+    def add_channel(self, chat_id: int, topic_id: int, max_in_flight: int = 0, priority: int = 0):
+        """
+        Регистрирует канал в очереди.
+
+        Args:
+            max_in_flight: сколько видео канала передается одновременно (0 - без ограничения)
+            priority: приоритет канала для политики priority (больше - раньше)
+        """
+        self.scheduler.add_channel((chat_id, topic_id), max_in_flight=max_in_flight, priority=priority)
+
+    @contextmanager
+    def collecting(self):
+        """Сканирование канала: пока оно идет, очередь только собирается."""
+        self._collecting += 1
+        try:
+            yield
+        finally:
+            self._collecting -= 1
+            self._backlog_changed.set()
+
+    async def submit(self, task: VideoTask):
+        """Ставит видео в очередь на передачу."""
+        self._pending.add(task)
+        task.done.add_done_callback(lambda _: self._task_done(task))
+        self.scheduler.push(
+            (task.chat_id, task.topic_id), task,
+            size=task.size,
+            timestamp=task.message.date.timestamp() if task.message.date else 0.0
+        )
+        self._backlog_changed.set()
+
+    def _task_done(self, task: VideoTask):
+        self._pending.discard(task)
+        self.scheduler.release(task)
+        self._backlog_changed.set()
+
+    async def _dispatch_worker(self):
+        """Передает видео из очереди в скачивание в порядке политики."""
+        while True:
+            task = None
+            if not self._collecting or self.scheduler.policy == 'fifo':
+                task = self.scheduler.pop()
+            if task is None:
+                self._backlog_changed.clear()
+                await self._backlog_changed.wait()
+                continue
             try:
-                with open(self.progress_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Преобразуем обратно в словарь с множествами
-                    self.downloaded_ids = {
-                        key: set(ids) for key, ids in data.get('downloaded_ids', {}).items()
-                    }
-                    total = sum(len(ids) for ids in self.downloaded_ids.values())
-                    print(f"✓ Загружен прогресс: {total} файлов уже скачано")
+                # Место под временный файл резервируется до того, как видео займет
+                # воркер скачивания: иначе воркеры, ждущие места, не дали бы
+                # скачать видео на повторе, которые это место уже держат
+                if not await self._reserve_disk(task):
+                    continue
+                await self.download_queue.put(task)
+            except asyncio.CancelledError:
+                task.finish()
+                raise
+
+    async def close(self):
+        """Дожидается обработки всех поставленных видео и останавливает воркеры."""
+        try:
+            # Видео, ожидающие повтора или своей очереди, тоже считаются незавершенными
+            while self._pending:
+                await asyncio.wait([task.done for task in list(self._pending)])
+        finally:
+            retries = list(self._retries)
+            for worker in retries + self._workers:
+                worker.cancel()
+            await asyncio.gather(*retries, *self._workers, return_exceptions=True)
+            self._workers = []
+
+            # При прерывании освобождаем видео, не дошедшие до конца конвейера
+            # (частично скачанные файлы остаются для продолжения)
+            for task in self.scheduler.drain():
+                task.finish()
+            for queue in (self.download_queue, self.upload_queue):
+                while not queue.empty():
+                    queue.get_nowait().finish()
+
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+            for downloader in self._parallel_downloaders.values():
+                await downloader.close()
+            self._parallel_downloaders = {}
+
+    def _temp_disk_capacity(self) -> Optional[int]:
+        """
+        Сколько байт временного каталога доступно передачам (None - без ограничения).
+
+        Уже скачанные части видео занимают место на диске, поэтому видео
+        резервирует только оставшуюся часть файла.
+        """
+        if self.transfer_mode == 'stream':
+            return None
+        os.makedirs(PARTIAL_DIR, exist_ok=True)
+        capacity = max(0, shutil.disk_usage(PARTIAL_DIR).free - TEMP_DISK_RESERVE)
+        if TEMP_DISK_LIMIT:
+            # Файлы параллельного скачивания разрежены: считаем выделенные блоки, а не размер
+            used = sum(entry.stat().st_blocks * 512 for entry in os.scandir(PARTIAL_DIR) if entry.is_file())
+            capacity = min(capacity, max(0, TEMP_DISK_LIMIT - used))
+        print(f"💾 Временные файлы: {PARTIAL_DIR} (доступно {capacity / (1024*1024):.0f} MB)")
+        return capacity
+
+    def _partial_path(self, task: VideoTask) -> str:
+        """Временный файл видео с постоянным именем, чтобы найти его после перезапуска."""
+        suffix = task.filename[task.filename.rfind('.'):]
+        return os.path.join(
+            PARTIAL_DIR, f"{task.chat_id}_{task.topic_id}_{task.message.id}{suffix}.part"
+        )
+
+    def _memory_need(self, task: VideoTask, stage: str) -> int:
+        """Сколько памяти занимают буферы передачи видео на стадии."""
+        if stage == 'upload':
+            # Файл загружается на Drive фрагментами, каждый читается в память целиком
+            chunk = UPLOAD_CHUNK_FIXED_SIZE or UPLOAD_CHUNK_MAX_SIZE
+            return min(task.size, chunk) if task.size else chunk
+        if self.transfer_mode == 'stream':
+            # Буфер между скачиванием и загрузкой и фрагмент, отправляемый на Drive
+            return (STREAM_BUFFER_CHUNKS + 1) * STREAM_CHUNK_SIZE
+        if PARALLEL_DOWNLOAD_THRESHOLD and task.size >= PARALLEL_DOWNLOAD_THRESHOLD:
+            # Скачиваемые части и столько же частей, ждущих учета в MD5
+            return 2 * PARALLEL_DOWNLOAD_CONNECTIONS * PARALLEL_DOWNLOAD_PART_SIZE
+        # Фрагмент iter_download в Telethon - не больше 512 KB
+        return 512 * 1024
+
+    async def _reserve_disk(self, task: VideoTask) -> bool:
+        """
+        Резервирует место под временный файл видео до завершения видео.
+
+        Returns:
+            False, если видео не поместится во временный каталог (видео завершено)
+        """
+        if self.transfer_mode == 'stream' or task.reservation is not None:
+            return True
+        path = self._partial_path(task)
+        # Видео уже завершалось неудачно, и его файл остался на диске вместе с местом
+        reservation = self._kept_reservations.pop(path, None)
+        if reservation is None:
+            reservation = await self._reserve_partial_file(task, path)
+            if reservation is None:
+                return False
+        task.reservation = reservation
+        task.done.add_done_callback(lambda _: self._release_disk(path, reservation))
+        return True
+
+    async def _reserve_partial_file(self, task: VideoTask, path: str) -> Optional[Reservation]:
+        """
+        Резервирует место под еще не скачанную часть временного файла.
+
+        Returns:
+            None, если видео не поместится во временный каталог (видео завершено)
+        """
+        checkpoint = self.progress.get_transfer(task.chat_id, task.topic_id, task.message.id) or {}
+        downloaded = 0
+        if checkpoint.get('temp_path') == path and checkpoint.get('total_size') == task.size \
+                and os.path.exists(path):
+            # Параллельное скачивание сразу создает файл полного размера, поэтому
+            # скачанный объем берется из контрольной точки, а не из размера файла
+            downloaded = checkpoint['downloaded_bytes']
+        disk = max(0, task.size - downloaded)
+
+        try:
+            self.admission.check(disk)
+        except AdmissionError as e:
+            print(f"❌ [{task.label}] Видео (ID: {task.message.id}) не помещается во временный каталог: {e}. "
+                  f"Укажите TEMP_DIR на диске побольше или TRANSFER_MODE=stream")
+            task.finish()
+            return None
+        if not self.admission.available(disk=disk):
+            print(f"⏸ [{task.label}] Ждем места на временном диске: {disk / (1024*1024):.0f} MB "
+                  f"(ожидают: {self.admission.waiting + 1})")
+        return await self.admission.reserve(disk=disk)
+
+    def _release_disk(self, path: str, reservation: Reservation):
+        """
+        Освобождает место завершенного видео.
+
+        Временный файл остается на диске, пока видео не завершено (в том числе
+        пока оно ждет повтора), а после неудачи - до следующего запуска, поэтому
+        место освобождается только вместе с файлом.
+        """
+        if os.path.exists(path):
+            self._kept_reservations[path] = reservation
+        else:
+            reservation.release()
+
+    async def _admit(self, task: VideoTask, stage: str) -> Reservation:
+        """Резервирует память под буферы стадии передачи видео."""
+        memory = self._memory_need(task, stage)
+        # Видео с местом на диске освобождает его, только когда завершится,
+        # поэтому его стадии не должны ждать за видео, ожидающими места
+        urgent = stage == 'upload' or task.reservation is not None
+
+        if not self.admission.available(memory=memory, urgent=urgent):
+            print(f"⏸ [{task.label}] Ждем памяти для передачи: {memory / (1024*1024):.1f} MB "
+                  f"(ожидают: {self.admission.waiting + 1})")
+        return await self.admission.reserve(memory=memory, urgent=urgent)
+
+    async def _download_worker(self):
+        """Скачивает видео из Telegram во временные файлы."""
+        while True:
+            task = await self.download_queue.get()
+            session = None
+            reservation = None
+            try:
+                if await self._deduplicate(task) or not self._claim_document(task):
+                    continue
+
+                reservation = await self._admit(task, 'download')
+                if self.sessions:
+                    session = await self._assign_session(task)
+                    session.active += 1
+                message = task.message
+
+                via = f" через {session.name}" if session and len(self.sessions) > 1 else ''
+                print(f"\n📥 [{task.label}] Скачиваем видео (ID: {message.id}){via}...")
+                print(f"   Дата: {message.date}")
+                if message.file:
+                    print(f"   Размер: {task.file_size_mb:.2f} MB")
+
+                started = time.monotonic()
+                if self.transfer_mode == 'stream':
+                    file_id = await self._stream_task(task)
+                    metrics.record_transfer('stream', task.size, time.monotonic() - started)
+                    await self._verify_upload(task, file_id)
+                    self._complete(task, file_id)
+                    task.finish()
+                    continue
+
+                await self._download_to_file(task)
+                metrics.record_transfer('download', task.size, time.monotonic() - started)
+                # Память буферов не должна оставаться занятой, пока видео ждет загрузки
+                reservation.release_memory()
+                await self.upload_queue.put(task)
+
+            except asyncio.CancelledError:
+                task.finish()
+                raise
+            except Exception as e:
+                print(f"❌ [{task.label}] Ошибка скачивания видео (ID: {task.message.id}): {e}")
+                if not self._retry_later(task, e, self.download_queue):
+                    task.finish()
+            finally:
+                if reservation:
+                    reservation.release_memory()
+                if session:
+                    session.active -= 1
+                self.download_queue.task_done()
+
+    async def _assign_session(self, task: VideoTask) -> TelegramSession:
+        """
+        Выбирает аккаунт для скачивания видео.
+
+        Документ нужно запрашивать у того аккаунта, который получил
+        сообщение, поэтому для другого аккаунта сообщение загружается заново.
+        Если аккаунту сообщение недоступно, видео скачивает аккаунт,
+        получивший его при сканировании.
+        """
+        from telethon.errors import FloodWaitError
+
+        session = self.sessions.choose(task.chat_id, key=task.message.id)
+        if task.message.client is not session.client:
+            await session.limiter.wait()
+            try:
+                message = await session.client.get_messages(task.chat_id, ids=task.message.id)
+            except FloodWaitError:
+                task.session = session
+                raise
             except Exception as e:
-                print(f"⚠ Ошибка загрузки прогресса: {e}")
-                self.downloaded_ids = {}
+                print(f"⚠ [{task.label}] Аккаунт {session.name} не может получить сообщение: {e}")
+                message = None
+            if message is None or not message.document:
+                session.unavailable_chats.add(task.chat_id)
+                session = self.sessions.session_for(task.message.client)
+            else:
+                task.message = message
+        task.session = session
+        return session
+
+    def _limiter(self, task: VideoTask) -> TokenBucket:
+        """Ограничитель запросов аккаунта, скачивающего видео."""
+        return task.session.limiter if task.session else self.telegram_limiter
+
+    def _retry_later(self, task: VideoTask, error: Exception, queue: asyncio.Queue) -> bool:
+        """
+        Возвращает видео в очередь стадии после паузы.
+
+        Returns:
+            False, если попытки исчерпаны и видео нужно считать неудачным
+        """
+        from telethon.errors import FloodWaitError
+
+        if task.attempts >= TASK_RETRIES:
+            return False
+        task.attempts += 1
+        metrics.RETRIES.inc(stage='upload' if queue is self.upload_queue else 'download')
+
+        if isinstance(error, FloodWaitError):
+            metrics.record_flood_wait(error.seconds)
+            # Telegram ограничил аккаунт: останавливаем все запросы к нему
+            delay = error.seconds
+            if task.session:
+                task.session.flood_wait(delay)
+                if self.sessions.has_healthy(task.chat_id):
+                    # Видео сразу скачает другой аккаунт
+                    delay = 0
+            else:
+                self.telegram_limiter.pause(delay)
         else:
-            print("ℹ Файл прогресса не найден, начинаем с начала")
+            delay = backoff_delay(task.attempts - 1, base=TASK_RETRY_DELAY, cap=TASK_RETRY_DELAY * 16)
+        print(f"↻ [{task.label}] Повтор {task.attempts}/{TASK_RETRIES} через {delay:.0f} с")
 
-    def save_progress(self):
-        """Сохраняет текущий прогресс в файл."""
+        self._schedule_requeue(task, queue, delay=delay)
+        return True
+
+    def _schedule_requeue(self, task: VideoTask, queue: asyncio.Queue,
+                          delay: float = 0, after: Optional[asyncio.Future] = None):
+        """Возвращает видео в очередь после паузы или после завершения другого видео."""
+        retry = asyncio.ensure_future(self._requeue(task, queue, delay, after))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, task: VideoTask, queue: asyncio.Queue, delay: float,
+                       after: Optional[asyncio.Future]):
         try:
-            with open(self.progress_file, 'w', encoding='utf-8') as f:
-                # Преобразуем множества в списки для JSON
-                data_to_save = {
-                    key: list(ids) for key, ids in self.downloaded_ids.items()
-                }
-                json.dump({
-                    'downloaded_ids': data_to_save,
-                    'last_update': datetime.now().isoformat()
-                }, f, indent=2, ensure_ascii=False)
+            if after is not None:
+                # asyncio.wait не отменяет чужой future при отмене ожидания
+                await asyncio.wait([after])
+            await asyncio.sleep(delay)
+            if queue is self.upload_queue:
+                # Загрузка продолжится с сессии, сохраненной в контрольной точке
+                checkpoint = self.progress.get_transfer(task.chat_id, task.topic_id, task.message.id) or {}
+                task.upload_session_uri = checkpoint.get('upload_session_uri')
+            await queue.put(task)
+        except asyncio.CancelledError:
+            task.finish()
+            raise
+
+    def _claim_document(self, task: VideoTask) -> bool:
+        """
+        Отмечает документ видео как передаваемый.
+
+        Returns:
+            False, если такой же документ уже передается: видео вернется в
+            очередь после его завершения и будет скопировано
+        """
+        document_id = task.document_id
+        if DEDUP_MODE == 'off' or document_id is None:
+            return True
+
+        first = self._documents_in_flight.setdefault(document_id, task)
+        if first is task:
+            task.done.add_done_callback(
+                lambda _: self._documents_in_flight.pop(document_id, None)
+                if self._documents_in_flight.get(document_id) is task else None
+            )
+            return True
+
+        print(f"⏳ [{task.label}] Такое же видео уже передается ({first.label}), ждем его")
+        self._schedule_requeue(task, self.download_queue, after=first.done)
+        return False
+
+    async def _deduplicate(self, task: VideoTask, md5: Optional[str] = None) -> bool:
+        """
+        Копирует на Google Drive уже загруженный такой же файл вместо передачи.
+
+        Без md5 файл ищется по ID документа Telegram (до скачивания),
+        с md5 - по содержимому скачанного файла.
+
+        Returns:
+            True, если видео обработано копированием
+        """
+        if DEDUP_MODE == 'off':
+            return False
+        if md5 is not None:
+            source = self.progress.find_document(md5=md5, size=task.size)
+        elif task.document_id is not None:
+            source = self.progress.find_document(document_id=task.document_id)
+        else:
+            source = None
+        if source is None:
+            return False
+
+        loop = asyncio.get_event_loop()
+        file_id = await loop.run_in_executor(
+            self._executor,
+            task.drive_uploader.copy_to_folder,
+            source['drive_file_id'],
+            task.filename,
+            DEDUP_MODE == 'shortcut'
+        )
+        if file_id is None:
+            # Исходный файл удален с Google Drive: передаем видео заново
+            self.progress.forget_drive_file(source['drive_file_id'])
+            return False
+
+        self._complete(task, file_id, source=source)
+        task.finish()
+        return True
+
+    def _download_checkpointer(self, task: VideoTask, offset: int):
+        """Возвращает функцию, сохраняющую контрольную точку скачивания."""
+        last_saved = offset
+
+        def save(downloaded: int):
+            nonlocal last_saved
+            if downloaded - last_saved >= TRANSFER_CHECKPOINT_BYTES or downloaded == task.size:
+                last_saved = downloaded
+                self.progress.save_transfer(
+                    task.chat_id, task.topic_id, task.message.id,
+                    downloaded_bytes=downloaded
+                )
+
+        return save
+
+    async def _file_checksum(self, filepath: str, length: int) -> TransferChecksum:
+        """Учитывает первые length байт файла в пуле потоков, не останавливая цикл событий."""
+        if not length:
+            return TransferChecksum()
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, TransferChecksum.from_file, filepath, length
+        )
+
+    async def _download_to_file(self, task: VideoTask):
+        """
+        Скачивает видео во временный файл, большие файлы - параллельно частями.
+
+        Если от прошлого запуска осталась контрольная точка, скачивание
+        продолжается с сохраненного смещения.
+        """
+        message = task.message
+        size = task.size
+        limiter = self._limiter(task)
+
+        os.makedirs(PARTIAL_DIR, exist_ok=True)
+        task.temp_filepath = self._partial_path(task)
+
+        checkpoint = self.progress.get_transfer(task.chat_id, task.topic_id, message.id) or {}
+        offset = 0
+        if checkpoint.get('temp_path') == task.temp_filepath and checkpoint.get('total_size') == size \
+                and os.path.exists(task.temp_filepath):
+            # Данные после последней контрольной точки могли не попасть на диск
+            offset = min(checkpoint['downloaded_bytes'], os.path.getsize(task.temp_filepath))
+            task.upload_session_uri = checkpoint.get('upload_session_uri')
+        else:
+            self.progress.save_transfer(
+                task.chat_id, task.topic_id, message.id,
+                temp_path=task.temp_filepath,
+                total_size=size,
+                downloaded_bytes=0,
+                upload_session_uri=None,
+                uploaded_bytes=0
+            )
+
+        if size and offset >= size:
+            print(f"✓ [{task.label}] Видео уже скачано ранее, переходим к загрузке")
+            task.checksum = await self._file_checksum(task.temp_filepath, size)
+            return
+        if offset:
+            print(f"↻ [{task.label}] Продолжаем скачивание с {offset / (1024*1024):.2f} MB")
+
+        on_progress = self._download_checkpointer(task, offset)
+
+        if PARALLEL_DOWNLOAD_THRESHOLD and message.document and size >= PARALLEL_DOWNLOAD_THRESHOLD:
+            from parallel_download import CdnRedirectError, ParallelDownloader
+
+            downloader = self._parallel_downloaders.get(message.client)
+            if downloader is None:
+                downloader = ParallelDownloader(
+                    message.client,
+                    connections=PARALLEL_DOWNLOAD_CONNECTIONS,
+                    part_size=PARALLEL_DOWNLOAD_PART_SIZE,
+                    rate_limiter=self._limiter(task)
+                )
+                self._parallel_downloaders[message.client] = downloader
+            # Скачивание продолжается с начала части, в которую попадает смещение
+            start = offset - offset % PARALLEL_DOWNLOAD_PART_SIZE
+            task.checksum = await self._file_checksum(task.temp_filepath, start)
+            task.checksum.max_pending = PARALLEL_DOWNLOAD_CONNECTIONS * PARALLEL_DOWNLOAD_PART_SIZE
+            try:
+                await downloader.download(
+                    message.document, task.temp_filepath, size,
+                    offset=offset, on_progress=on_progress, on_data=task.checksum.update_at
+                )
+                if task.checksum.overflowed:
+                    # Часть сильно отстала от остальных: MD5 считается по готовому файлу
+                    task.checksum = await self._file_checksum(task.temp_filepath, size)
+                self._check_downloaded(task)
+                return
+            except CdnRedirectError:
+                pass
+
+        if not message.document:
+            await message.download_media(file=task.temp_filepath)
+            # Размер без документа заранее неизвестен, MD5 считается по готовому файлу
+            task.checksum = await self._file_checksum(
+                task.temp_filepath, os.path.getsize(task.temp_filepath)
+            )
+            self._check_downloaded(task)
+            return
+
+        # Последовательное скачивание с дозаписью после смещения; MD5 считается
+        # по ходу записи, а ранее скачанное начало файла читается один раз
+        task.checksum = await self._file_checksum(task.temp_filepath, offset)
+        with open(task.temp_filepath, 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            downloaded = offset
+            flushed = offset
+            async for chunk in message.client.iter_download(message.document, offset=offset):
+                await limiter.wait()
+                f.write(chunk)
+                task.checksum.update(chunk)
+                downloaded += len(chunk)
+                # Контрольная точка не должна опережать данные, записанные на диск
+                if downloaded - flushed >= TRANSFER_CHECKPOINT_BYTES or downloaded == size:
+                    f.flush()
+                    flushed = downloaded
+                    on_progress(downloaded)
+
+        self._check_downloaded(task)
+
+    @staticmethod
+    def _check_downloaded(task: VideoTask):
+        """Сверяет размер скачанных данных с размером документа Telegram."""
+        if task.size and task.checksum.size != task.size:
+            raise IOError(f"Скачано {task.checksum.size} байт из {task.size}")
+
+    def _upload_checkpointer(self, task: VideoTask):
+        """Возвращает функцию, сохраняющую URI сессии и прогресс загрузки на Drive."""
+        def save(session_uri: str, uploaded: int):
+            self.progress.save_transfer(
+                task.chat_id, task.topic_id, task.message.id,
+                upload_session_uri=session_uri,
+                uploaded_bytes=uploaded
+            )
+
+        return save
+
+    async def _stream_task(self, task: VideoTask):
+        """
+        Передает видео из Telegram на Google Drive без временного файла.
+
+        Если от прошлого запуска осталась сессия загрузки, передача
+        продолжается с последнего подтвержденного Google Drive байта.
+        """
+        loop = asyncio.get_event_loop()
+        message = task.message
+        limiter = self._limiter(task)
+        buffer = ChunkRingBuffer(capacity=STREAM_BUFFER_CHUNKS * STREAM_CHUNK_SIZE)
+
+        resume_uri = None
+        offset = 0
+        checkpoint = self.progress.get_transfer(task.chat_id, task.topic_id, message.id) or {}
+        if task.size and checkpoint.get('upload_session_uri') and checkpoint.get('total_size') == task.size:
+            committed, file = await loop.run_in_executor(
+                self._executor,
+                task.drive_uploader.get_upload_status,
+                checkpoint['upload_session_uri'],
+                task.size
+            )
+            if file is not None:
+                # Загрузка завершилась в прошлом запуске: данные не передавались
+                task.checksum = TransferChecksum()
+                task.checksum.skip(task.size)
+                return file['id']
+            if committed is not None:
+                resume_uri = checkpoint['upload_session_uri']
+                offset = committed
+                print(f"↻ [{task.label}] Продолжаем передачу с {offset / (1024*1024):.2f} MB")
+        else:
+            self.progress.save_transfer(
+                task.chat_id, task.topic_id, message.id,
+                temp_path=None,
+                total_size=task.size,
+                downloaded_bytes=0,
+                upload_session_uri=None,
+                uploaded_bytes=0
+            )
+
+        upload = loop.run_in_executor(
+            self._executor,
+            functools.partial(
+                task.drive_uploader.upload_stream_to_folder,
+                stream=buffer,
+                filename=task.filename,
+                mime_type=task.mime_type,
+                size=message.file.size if message.file else None,
+                file_size_mb=task.file_size_mb,
+                chunksize=STREAM_CHUNK_SIZE,
+                resume_uri=resume_uri,
+                offset=offset,
+                on_progress=self._upload_checkpointer(task)
+            )
+        )
+
+        # Если загрузка упадет раньше скачивания, не даем скачиванию ждать места в буфере
+        upload.add_done_callback(
+            lambda future: buffer.abort(future.exception())
+            if not future.cancelled() and future.exception() else None
+        )
+
+        # Начало файла, подтвержденное Drive в прошлом запуске, через передачу
+        # не проходит: для такого видео сверяется только размер
+        task.checksum = TransferChecksum()
+        if offset:
+            task.checksum.skip(offset)
+
+        try:
+            async for chunk in message.client.iter_download(message.document, offset=offset):
+                await limiter.wait()
+                task.checksum.update(chunk)
+                await buffer.put(chunk)
+            buffer.close()
+        except BaseException as e:
+            buffer.abort(e)
+            await asyncio.gather(upload, return_exceptions=True)
+            # Если первой упала загрузка на Drive, показываем ее ошибку
+            upload_failed = not upload.cancelled() and upload.exception() is not None
+            if upload_failed and not isinstance(e, asyncio.CancelledError):
+                raise upload.exception()
+            raise
+
+        try:
+            return await upload
+        except BaseException:
+            buffer.abort()
+            raise
+
+    async def _verify_upload(self, task: VideoTask, file_id: str):
+        """
+        Сверяет загруженный файл с размером документа Telegram и MD5,
+        вычисленным при передаче, по метаданным ответа Google Drive.
+
+        Raises:
+            IntegrityError: файл не совпал; он перемещен в корзину, а
+                передача начнется заново
+        """
+        drive_file = (task.drive_uploader.folder_files or {}).get(task.filename)
+        if not drive_file or drive_file.get('id') != file_id:
+            loop = asyncio.get_event_loop()
+            files = await loop.run_in_executor(
+                self._executor, task.drive_uploader.get_files_metadata, [file_id]
+            )
+            drive_file = files[file_id]
+
+        checksum = task.checksum
+        task.verified, problem = check_drive_file(
+            drive_file,
+            size=task.size or (checksum.size if checksum else None),
+            md5=checksum.md5 if checksum else None
+        )
+        if task.verified:
+            metrics.VERIFICATIONS.inc(result=task.verified)
+        if task.verified not in (VERIFY_MISMATCH, VERIFY_MISSING):
+            return
+
+        print(f"⚠ [{task.label}] Файл на Google Drive не совпадает с видео (ID: {task.message.id}): {problem}")
+        if task.verified == VERIFY_MISMATCH:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self._executor, task.drive_uploader.trash_file, file_id)
+        # Следующая попытка загружает файл заново, а не продолжает сессию
+        self.progress.save_transfer(
+            task.chat_id, task.topic_id, task.message.id,
+            upload_session_uri=None,
+            uploaded_bytes=0
+        )
+        task.upload_session_uri = None
+        raise IntegrityError(problem)
+
+    def _complete(self, task: VideoTask, file_id: str, source: Optional[Dict] = None):
+        """
+        Сохраняет прогресс успешно загруженного видео.
+
+        Args:
+            source: найденный в индексе исходный файл, если видео скопировано
+        """
+        task.succeeded = True
+        task.drive_file_id = file_id
+        self.progress.delete_transfer(task.chat_id, task.topic_id, task.message.id)
+        self.progress.mark_downloaded(
+            task.chat_id, task.topic_id, task.message.id,
+            drive_file_id=file_id,
+            size=task.message.file.size if task.message.file else None,
+            status=STATUS_COPIED if source else STATUS_UPLOADED,
+            md5=source['md5'] if source else (task.checksum.md5 if task.checksum else None),
+            verified=task.verified
+        )
+
+        # Запоминаем файл для репостов; копии ссылаются на исходный файл
+        if source is None:
+            drive_file = (task.drive_uploader.folder_files or {}).get(task.filename, {})
+            source = {'drive_file_id': file_id, 'md5': drive_file.get('md5Checksum')}
+        if task.document_id is not None:
+            self.progress.save_document(
+                task.document_id, source['drive_file_id'],
+                md5=source['md5'], size=task.size or None
+            )
+
+        if source['drive_file_id'] != file_id:
+            task.stats['deduplicated'] += 1
+            metrics.VIDEOS.inc(channel=task.folder_path, result='copied')
+            print(f"♻ [{task.label}] Видео добавлено из уже загруженного файла без повторной передачи (ID: {task.message.id})")
+        else:
+            task.stats['downloaded'] += 1
+            metrics.VIDEOS.inc(channel=task.folder_path, result='uploaded')
+            print(f"✓ [{task.label}] Видео успешно загружено на Google Drive (ID: {task.message.id})")
+
+    async def _upload_worker(self):
+        """Загружает скачанные видео на Google Drive в отдельных потоках."""
+        loop = asyncio.get_event_loop()
+        while True:
+            task = await self.upload_queue.get()
+            reservation = None
+            try:
+                reservation = await self._admit(task, 'upload')
+                # Репост мог быть загружен заново, а не переслан: сверяем содержимое
+                # по MD5, вычисленному при скачивании, не перечитывая файл
+                if DEDUP_MODE != 'off':
+                    md5 = task.checksum.md5 if task.checksum else None
+                    if md5 is None:
+                        md5 = await loop.run_in_executor(self._executor, file_md5, task.temp_filepath)
+                    if await self._deduplicate(task, md5=md5):
+                        continue
+
+                started = time.monotonic()
+                file_id = await loop.run_in_executor(
+                    self._executor,
+                    functools.partial(
+                        task.drive_uploader.upload_to_folder,
+                        filepath=task.temp_filepath,
+                        filename=task.filename,
+                        mime_type=task.mime_type,
+                        file_size_mb=task.file_size_mb,
+                        resume_uri=task.upload_session_uri,
+                        on_progress=self._upload_checkpointer(task)
+                    )
+                )
+                metrics.record_transfer('upload', task.size, time.monotonic() - started)
+
+                await self._verify_upload(task, file_id)
+                self._complete(task, file_id)
+                task.finish()
+
+            except asyncio.CancelledError:
+                task.finish()
+                raise
+            except Exception as e:
+                print(f"❌ [{task.label}] Ошибка загрузки видео (ID: {task.message.id}): {e}")
+                if not self._retry_later(task, e, self.upload_queue):
+                    task.finish()
+            finally:
+                if reservation:
+                    reservation.release_memory()
+                self.upload_queue.task_done()
+
+
+def file_md5(filepath: str) -> str:
+    """Вычисляет MD5 файла (в том же виде, что md5Checksum в Google Drive)."""
+    md5 = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def get_video_info(message) -> Optional[Tuple[str, str]]:
+    """
+    Определяет, содержит ли сообщение видео.
+
+    Returns:
+        (имя файла, MIME-тип) для сообщения с видео или None
+    """
+    from telethon.tl.types import MessageMediaDocument
+
+    # Проверяем, есть ли видео в сообщении
+    if not (message.video or (message.media and isinstance(message.media, MessageMediaDocument))):
+        return None
+
+    is_video = False
+
+    if message.video:
+        is_video = True
+    elif hasattr(message.media, 'document'):
+        mime_type = message.media.document.mime_type
+        is_video = mime_type and mime_type.startswith('video/')
+
+    if not is_video:
+        return None
+
+    # Формируем имя файла
+    filename = f"video_{message.id}"
+    if message.file and message.file.ext:
+        filename += message.file.ext
+    else:
+        filename += ".mp4"
+
+    # Определяем MIME-тип
+    mime_type = 'video/mp4'
+    if message.video:
+        mime_type = message.video.mime_type or 'video/mp4'
+    elif hasattr(message.media, 'document'):
+        mime_type = message.media.document.mime_type or 'video/mp4'
+
+    return filename, mime_type
+
+
+def get_message_topic_id(message) -> Optional[int]:
+    """Возвращает ID топика форума, к которому относится сообщение."""
+    reply_to = message.reply_to
+    if reply_to is None:
+        return None
+    # Для ответа внутри топика ID топика лежит в reply_to_top_id,
+    # для обычного сообщения топика - в reply_to_msg_id
+    return getattr(reply_to, 'reply_to_top_id', None) or reply_to.reply_to_msg_id
+
+
+class ChannelSync:
+    """
+    Синхронизация одного топика Telegram с папкой на Google Drive.
+
+    Принимает сообщения топика (при сканировании истории или из событий
+    о новых сообщениях), отбирает новые видео и ставит их в общий конвейер,
+    ведя статистику и отметку обработанных сообщений канала.
+    """
+
+    def __init__(self, client, chat_id: int, topic_id: int, folder_path: str,
+                 progress: DownloadProgress, pipeline: TransferPipeline,
+                 max_in_flight: int = PER_CHANNEL_TRANSFERS, priority: int = 0):
+        self.client = client
+        self.chat_id = chat_id
+        self.topic_id = topic_id
+        self.folder_path = folder_path
+        self.progress = progress
+        self.pipeline = pipeline
+        self.drive_uploader = None
+        self.stats = {'video_count': 0, 'downloaded': 0, 'deduplicated': 0, 'skipped': 0}
+        # Сколько сообщений получено при сканировании и сколько из них видео
+        self.scan_stats = {'fetched': 0, 'matched': 0}
+        # Ограничение числа видео канала в передаче, чтобы один канал не занял все воркеры
+        pipeline.add_channel(chat_id, topic_id, max_in_flight=max(1, max_in_flight), priority=priority)
+        self._tasks = set()
+        self._active_ids = set()
+        # Сканировать ли через серверный фильтр медиа; сбрасывается, если он недоступен
+        self.media_filter = SCAN_MODE == 'filter'
+        self.watermark = ScanWatermark(progress.get_high_water_mark(chat_id, topic_id))
+        metrics.CHANNEL_BACKLOG.set_function(lambda: len(self._tasks), channel=folder_path)
+        self._saved_mark = self.watermark.value
+
+    async def prepare(self, drive_uploader: 'GoogleDriveUploader') -> bool:
+        """
+        Проверяет доступ к чату и готовит папку на Google Drive.
+
+        Returns:
+            True, если канал готов к обработке
+        """
+        print(f"\n{'='*60}")
+        print(f"📥 Обработка канала: {self.folder_path}")
+        print(f"   Chat ID: {self.chat_id}, Topic ID: {self.topic_id}")
+
+        # Получаем информацию о чате
+        try:
+            chat = await self.client.get_entity(self.chat_id)
+            print(f"✓ Найден чат: {getattr(chat, 'title', 'Unknown')}")
         except Exception as e:
-            print(f"⚠ Ошибка сохранения прогресса: {e}")
+            print(f"❌ Ошибка получения чата: {e}")
+            return False
+
+        # Загрузчик со своей папкой на Google Drive, чтобы не мешать другим каналам
+        loop = asyncio.get_event_loop()
+        self.drive_uploader = await loop.run_in_executor(None, drive_uploader.for_folder, self.folder_path)
+        return True
+
+    async def scan(self, full_rescan: bool = False):
+        """
+        Перебирает сообщения топика и ставит новые видео в конвейер.
+
+        Args:
+            full_rescan: сканировать топик с начала, игнорируя сохраненную отметку
+        """
+        from telethon.errors import FloodWaitError
+        from topic_scan import ScanStats, iter_topic_messages
+
+        # Продолжаем с последнего полностью обработанного сообщения
+        min_id = 0 if full_rescan else self._saved_mark
+        if min_id:
+            print(f"   {self.folder_path}: продолжаем после сообщения {min_id}")
+
+        # Итерируем по сообщениям в топике; после FloodWait продолжаем
+        # с последнего обработанного сообщения
+        limiter = self.pipeline.telegram_limiter
+        scan_stats = ScanStats(filtered=self.media_filter)
+        # Время получения истории без ожидания места в конвейере
+        fetch_seconds = 0.0
+        # Пока сканирование идет, видео только собираются в очередь,
+        # чтобы передавать их в порядке политики, а не по порядку сообщений
+        with self.pipeline.collecting():
+            while True:
+                try:
+                    fetch_started = time.monotonic()
+                    async for message in iter_topic_messages(
+                        self.client, self.chat_id, self.topic_id,
+                        min_id=min_id, limiter=limiter, stats=scan_stats
+                    ):
+                        fetch_seconds += time.monotonic() - fetch_started
+                        if get_video_info(message) is not None:
+                            scan_stats.matched += 1
+                        await self.handle_message(message)
+                        min_id = message.id
+                        fetch_started = time.monotonic()
+                    fetch_seconds += time.monotonic() - fetch_started
+                    break
+                except FloodWaitError as e:
+                    metrics.record_flood_wait(e.seconds)
+                    print(f"⏳ {self.folder_path}: Telegram просит подождать {e.seconds} с")
+                    limiter.pause(e.seconds)
+                    await limiter.wait()
+
+        self.media_filter = scan_stats.filtered
+        self.scan_stats['fetched'] += scan_stats.fetched
+        self.scan_stats['matched'] += scan_stats.matched
+        metrics.STAGE_SECONDS.observe(fetch_seconds, stage='scan')
+        metrics.SCAN_MESSAGES.inc(scan_stats.fetched, channel=self.folder_path, result='fetched')
+        metrics.SCAN_MESSAGES.inc(scan_stats.matched, channel=self.folder_path, result='matched')
+        print(f"🔎 {self.folder_path}: получено сообщений {scan_stats.fetched}, из них видео "
+              f"{scan_stats.matched} (запросов: {scan_stats.requests}"
+              f"{', серверный фильтр' if scan_stats.filtered else ''})")
+        self._save_watermark()
+
+    async def handle_message(self, message, scanned: bool = True):
+        """
+        Ставит видео из сообщения в конвейер, если оно еще не загружено.
+
+        Args:
+            scanned: сообщение получено сканированием истории по порядку.
+                Сообщения из событий не сдвигают отметку, пока до них не
+                дойдет сканирование.
+        """
+        if scanned:
+            self.watermark.scanned(message.id)
+
+        video_info = get_video_info(message)
+        if video_info is None or message.id in self._active_ids:
+            return
+        filename, mime_type = video_info
 
-    def get_channel_key(self, chat_id: int, topic_id: int) -> str:
-        """Создает уникальный ключ для канала."""
-        return f"{chat_id}_{topic_id}"
+        self.stats['video_count'] += 1
+        video_count = self.stats['video_count']
+
+        # Проверяем, был ли уже скачан (по локальной базе)
+        if self.progress.is_downloaded(self.chat_id, self.topic_id, message.id):
+            self.stats['skipped'] += 1
+            metrics.VIDEOS.inc(channel=self.folder_path, result='skipped')
+            print(f"⏭ [{self.folder_path} #{video_count}] Пропускаем уже загруженное видео (ID: {message.id}) - найдено в локальной базе")
+            return
 
-    def is_downloaded(self, chat_id: int, topic_id: int, message_id: int) -> bool:
-        """Проверяет, был ли уже скачан файл."""
-        channel_key = self.get_channel_key(chat_id, topic_id)
-        return message_id in self.downloaded_ids.get(channel_key, set())
+        # Проверяем, существует ли файл на Google Drive (по индексу папки)
+        if self.drive_uploader.file_exists_in_folder(filename):
+            self.stats['skipped'] += 1
+            metrics.VIDEOS.inc(channel=self.folder_path, result='skipped')
+            print(f"⏭ [{self.folder_path} #{video_count}] Пропускаем видео (ID: {message.id}) - файл '{filename}' уже есть на Google Drive")
+            # Добавляем в локальную базу, чтобы в следующий раз проверка была быстрее
+            drive_file = self.drive_uploader.folder_files.get(filename, {}) if self.drive_uploader.folder_files else {}
+            self.progress.mark_downloaded(
+                self.chat_id, self.topic_id, message.id,
+                drive_file_id=drive_file.get('id'),
+                status=STATUS_FOUND_ON_DRIVE
+            )
+            document_id = getattr(message.document, 'id', None)
+            if document_id is not None and drive_file.get('id'):
+                self.progress.save_document(
+                    document_id, drive_file['id'],
+                    md5=drive_file.get('md5Checksum'),
+                    size=int(drive_file['size']) if drive_file.get('size') else None
+                )
+            return
 
-    def mark_downloaded(self, chat_id: int, topic_id: int, message_id: int):
-        """Отмечает файл как скачанный."""
-        channel_key = self.get_channel_key(chat_id, topic_id)
-        if channel_key not in self.downloaded_ids:
-            self.downloaded_ids[channel_key] = set()
-        self.downloaded_ids[channel_key].add(message_id)
-        self.save_progress()
+        task = VideoTask(
+            message=message,
+            chat_id=self.chat_id,
+            topic_id=self.topic_id,
+            number=video_count,
+            filename=filename,
+            mime_type=mime_type,
+            drive_uploader=self.drive_uploader,
+            stats=self.stats,
+            folder_path=self.folder_path
+        )
+
+        # Ставим видео в очередь конвейера
+        self._active_ids.add(message.id)
+        self.watermark.started(message.id)
+        task.done.add_done_callback(lambda _, task=task: self._on_task_done(task))
+        self._tasks.add(task)
+        await self.pipeline.submit(task)
+
+    async def wait(self):
+        """Дожидается завершения всех видео канала, поставленных в конвейер."""
+        while self._tasks:
+            await asyncio.gather(*(task.done for task in list(self._tasks)))
+        self._save_watermark()
+
+    def _on_task_done(self, task: VideoTask):
+        if not task.succeeded:
+            metrics.VIDEOS.inc(channel=self.folder_path, result='failed')
+        self._tasks.discard(task)
+        self._active_ids.discard(task.message.id)
+        self.watermark.finished(task.message.id, task.succeeded)
+        self._save_watermark()
+
+    def _save_watermark(self):
+        if self.watermark.value > self._saved_mark:
+            self._saved_mark = self.watermark.value
+            self.progress.set_high_water_mark(self.chat_id, self.topic_id, self._saved_mark)
 
 
 async def download_channel_videos(client, chat_id: int, topic_id: int,
                                   folder_path: str, progress: DownloadProgress,
-                                  drive_uploader: GoogleDriveUploader) -> Dict:
+                                  drive_uploader: 'GoogleDriveUploader',
+                                  pipeline: Optional[TransferPipeline] = None,
+                                  max_in_flight: int = PER_CHANNEL_TRANSFERS,
+                                  full_rescan: bool = False) -> Dict:
     """
     Скачивает видео из одного канала.
 
+    Сообщения перебираются в текущей корутине, а скачивание и загрузка
+    выполняются параллельно в конвейере TransferPipeline. Если конвейер
+    не передан, создается собственный.
+
+    Args:
+        pipeline: общий конвейер для нескольких каналов (опционально)
+        max_in_flight: сколько видео канала одновременно находится в конвейере
+        full_rescan: сканировать топик с начала, игнорируя сохраненную отметку
+
     Returns:
         Словарь со статистикой загрузки
     """
-    print(f"\n{'='*60}")
-    print(f"📥 Обработка канала: {folder_path}")
-    print(f"   Chat ID: {chat_id}, Topic ID: {topic_id}")
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = TransferPipeline(progress)
+        pipeline.start()
+
+    sync = ChannelSync(client, chat_id, topic_id, folder_path, progress, pipeline, max_in_flight)
 
-    # Получаем информацию о чате
     try:
-        chat = await client.get_entity(chat_id)
-        print(f"✓ Найден чат: {getattr(chat, 'title', 'Unknown')}")
-    except Exception as e:
-        print(f"❌ Ошибка получения чата: {e}")
-        return {'video_count': 0, 'downloaded': 0, 'skipped': 0}
+        if await sync.prepare(drive_uploader):
+            await sync.scan(full_rescan=full_rescan)
+            await sync.wait()
+    finally:
+        if own_pipeline:
+            await pipeline.close()
 
-    # Устанавливаем папку на Google Drive
-    drive_uploader.set_folder(folder_path)
+    return sync.stats
 
-    video_count = 0
-    skipped_count = 0
-    downloaded_count = 0
 
-    # Итерируем по сообщениям в топике
-    async for message in client.iter_messages(
-        chat_id,
-        reply_to=topic_id,
-        reverse=True
-    ):
-        # Проверяем, есть ли видео в сообщении
-        if message.video or (message.media and isinstance(message.media, MessageMediaDocument)):
-            is_video = False
-
-            if message.video:
-                is_video = True
-            elif hasattr(message.media, 'document'):
-                mime_type = message.media.document.mime_type
-                is_video = mime_type and mime_type.startswith('video/')
-
-            if is_video:
-                video_count += 1
-
-                # Формируем имя файла
-                filename = f"video_{message.id}"
-                if message.file and message.file.ext:
-                    filename += message.file.ext
-                else:
-                    filename += ".mp4"
+async def watch_channels(client, syncs: List[ChannelSync],
+                         rescan_interval: int = WATCH_RESCAN_INTERVAL):
+    """
+    Режим наблюдения: новые видео из топиков сразу отправляются в конвейер.
 
-                # Проверяем, был ли уже скачан (по локальной базе)
-                if progress.is_downloaded(chat_id, topic_id, message.id):
-                    skipped_count += 1
-                    print(f"⏭ [{video_count}] Пропускаем уже загруженное видео (ID: {message.id}) - найдено в локальной базе")
-                    continue
+    Подписывается на события NewMessage выбранных чатов и раз в
+    rescan_interval секунд досканирует топики после сохраненной отметки,
+    чтобы не потерять сообщения, пропущенные при переподключении.
+    """
+    from telethon import events
 
-                # Проверяем, существует ли файл на Google Drive
-                if drive_uploader.file_exists_in_folder(filename):
-                    skipped_count += 1
-                    print(f"⏭ [{video_count}] Пропускаем видео (ID: {message.id}) - файл '{filename}' уже есть на Google Drive")
-                    # Добавляем в локальную базу, чтобы в следующий раз проверка была быстрее
-                    progress.mark_downloaded(chat_id, topic_id, message.id)
-                    continue
+    by_topic = {(sync.chat_id, sync.topic_id): sync for sync in syncs}
+    handlers = set()
 
-                # Определяем MIME-тип
-                mime_type = 'video/mp4'
-                if message.video:
-                    mime_type = message.video.mime_type or 'video/mp4'
-                elif hasattr(message.media, 'document'):
-                    mime_type = message.media.document.mime_type or 'video/mp4'
+    async def handle(sync: ChannelSync, message):
+        try:
+            await sync.handle_message(message, scanned=False)
+        except Exception as e:
+            print(f"❌ Ошибка обработки нового сообщения (ID: {message.id}): {e}")
+
+    async def on_new_message(event):
+        sync = by_topic.get((event.chat_id, get_message_topic_id(event.message)))
+        if sync is None:
+            return
+        # Не задерживаем обработку других обновлений, пока конвейер занят
+        handler = asyncio.ensure_future(handle(sync, event.message))
+        handlers.add(handler)
+        handler.add_done_callback(handlers.discard)
 
-                # Скачиваем видео во временный файл и загружаем на Google Drive
+    client.add_event_handler(
+        on_new_message,
+        events.NewMessage(chats=list({sync.chat_id for sync in syncs}))
+    )
+    print(f"\n👀 Режим наблюдения: ждем новые видео в {len(syncs)} топиках (Ctrl+C для выхода)")
+
+    try:
+        while client.is_connected():
+            await asyncio.sleep(rescan_interval)
+            for sync in syncs:
                 try:
-                    print(f"\n📥 [{video_count}] Обрабатываем видео (ID: {message.id})...")
-                    print(f"   Дата: {message.date}")
-                    file_size_mb = 0
-                    if message.file:
-                        file_size_mb = message.file.size / (1024*1024)
-                        print(f"   Размер: {file_size_mb:.2f} MB")
-
-                    # Создаем временный файл
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=filename[filename.rfind('.'):]) as temp_file:
-                        temp_filepath = temp_file.name
-
-                    try:
-                        # Скачиваем видео во временный файл
-                        await message.download_media(file=temp_filepath)
-
-                        # Загружаем на Google Drive
-                        drive_uploader.upload_to_folder(
-                            filepath=temp_filepath,
-                            filename=filename,
-                            mime_type=mime_type,
-                            file_size_mb=file_size_mb
-                        )
-
-                        progress.mark_downloaded(chat_id, topic_id, message.id)
-                        downloaded_count += 1
-
-                        print(f"✓ Видео успешно загружено на Google Drive")
-
-                    finally:
-                        # Удаляем временный файл
-                        if os.path.exists(temp_filepath):
-                            os.remove(temp_filepath)
+                    await sync.scan()
+                except Exception as e:
+                    print(f"❌ Ошибка досканирования канала {sync.folder_path}: {e}")
+    finally:
+        client.remove_event_handler(on_new_message)
+        for handler in list(handlers):
+            handler.cancel()
+
+
+class WorkQueueSink:
+    """
+    Замена конвейера для координатора распределенного режима: найденные
+    видео не передаются, а ставятся в общую очередь для воркеров.
+
+    Как и в TransferPipeline, пока каналы сканируются, видео собираются в
+    BacklogScheduler и попадают в очередь в порядке schedule_policy;
+    воркеры берут их по порядку постановки. Видео, поставленное в очередь,
+    считается обработанным: отметка канала сдвигается, и следующее
+    сканирование его не повторяет. Видео, которые воркеры не смогли
+    передать, координатор возвращает в очередь при запуске (retry_failed).
+    """
+
+    def __init__(self, work_queue: WorkQueue,
+                 schedule_policy: str = SCHEDULE_POLICY,
+                 telegram_limiter: Optional[TokenBucket] = None):
+        self.work_queue = work_queue
+        self.telegram_limiter = telegram_limiter or TokenBucket(
+            TELEGRAM_RATE_LIMIT, burst=max(1, int(TELEGRAM_RATE_LIMIT))
+        )
+        self.scheduler = BacklogScheduler(schedule_policy)
+        # Сколько видео добавлено в очередь за запуск
+        self.enqueued = 0
+        self._collecting = 0
+        self._flushes = set()
+
+    def start(self):
+        """Совместимость с TransferPipeline: воркеров у координатора нет."""
+
+    def add_channel(self, chat_id: int, topic_id: int, max_in_flight: int = 0, priority: int = 0):
+        """Регистрирует канал (лимит видео в передаче соблюдают воркеры)."""
+        self.scheduler.add_channel((chat_id, topic_id), priority=priority)
+
+    @contextmanager
+    def collecting(self):
+        """Сканирование канала: пока оно идет, видео только собираются."""
+        self._collecting += 1
+        try:
+            yield
+        finally:
+            self._collecting -= 1
+            if not self._collecting:
+                self._schedule_flush()
+
+    async def submit(self, task: VideoTask):
+        """Добавляет видео в очередь воркеров."""
+        self.scheduler.push(
+            (task.chat_id, task.topic_id), task,
+            size=task.size,
+            timestamp=task.message.date.timestamp() if task.message.date else 0.0
+        )
+        # Видео из событий о новых сообщениях ставятся в очередь сразу
+        if not self._collecting:
+            await self.flush()
+
+    def _schedule_flush(self):
+        flush = asyncio.ensure_future(self.flush())
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Переносит собранные видео в общую очередь в порядке политики."""
+        tasks = []
+        while True:
+            task = self.scheduler.pop()
+            if task is None:
+                break
+            # Лимиты каналов здесь не нужны: видео сразу уходит в очередь
+            self.scheduler.release(task)
+            tasks.append(task)
+        if not tasks:
+            return
+
+        items = [
+            WorkItem(task.chat_id, task.topic_id, task.message.id, task.folder_path,
+                     task.filename, task.mime_type, size=task.size)
+            for task in tasks
+        ]
+        try:
+            added = await asyncio.get_event_loop().run_in_executor(None, self.work_queue.enqueue, items)
+            self.enqueued += added
+            print(f"📬 В очередь воркеров добавлено видео: {added} (из {len(items)} найденных)")
+            for task in tasks:
+                task.succeeded = True
+        except Exception as e:
+            print(f"❌ Ошибка постановки видео в очередь: {e}")
+        finally:
+            for task in tasks:
+                task.finish()
+
+    async def close(self):
+        """Дожидается постановки собранных видео в очередь."""
+        while self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+        await self.flush()
 
+
+class QueueWorker:
+    """
+    Воркер распределенного режима: берет видео из общей очереди в аренду,
+    передает их через TransferPipeline и подтверждает.
+
+    Пока видео передаются, аренда продлевается каждые lease_seconds / 3
+    секунд. Видео, которое уже есть в локальной базе или в папке на Google
+    Drive, подтверждается без повторной передачи: так безопасно
+    обрабатывается видео, воркер которого пропал после загрузки, но до
+    подтверждения. При остановке воркера взятые видео возвращаются в
+    очередь по истечении аренды.
+    """
+
+    def __init__(self, work_queue: WorkQueue, pipeline: TransferPipeline, client,
+                 progress: DownloadProgress, drive_uploader: 'GoogleDriveUploader',
+                 worker_id: str = WORKER_ID,
+                 lease_seconds: float = WORK_LEASE_SECONDS,
+                 poll_interval: float = WORK_POLL_INTERVAL):
+        self.work_queue = work_queue
+        self.pipeline = pipeline
+        self.client = client
+        self.progress = progress
+        self.drive_uploader = drive_uploader
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # Сколько видео воркер держит одновременно: столько, чтобы конвейер не простаивал
+        self.capacity = pipeline.download_workers * 2 + pipeline.upload_workers
+        self.stats = {'video_count': 0, 'downloaded': 0, 'deduplicated': 0, 'skipped': 0, 'failed': 0}
+        # Видео в аренде: {ключ видео: корутина обработки}
+        self._held = {}
+        # Загрузчики папок Google Drive: {путь папки: future загрузчика}
+        self._uploaders = {}
+        self._channels = set()
+
+    async def run(self, watch: bool = False):
+        """
+        Обрабатывает видео из очереди.
+
+        Args:
+            watch: не завершаться, когда очередь опустела, а ждать новые видео
+        """
+        loop = asyncio.get_event_loop()
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        try:
+            while True:
+                items = []
+                free = self.capacity - len(self._held)
+                if free > 0:
+                    items = await loop.run_in_executor(
+                        None, self.work_queue.claim, self.worker_id, free, self.lease_seconds
+                    )
+                    if items:
+                        await self._start(items)
+
+                if self._held:
+                    await asyncio.wait(
+                        list(self._held.values()),
+                        timeout=self.poll_interval,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                elif not items:
+                    # Видео в аренде у других воркеров вернутся в очередь, если те пропадут
+                    if not watch:
+                        counts = await loop.run_in_executor(None, self.work_queue.stats)
+                        if not counts[ITEM_PENDING] and not counts[ITEM_LEASED]:
+                            break
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            heartbeat.cancel()
+            held = list(self._held.values())
+            for process in held:
+                process.cancel()
+            await asyncio.gather(heartbeat, *held, return_exceptions=True)
+
+    async def _start(self, items: List[WorkItem]):
+        # Видео попадают в _held сразу, чтобы аренда продлевалась и пока
+        # сообщения запрашиваются (FloodWait может длиться дольше аренды)
+        messages = asyncio.ensure_future(self._fetch_messages(items))
+        for item in items:
+            process = asyncio.ensure_future(self._process(item, messages))
+            self._held[item.key] = process
+            process.add_done_callback(lambda _, key=item.key: self._held.pop(key, None))
+
+    async def _fetch_messages(self, items: List[WorkItem]) -> Dict:
+        """Получает сообщения видео одним запросом на чат."""
+        from telethon.errors import FloodWaitError
+
+        by_chat = {}
+        for item in items:
+            by_chat.setdefault(item.chat_id, []).append(item)
+
+        limiter = self.pipeline.telegram_limiter
+        messages = {}
+        for chat_id, chat_items in by_chat.items():
+            ids = [item.message_id for item in chat_items]
+            while True:
+                await limiter.wait()
+                try:
+                    found = await self.client.get_messages(chat_id, ids=ids)
+                    break
+                except FloodWaitError as e:
+                    metrics.record_flood_wait(e.seconds)
+                    print(f"⏳ Telegram просит подождать {e.seconds} с")
+                    limiter.pause(e.seconds)
                 except Exception as e:
-                    print(f"❌ Ошибка обработки видео (ID: {message.id}): {e}")
+                    print(f"❌ Ошибка получения сообщений чата {chat_id}: {e}")
+                    found = [None] * len(ids)
+                    break
+            for item, message in zip(chat_items, found):
+                messages[item.key] = message
+        return messages
+
+    async def _uploader(self, folder_path: str) -> 'GoogleDriveUploader':
+        """Загрузчик папки на Google Drive (папка готовится один раз)."""
+        uploader = self._uploaders.get(folder_path)
+        if uploader is None:
+            uploader = asyncio.get_event_loop().run_in_executor(
+                None, self.drive_uploader.for_folder, folder_path
+            )
+            self._uploaders[folder_path] = uploader
+        try:
+            return await asyncio.shield(uploader)
+        except Exception:
+            self._uploaders.pop(folder_path, None)
+            raise
+
+    async def _process(self, item: WorkItem, messages: asyncio.Future):
+        """
+        Передает одно видео и подтверждает или возвращает его в очередь.
+
+        Args:
+            messages: future сообщений видео, полученных пачкой ({ключ видео: сообщение})
+        """
+        loop = asyncio.get_event_loop()
+        self.stats['video_count'] += 1
+        number = self.stats['video_count']
+        label = f"{item.folder_path} #{number}"
+        drive_file_id = None
+        error = None
+
+        try:
+            message = (await messages).get(item.key)
+            if message is None or get_video_info(message) is None:
+                error = 'сообщение с видео не найдено'
+            else:
+                drive_uploader = await self._uploader(item.folder_path)
+                drive_file = (drive_uploader.folder_files or {}).get(item.filename, {})
+
+                if self.progress.is_downloaded(item.chat_id, item.topic_id, item.message_id):
+                    self.stats['skipped'] += 1
+                    metrics.VIDEOS.inc(channel=item.folder_path, result='skipped')
+                    print(f"⏭ [{label}] Пропускаем уже загруженное видео (ID: {item.message_id}) - найдено в локальной базе")
+                    drive_file_id = drive_file.get('id')
+                elif drive_uploader.file_exists_in_folder(item.filename):
+                    self.stats['skipped'] += 1
+                    metrics.VIDEOS.inc(channel=item.folder_path, result='skipped')
+                    print(f"⏭ [{label}] Пропускаем видео (ID: {item.message_id}) - файл '{item.filename}' уже есть на Google Drive")
+                    drive_file_id = drive_file.get('id')
+                    self.progress.mark_downloaded(
+                        item.chat_id, item.topic_id, item.message_id,
+                        drive_file_id=drive_file_id,
+                        status=STATUS_FOUND_ON_DRIVE
+                    )
+                else:
+                    if (item.chat_id, item.topic_id) not in self._channels:
+                        self._channels.add((item.chat_id, item.topic_id))
+                        self.pipeline.add_channel(item.chat_id, item.topic_id, max_in_flight=PER_CHANNEL_TRANSFERS)
+                    task = VideoTask(
+                        message=message,
+                        chat_id=item.chat_id,
+                        topic_id=item.topic_id,
+                        number=number,
+                        filename=item.filename,
+                        mime_type=item.mime_type,
+                        drive_uploader=drive_uploader,
+                        stats=self.stats,
+                        folder_path=item.folder_path
+                    )
+                    await self.pipeline.submit(task)
+                    await task.done
+                    if task.succeeded:
+                        drive_file_id = task.drive_file_id
+                    else:
+                        error = 'передача не удалась'
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"❌ [{label}] Ошибка обработки видео (ID: {item.message_id}): {error}")
+
+        # Видео больше не передается: его аренду не продлеваем
+        self._held.pop(item.key, None)
+        try:
+            if error is None:
+                await loop.run_in_executor(None, self.work_queue.ack, self.worker_id, item.key, drive_file_id)
+                return
+
+            self.stats['failed'] += 1
+            metrics.VIDEOS.inc(channel=item.folder_path, result='failed')
+            failed = await loop.run_in_executor(None, self.work_queue.release, self.worker_id, item.key, error)
+            if failed:
+                print(f"❌ [{label}] Видео (ID: {item.message_id}) не передано после {item.attempts} попыток: {error}")
+            else:
+                print(f"↻ [{label}] Видео (ID: {item.message_id}) возвращено в очередь: {error}")
+        except Exception as e:
+            print(f"⚠ [{label}] Ошибка обновления очереди (ID: {item.message_id}): {e}")
+
+    async def _heartbeat(self):
+        """Продлевает аренду видео, пока они передаются."""
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(max(1, self.lease_seconds / 3))
+            keys = list(self._held)
+            if not keys:
+                continue
+            try:
+                renewed = await loop.run_in_executor(
+                    None, self.work_queue.heartbeat, self.worker_id, keys, self.lease_seconds
+                )
+                if renewed < len(keys):
+                    print(f"⚠ Аренда {len(keys) - renewed} видео истекла, их могут передать другие воркеры")
+            except Exception as e:
+                print(f"⚠ Ошибка продления аренды: {e}")
+
+
+def create_session_pool() -> TelegramSessionPool:
+    """Клиенты Telegram с сессиями из строк: основной аккаунт и дополнительные."""
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+
+    session_strings = [SESSION_STRING] + [value for value in SESSION_STRINGS if value != SESSION_STRING]
+    return TelegramSessionPool([
+        TelegramSession(
+            f"account{index + 1}",
+            TelegramClient(StringSession(session_string), int(API_ID), API_HASH),
+            rate_limit=TELEGRAM_RATE_LIMIT
+        )
+        for index, session_string in enumerate(session_strings)
+    ])
+
+
+def create_drive_uploader() -> Optional['GoogleDriveUploader']:
+    """Загрузчик Google Drive с настройками из окружения (None при ошибке)."""
+    from google_drive_uploader import GoogleDriveUploader
+
+    try:
+        return GoogleDriveUploader(
+            chunk_min_size=UPLOAD_CHUNK_MIN_SIZE,
+            chunk_max_size=UPLOAD_CHUNK_MAX_SIZE,
+            chunk_fixed_size=UPLOAD_CHUNK_FIXED_SIZE,
+            rate_limiter=TokenBucket(DRIVE_RATE_LIMIT, burst=max(1, int(DRIVE_RATE_LIMIT))),
+            pool_size=DRIVE_POOL_SIZE
+        )
+    except Exception as e:
+        print(f"❌ Ошибка инициализации Google Drive: {e}")
+        return None
+
+
+def verify_uploads():
+    """
+    Сверяет загруженные видео с файлами на Google Drive по метаданным, не
+    скачивая файлы.
+
+    Размер файла сравнивается с размером документа Telegram, MD5 - с
+    вычисленным при передаче. Файлы с расхождением перемещаются в корзину
+    Google Drive; их видео, как и видео пропавших файлов, передаются заново
+    при следующем запуске.
+    """
+    progress = DownloadProgress(PROGRESS_DB, legacy_json_file=PROGRESS_FILE)
+    counts = {VERIFY_OK: 0, VERIFY_SIZE: 0, VERIFY_MISMATCH: 0, VERIFY_MISSING: 0, None: 0}
+    try:
+        uploads = progress.list_uploaded()
+        print(f"🔍 Проверяем файлы на Google Drive: {len(uploads)}")
+        if not uploads:
+            return
+        drive_uploader = create_drive_uploader()
+        if drive_uploader is None:
+            return
+
+        files = drive_uploader.get_files_metadata([row['drive_file_id'] for row in uploads])
+        for row in uploads:
+            key = (row['chat_id'], row['topic_id'], row['message_id'])
+            verified, problem = check_drive_file(files.get(row['drive_file_id']), size=row['size'], md5=row['md5'])
+            counts[verified] += 1
+            if verified is None:
+                continue
+            metrics.VERIFICATIONS.inc(result=verified)
+            if verified in (VERIFY_OK, VERIFY_SIZE):
+                progress.save_verification(*key, verified)
+                continue
+
+            print(f"⚠ Видео {row['message_id']} (чат {row['chat_id']}, топик {row['topic_id']}): {problem}")
+            if verified == VERIFY_MISMATCH:
+                drive_uploader.trash_file(row['drive_file_id'])
+            progress.forget_drive_file(row['drive_file_id'])
+            progress.requeue(*key, verified=verified)
+    finally:
+        progress.close()
+
+    print(f"\n{'='*60}")
+    print("✅ Проверка завершена!")
+    print(f"  Совпали размер и MD5: {counts[VERIFY_OK]}")
+    print(f"  Совпал размер (MD5 неизвестен): {counts[VERIFY_SIZE]}")
+    print(f"  Не с чем сравнить: {counts[None]}")
+    print(f"  Не совпали (перемещены в корзину): {counts[VERIFY_MISMATCH]}")
+    print(f"  Пропали с Google Drive: {counts[VERIFY_MISSING]}")
+    if counts[VERIFY_MISMATCH] or counts[VERIFY_MISSING]:
+        print("  Эти видео будут переданы заново при следующем запуске")
+    print(f"{'='*60}")
+
+
+def start_metrics_server():
+    """Запускает HTTP-эндпоинт метрик, если задан METRICS_PORT."""
+    if not METRICS_PORT:
+        return None
+    try:
+        server = metrics.start_http_server(metrics.REGISTRY, METRICS_PORT)
+        print(f"📊 Метрики: http://127.0.0.1:{METRICS_PORT}/metrics")
+        return server
+    except OSError as e:
+        print(f"⚠ Не удалось запустить сервер метрик на порту {METRICS_PORT}: {e}")
+        return None
+
+
+def write_metrics_summary():
+    """Сохраняет сводку метрик в METRICS_SUMMARY_FILE."""
+    if not METRICS_SUMMARY_FILE:
+        return
+    try:
+        metrics.REGISTRY.write_summary(METRICS_SUMMARY_FILE)
+        print(f"📊 Сводка метрик сохранена в {METRICS_SUMMARY_FILE}")
+    except Exception as e:
+        print(f"⚠ Ошибка сохранения сводки метрик: {e}")
 
-    return {
-        'video_count': video_count,
-        'downloaded': downloaded_count,
-        'skipped': skipped_count
-    }
 
+def print_queue_stats(work_queue: WorkQueue):
+    """Выводит число видео в общей очереди по статусам."""
+    counts = work_queue.stats()
+    print(f"  Очередь: ожидают {counts['pending']}, в работе {counts['leased']}, "
+          f"переданы {counts['done']}, не удались {counts['failed']}")
 
-async def download_videos():
-    """Основная функция для скачивания видео и загрузки на Google Drive."""
+
+async def download_videos(full_rescan: bool = False, watch: bool = False,
+                          coordinator: bool = False):
+    """
+    Основная функция для скачивания видео и загрузки на Google Drive.
+
+    Args:
+        full_rescan: сканировать все топики с начала (для сверки)
+        watch: после обработки истории продолжать следить за новыми видео
+        coordinator: не передавать видео, а ставить их в общую очередь
+            WORK_QUEUE для воркеров (см. run_worker)
+    """
 
     # Загружаем конфигурацию каналов
     config = ChannelConfig(CHANNELS_CONFIG_FILE)
@@ -270,51 +1977,129 @@ async def download_videos():
         print("❌ Нет каналов для обработки. Добавьте каналы в channels_config.json")
         return
 
-    # Инициализация клиента с сессией из строки
-    client = TelegramClient(StringSession(SESSION_STRING), API_ID, API_HASH)
+    # Инициализация клиентов с сессиями из строк: основной аккаунт и дополнительные
+    sessions = create_session_pool()
+    client = sessions.primary.client
 
     # Инициализация отслеживания прогресса
-    progress = DownloadProgress(PROGRESS_FILE)
+    progress = DownloadProgress(PROGRESS_DB, legacy_json_file=PROGRESS_FILE)
 
     # Инициализация Google Drive
-    try:
-        drive_uploader = GoogleDriveUploader()
-    except Exception as e:
-        print(f"❌ Ошибка инициализации Google Drive: {e}")
+    drive_uploader = create_drive_uploader()
+    if drive_uploader is None:
+        progress.close()
         return
 
-    try:
-        await client.connect()
+    # Координатор ставит найденные видео в общую очередь
+    work_queue = None
+    if coordinator:
+        try:
+            work_queue = open_work_queue(WORK_QUEUE, max_attempts=WORK_MAX_ATTEMPTS)
+            # Отметки каналов уже прошли неудачные видео, сканирование их не найдет
+            retried = work_queue.retry_failed()
+            if retried:
+                print(f"↻ Неудачные видео возвращены в очередь: {retried}")
+        except Exception as e:
+            print(f"❌ Ошибка открытия очереди {WORK_QUEUE}: {e}")
+            progress.close()
+            return
 
-        if not await client.is_user_authorized():
+    metrics_server = start_metrics_server()
+
+    try:
+        if not await sessions.connect():
             print("❌ Ошибка: сессия не авторизована")
             return
 
-        print("✓ Успешно подключен к Telegram")
+        if len(sessions) > 1:
+            print(f"✓ Успешно подключен к Telegram (аккаунтов: {len(sessions)})")
+        else:
+            print("✓ Успешно подключен к Telegram")
 
-        # Обрабатываем каждый канал
-        total_stats = {'video_count': 0, 'downloaded': 0, 'skipped': 0}
+        # Обрабатываем каналы параллельно через общий конвейер
+        total_stats = {'video_count': 0, 'downloaded': 0, 'deduplicated': 0, 'skipped': 0}
 
-        for channel in config.channels:
-            stats = await download_channel_videos(
-                client=client,
-                chat_id=channel['chat_id'],
-                topic_id=channel['topic_id'],
-                folder_path=channel['folder_path'],
-                progress=progress,
-                drive_uploader=drive_uploader
+        if work_queue is not None:
+            pipeline = WorkQueueSink(work_queue, telegram_limiter=sessions.primary.limiter)
+        else:
+            pipeline = TransferPipeline(
+                progress,
+                telegram_limiter=sessions.primary.limiter,
+                sessions=sessions
             )
+        pipeline.start()
+        channel_slots = asyncio.Semaphore(max(1, MAX_PARALLEL_CHANNELS))
+
+        syncs = [
+            ChannelSync(client, channel['chat_id'], channel['topic_id'],
+                        channel['folder_path'], progress, pipeline,
+                        priority=channel.get('priority', 0))
+            for channel in config.channels
+        ]
+
+        async def prepare_channel(sync: ChannelSync) -> bool:
+            async with channel_slots:
+                try:
+                    return await sync.prepare(drive_uploader)
+                except Exception as e:
+                    print(f"❌ Ошибка подготовки канала {sync.folder_path}: {e}")
+                    return False
 
-            total_stats['video_count'] += stats['video_count']
-            total_stats['downloaded'] += stats['downloaded']
-            total_stats['skipped'] += stats['skipped']
+        async def process_channel(sync: ChannelSync):
+            async with channel_slots:
+                try:
+                    await sync.scan(full_rescan=full_rescan)
+                    await sync.wait()
+                except Exception as e:
+                    print(f"❌ Ошибка обработки канала {sync.folder_path}: {e}")
 
-        print(f"\n{'='*60}")
-        print(f"✓ Все каналы обработаны!")
-        print(f"  Всего найдено видео: {total_stats['video_count']}")
-        print(f"  Загружено на Google Drive в этот раз: {total_stats['downloaded']}")
-        print(f"  Пропущено (уже были): {total_stats['skipped']}")
-        print(f"{'='*60}")
+        watcher = None
+        try:
+            # Папки всех каналов проверяем и индексируем пакетными запросами
+            try:
+                await asyncio.get_event_loop().run_in_executor(
+                    None, drive_uploader.prefetch_folders, [sync.folder_path for sync in syncs]
+                )
+            except Exception as e:
+                print(f"⚠ Ошибка пакетной подготовки папок, папки будут подготовлены по одной: {e}")
+
+            ready = await asyncio.gather(*(prepare_channel(sync) for sync in syncs))
+            syncs = [sync for sync, ok in zip(syncs, ready) if ok]
+
+            if watch and syncs:
+                # Подписываемся на новые сообщения до сканирования истории,
+                # чтобы не пропустить видео, пришедшие во время сканирования
+                watcher = asyncio.ensure_future(watch_channels(client, syncs))
+
+            await asyncio.gather(*(process_channel(sync) for sync in syncs))
+
+            for sync in syncs:
+                total_stats['video_count'] += sync.stats['video_count']
+                total_stats['downloaded'] += sync.stats['downloaded']
+                total_stats['deduplicated'] += sync.stats['deduplicated']
+                total_stats['skipped'] += sync.stats['skipped']
+
+            print(f"\n{'='*60}")
+            print(f"✓ Все каналы обработаны!")
+            print(f"  Всего найдено видео: {total_stats['video_count']}")
+            print(f"  Получено сообщений при сканировании: "
+                  f"{sum(sync.scan_stats['fetched'] for sync in syncs)}")
+            if work_queue is not None:
+                print(f"  Добавлено в очередь воркеров: {pipeline.enqueued}")
+                print_queue_stats(work_queue)
+            else:
+                print(f"  Загружено на Google Drive в этот раз: {total_stats['downloaded']}")
+                print(f"  Скопировано без повторной передачи: {total_stats['deduplicated']}")
+            print(f"  Пропущено (уже были): {total_stats['skipped']}")
+            print(f"{'='*60}")
+
+            if watcher:
+                await watcher
+        finally:
+            if watcher:
+                watcher.cancel()
+            await pipeline.close()
+            write_metrics_summary()
 
     except KeyboardInterrupt:
         print("\n\n⚠ Прервано пользователем")
@@ -324,7 +2109,81 @@ async def download_videos():
         import traceback
         traceback.print_exc()
     finally:
-        await client.disconnect()
+        if metrics_server:
+            metrics_server.shutdown()
+        await sessions.disconnect()
+        progress.close()
+        if work_queue is not None:
+            work_queue.close()
+
+
+async def run_worker(watch: bool = False):
+    """
+    Режим воркера: передает видео из общей очереди WORK_QUEUE, которую
+    заполняет координатор (download_videos с coordinator=True).
+
+    Args:
+        watch: не завершаться, когда очередь опустела, а ждать новые видео
+    """
+    try:
+        work_queue = open_work_queue(WORK_QUEUE, max_attempts=WORK_MAX_ATTEMPTS)
+    except Exception as e:
+        print(f"❌ Ошибка открытия очереди {WORK_QUEUE}: {e}")
+        return
+
+    sessions = create_session_pool()
+    progress = DownloadProgress(PROGRESS_DB, legacy_json_file=PROGRESS_FILE)
+    drive_uploader = create_drive_uploader()
+    if drive_uploader is None:
+        progress.close()
+        work_queue.close()
+        return
+
+    metrics_server = start_metrics_server()
+
+    try:
+        if not await sessions.connect():
+            print("❌ Ошибка: сессия не авторизована")
+            return
+        print(f"✓ Воркер {WORKER_ID} подключен к Telegram (аккаунтов: {len(sessions)})")
+
+        # Порядок видео задает координатор: воркер передает их по порядку очереди
+        pipeline = TransferPipeline(
+            progress,
+            telegram_limiter=sessions.primary.limiter,
+            schedule_policy='fifo',
+            sessions=sessions
+        )
+        pipeline.start()
+        worker = QueueWorker(work_queue, pipeline, sessions.primary.client, progress, drive_uploader)
+        try:
+            await worker.run(watch=watch)
+
+            print(f"\n{'='*60}")
+            print(f"✓ Очередь обработана воркером {WORKER_ID}")
+            print(f"  Получено видео: {worker.stats['video_count']}")
+            print(f"  Загружено на Google Drive: {worker.stats['downloaded']}")
+            print(f"  Скопировано без повторной передачи: {worker.stats['deduplicated']}")
+            print(f"  Пропущено (уже были): {worker.stats['skipped']}")
+            print(f"  Возвращено в очередь после ошибки: {worker.stats['failed']}")
+            print_queue_stats(work_queue)
+            print(f"{'='*60}")
+        finally:
+            await pipeline.close()
+            write_metrics_summary()
+
+    except KeyboardInterrupt:
+        print("\n\n⚠ Прервано пользователем")
+    except Exception as e:
+        print(f"\n❌ Ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+        await sessions.disconnect()
+        progress.close()
+        work_queue.close()
 
 
 def parse_telegram_url(url: str) -> Optional[Dict]:
@@ -394,12 +2253,33 @@ def add_channel_command(url: str, folder_name: str):
 
 def main():
     """Точка входа в программу."""
+    parser = argparse.ArgumentParser(description='Загрузчик видео из Telegram на Google Drive')
+    parser.add_argument('url', nargs='?', help='ссылка на топик для добавления канала')
+    parser.add_argument('folder_name', nargs='?', help='имя папки внутри "Собесы" для нового канала')
+    parser.add_argument('--full-rescan', action='store_true',
+                        help='сканировать топики с начала, а не с последнего обработанного сообщения')
+    parser.add_argument('--watch', action='store_true',
+                        help='после обработки истории следить за новыми видео в топиках')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--coordinator', action='store_true',
+                      help='ставить найденные видео в общую очередь WORK_QUEUE для воркеров')
+    mode.add_argument('--worker', action='store_true',
+                      help='передавать видео из общей очереди WORK_QUEUE')
+    mode.add_argument('--verify', action='store_true',
+                      help='сверить загруженные файлы с Google Drive по метаданным и поставить несовпавшие заново')
+    args = parser.parse_args()
+
     # Проверяем, если запущена команда добавления канала
-    if len(sys.argv) == 3:
+    if args.url:
         # Формат: python download_videos.py URL FOLDER_NAME
-        url = sys.argv[1]
-        folder_name = sys.argv[2]
-        add_channel_command(url, folder_name)
+        if not args.folder_name:
+            parser.error('для добавления канала укажите URL и имя папки')
+        add_channel_command(args.url, args.folder_name)
+        return
+
+    # Проверке нужен только Google Drive
+    if args.verify:
+        verify_uploads()
         return
 
     print("="*60)
@@ -407,13 +2287,17 @@ def main():
     print("="*60)
 
     # Проверка конфигурации
-    if not API_ID or not API_HASH or not SESSION_STRING:
+    if not API_ID.isdigit() or not API_HASH or not SESSION_STRING:
         print("❌ Ошибка: не заданы API_ID, API_HASH или SESSION_STRING")
         print("   Создайте файл .env на основе .env.example")
         return
 
     # Запуск асинхронной функции
-    asyncio.run(download_videos())
+    if args.worker:
+        asyncio.run(run_worker(watch=args.watch))
+    else:
+        asyncio.run(download_videos(full_rescan=args.full_rescan, watch=args.watch,
+                                    coordinator=args.coordinator))
 
 
 if __name__ == '__main__':
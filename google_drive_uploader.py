@@ -2,37 +2,425 @@
 Модуль для работы с Google Drive API.
 """
 import os
+import copy
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp, Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaUpload
+import metrics
+from rate_limit import TokenBucket, backoff_delay
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка кэша папок недоступна
+    fcntl = None
+
+
+# Размер фрагмента resumable-загрузки должен быть кратен 256 KB
+CHUNK_ALIGN = 256 * 1024
+# Фрагмент растет, пока скорость не падает ниже этой доли от лучшей
+CHUNK_GROWTH_THRESHOLD = 0.9
+# Повторы запроса или фрагмента при сетевых ошибках, превышении квоты и ответах 5xx
+REQUEST_RETRIES = 5
+# Максимальное число запросов в одном пакетном запросе Drive API
+BATCH_MAX_SIZE = 100
+# Причины ответа 403, означающие превышение квоты, а не отказ в доступе
+RATE_LIMIT_REASONS = ('userRateLimitExceeded', 'rateLimitExceeded')
+
+
+def _align_chunk(size: int) -> int:
+    return max(CHUNK_ALIGN, size // CHUNK_ALIGN * CHUNK_ALIGN)
+
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    """Ответ Drive о превышении квоты запросов."""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and any(
+        detail.get('reason') in RATE_LIMIT_REASONS
+        for detail in (error.error_details or []) if isinstance(detail, dict)
+    )
+
+
+def _is_retryable_error(error: BaseException) -> bool:
+    """Ошибка, после которой запрос к Drive имеет смысл повторить."""
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500 or _is_rate_limit_error(error)
+    return isinstance(error, (httplib2.HttpLib2Error, OSError))
+
+
+class AdaptiveChunkSize:
+    """
+    Подбор размера фрагмента resumable-загрузки по измеренной скорости.
+
+    Загрузка начинается с минимального фрагмента; пока скорость растет или
+    держится, фрагмент удваивается до максимума, при ошибке - уменьшается
+    вдвое. Память на одну загрузку ограничена максимальным фрагментом.
+    """
+
+    def __init__(self, min_size: int, max_size: int, fixed_size: Optional[int] = None):
+        """
+        Args:
+            min_size: минимальный (начальный) размер фрагмента в байтах
+            max_size: максимальный размер фрагмента в байтах
+            fixed_size: фиксированный размер фрагмента (подбор отключен)
+        """
+        self.min_size = _align_chunk(min_size)
+        self.max_size = max(self.min_size, _align_chunk(max_size))
+        self.fixed = bool(fixed_size)
+        self.current = _align_chunk(fixed_size) if fixed_size else self.min_size
+        self._best_rate = 0.0
+
+    def record(self, sent_bytes: int, seconds: float):
+        """Учитывает успешно отправленный фрагмент."""
+        if self.fixed or sent_bytes <= 0 or seconds <= 0:
+            return
+        rate = sent_bytes / seconds
+        if rate >= self._best_rate * CHUNK_GROWTH_THRESHOLD:
+            self.current = min(self.current * 2, self.max_size)
+        self._best_rate = max(self._best_rate, rate)
+
+    def failed(self):
+        """Учитывает ошибку отправки фрагмента."""
+        if self.fixed:
+            return
+        self.current = max(self.min_size, _align_chunk(self.current // 2))
+        # После ошибки прежняя скорость не достижима сразу, даем фрагменту снова расти
+        self._best_rate /= 2
+
+
+class AdaptiveMediaFileUpload(MediaFileUpload):
+    """MediaFileUpload, размер фрагмента которого задает AdaptiveChunkSize."""
+
+    def __init__(self, filename: str, mimetype: str, chunk_policy: AdaptiveChunkSize):
+        super().__init__(filename, mimetype=mimetype, chunksize=chunk_policy.current, resumable=True)
+        self.chunk_policy = chunk_policy
+
+    def chunksize(self):
+        return self.chunk_policy.current
+
+
+class StreamingMediaUpload(MediaUpload):
+    """
+    Источник данных для resumable-загрузки из потока без перемотки.
+
+    Данные читаются из объекта с методом read(size) (например, ChunkRingBuffer).
+    В памяти хранится только последний отправленный, но еще не подтвержденный
+    сервером фрагмент, чтобы его можно было отправить повторно.
+    """
+
+    def __init__(self, stream, mimetype: str, chunk_policy: AdaptiveChunkSize,
+                 size: Optional[int] = None, offset: int = 0):
+        """
+        Args:
+            stream: источник данных с методом read(size)
+            mimetype: MIME-тип файла
+            chunk_policy: подбор размера фрагмента загрузки
+            size: полный размер файла в байтах, если известен
+            offset: смещение в файле, с которого начинается поток
+                (при продолжении прерванной загрузки)
+        """
+        self._stream = stream
+        self._mimetype = mimetype
+        self._size = size
+        self.chunk_policy = chunk_policy
+        # Неподтвержденные данные и их смещение от начала файла
+        self._pending = bytearray()
+        self._pending_offset = offset
+
+    def chunksize(self):
+        return self.chunk_policy.current
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        # Все, что до begin, сервер уже подтвердил, и это можно отбросить
+        if begin < self._pending_offset:
+            raise ValueError(f"Невозможно перемотать поток к позиции {begin}")
+        committed = begin - self._pending_offset
+        del self._pending[:committed]
+        self._pending_offset = begin
+
+        while len(self._pending) < length:
+            data = self._stream.read(length - len(self._pending))
+            if not data:
+                break
+            self._pending.extend(data)
+
+        return bytes(self._pending[:length])
+
+    def has_stream(self):
+        return False
+
+    def to_json(self):
+        raise NotImplementedError('Потоковую загрузку нельзя сериализовать')
+
+
+class DriveHttpPool:
+    """
+    Пул HTTP-клиентов Drive API с авторизацией.
+
+    httplib2.Http не потокобезопасен, поэтому клиент выдается одному потоку
+    на время запроса и затем возвращается в пул. Каждый клиент держит свои
+    keep-alive соединения, и запросы не тратят время на установку TLS.
+    Первым выдается последний возвращенный клиент, чтобы его соединения не
+    успевали закрыться. Клиенты создаются по мере надобности, но не больше
+    size; когда все заняты, поток ждет освобождения.
+
+    Учетные данные у всех клиентов общие: истекший токен обновляется один
+    раз перед выдачей клиента, а не каждым клиентом отдельно.
+    """
+
+    def __init__(self, factory: Callable[[], object], size: int, credentials=None):
+        """
+        Args:
+            factory: создает новый HTTP-клиент
+            size: максимальное число клиентов
+            credentials: общие учетные данные клиентов (None - без обновления токена)
+        """
+        self.factory = factory
+        self.size = max(1, size)
+        self.credentials = credentials
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        metrics.DRIVE_POOL_CLIENTS.set_function(self._idle.qsize, state='idle')
+        metrics.DRIVE_POOL_CLIENTS.set_function(lambda: self._created - self._idle.qsize(), state='in_use')
+
+    @contextmanager
+    def connection(self):
+        """Выдает HTTP-клиент на время блока with."""
+        http = self._acquire()
+        try:
+            self._refresh_token()
+            yield http
+        finally:
+            self._idle.put(http)
+
+    def _acquire(self):
+        started = time.monotonic()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.factory()
+            except BaseException:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        http = self._idle.get()
+        metrics.DRIVE_POOL_WAIT_SECONDS.observe(time.monotonic() - started)
+        return http
+
+    def _refresh_token(self):
+        """Обновляет истекший токен общих учетных данных."""
+        credentials = self.credentials
+        if credentials is None or credentials.valid:
+            return
+        with self._refresh_lock:
+            if not credentials.valid:
+                credentials.refresh(Request(httplib2.Http()))
+
+
+class DriveBatch:
+    """
+    Пакетная отправка запросов метаданных к Drive API.
+
+    Запросы накапливаются и отправляются одним HTTP-запросом к batch-эндпоинту,
+    когда их набирается max_size (не больше BATCH_MAX_SIZE) или через
+    flush_interval секунд после первого из них. Каждый вызывающий получает
+    свой результат или ошибку через Future. Запросы, завершившиеся
+    превышением квоты или ошибкой 5xx, повторяются следующим пакетом.
+    """
+
+    def __init__(self, uploader: 'GoogleDriveUploader', max_size: int = BATCH_MAX_SIZE,
+                 flush_interval: float = 0.05):
+        """
+        Args:
+            uploader: загрузчик, чьи учетные данные и ограничитель используются
+            max_size: сколько запросов отправлять в одном пакете
+            flush_interval: через сколько секунд отправлять неполный пакет
+                (0 - только при заполнении или явном flush())
+        """
+        self.uploader = uploader
+        self.max_size = max(1, min(max_size, BATCH_MAX_SIZE))
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def submit(self, request) -> Future:
+        """
+        Добавляет запрос в пакет.
+
+        Args:
+            request: запрос к API без вызова execute()
+
+        Returns:
+            Future с ответом на запрос
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((request, future))
+            full = len(self._pending) >= self.max_size
+            if not full and self._timer is None and self.flush_interval:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return future
+
+    def flush(self):
+        """Отправляет все накопленные запросы."""
+        while True:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                items = self._pending[:self.max_size]
+                self._pending = self._pending[self.max_size:]
+            if not items:
+                return
+            self._execute(items)
+
+    def _execute(self, items: List[Tuple[object, Future]]):
+        """Выполняет один пакет, повторяя запросы с временными ошибками."""
+        for attempt in range(REQUEST_RETRIES + 1):
+            retry = []
+            last_error = None
+
+            def callback(request_id, response, exception, items=items):
+                nonlocal last_error
+                request, future = items[int(request_id)]
+                if exception is None:
+                    future.set_result(response)
+                elif attempt < REQUEST_RETRIES and _is_retryable_error(exception):
+                    retry.append((request, future))
+                    last_error = exception
+                else:
+                    future.set_exception(exception)
+
+            batch = self.uploader.service.new_batch_http_request(callback=callback)
+            for index, (request, _) in enumerate(items):
+                batch.add(request, request_id=str(index))
+
+            # Квота Drive считает каждый запрос пакета отдельно
+            if self.uploader.rate_limiter:
+                self.uploader.rate_limiter.acquire(len(items))
+            try:
+                with self.uploader.http_pool.connection() as http, \
+                        metrics.STAGE_SECONDS.time(stage='drive_batch'):
+                    batch.execute(http=http)
+            except Exception as e:
+                if attempt < REQUEST_RETRIES and _is_retryable_error(e):
+                    retry = [item for item in items if not item[1].done()]
+                    last_error = e
+                else:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+
+            if not retry:
+                return
+            items = retry
+            self.uploader._backoff(attempt, last_error)
 
 
 class GoogleDriveUploader:
     """Класс для загрузки файлов на Google Drive."""
 
-    def __init__(self, credentials_file: str = 'credentials.json', token_file: str = 'token.json'):
+    def __init__(self, credentials_file: str = 'credentials.json', token_file: str = 'token.json',
+                 folder_cache_file: str = 'drive_folders_cache.json',
+                 chunk_min_size: int = CHUNK_ALIGN, chunk_max_size: int = 32*1024*1024,
+                 chunk_fixed_size: Optional[int] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 pool_size: int = 8):
         """
         Инициализация загрузчика.
 
         Args:
             credentials_file: путь к файлу credentials.json
             token_file: путь к файлу token.json
+            folder_cache_file: путь к файлу кэша ID папок
+            chunk_min_size: начальный размер фрагмента загрузки в байтах
+            chunk_max_size: максимальный размер фрагмента загрузки в байтах
+            chunk_fixed_size: фиксированный размер фрагмента (без подбора)
+            rate_limiter: общий ограничитель частоты запросов к API (опционально)
+            pool_size: сколько HTTP-клиентов (соединений) одновременно используется
+                для запросов к API
         """
         self.credentials_file = credentials_file
         self.token_file = token_file
-        self.service = None
+        self.folder_cache_file = folder_cache_file
+        self.chunk_min_size = chunk_min_size
+        self.chunk_max_size = chunk_max_size
+        self.chunk_fixed_size = chunk_fixed_size
+        self.rate_limiter = rate_limiter
+        # Индексы папок, заранее загруженные prefetch_folders: {ID папки: индекс}
+        self._prefetched_files = {}
+        self.credentials = None
         self.folder_id = None
+        # Индекс файлов текущей папки: {имя: {'id', 'size', 'md5Checksum'}}
+        self.folder_files = None
+        # Клиент API только составляет запросы; выполняются они через HTTP-клиенты
+        # из пула, который общий для всех копий загрузчика
+        self._service = None
+        # Общая для всех копий загрузчика блокировка поиска/создания папок
+        self._folder_lock = threading.Lock()
+        # Кэш {путь папки: ID} и пути, проверенные в текущем запуске
+        self._folder_cache = {}
+        self._validated_folders = set()
         self._authenticate()
+        self.http_pool = DriveHttpPool(self._new_http, pool_size, credentials=self.credentials)
 
     def _authenticate(self):
         """Аутентификация в Google Drive."""
         if not os.path.exists(self.token_file):
             raise FileNotFoundError(f"Файл {self.token_file} не найден")
 
-        creds = Credentials.from_authorized_user_file(self.token_file)
-        self.service = build('drive', 'v3', credentials=creds)
+        self.credentials = Credentials.from_authorized_user_file(self.token_file)
+        # Создаем клиент сразу, чтобы ошибки конфигурации проявились при инициализации
+        self._service = build('drive', 'v3', credentials=self.credentials)
+
+    @property
+    def service(self):
+        """
+        Клиент Drive API для составления запросов.
+
+        Запросы выполняются через _execute или с HTTP-клиентом из http_pool:
+        собственный HTTP-клиент сервиса не потокобезопасен.
+        """
+        return self._service
 
     def get_or_create_folder(self, folder_name: str, parent_id: Optional[str] = None) -> str:
         """
@@ -50,11 +438,13 @@ class GoogleDriveUploader:
         if parent_id:
             query += f" and '{parent_id}' in parents"
 
-        results = self.service.files().list(
+        # При дубликатах всегда выбираем самую старую папку
+        results = self._execute(self.service.files().list(
             q=query,
             spaces='drive',
-            fields='files(id, name)'
-        ).execute()
+            fields='files(id, name)',
+            orderBy='createdTime'
+        ))
 
         items = results.get('files', [])
 
@@ -72,17 +462,156 @@ class GoogleDriveUploader:
         if parent_id:
             file_metadata['parents'] = [parent_id]
 
-        folder = self.service.files().create(
+        folder = self._execute(self.service.files().create(
             body=file_metadata,
             fields='id'
-        ).execute()
+        ))
 
         folder_id = folder.get('id')
         print(f"✓ Создана новая папка '{folder_name}' (ID: {folder_id})")
         return folder_id
 
+    def _execute(self, request) -> Dict:
+        """
+        Выполняет запрос к API с ограничением частоты и повторами.
+
+        При превышении квоты, ответах 5xx и сетевых ошибках запрос
+        повторяется с экспоненциальной задержкой; при превышении квоты
+        приостанавливаются и запросы остальных потоков.
+        """
+        for attempt in range(REQUEST_RETRIES + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                with self.http_pool.connection() as http, \
+                        metrics.STAGE_SECONDS.time(stage='drive_metadata'):
+                    return request.execute(http=http)
+            except Exception as e:
+                if attempt == REQUEST_RETRIES or not _is_retryable_error(e):
+                    raise
+                self._backoff(attempt, e)
+
+    def _backoff(self, attempt: int, error: BaseException):
+        """Ждет перед повтором запроса после ошибки."""
+        delay = backoff_delay(attempt)
+        rate_limited = _is_rate_limit_error(error)
+        metrics.DRIVE_BACKOFFS.inc(reason='rate_limit' if rate_limited else 'error')
+        if self.rate_limiter and rate_limited:
+            self.rate_limiter.pause(delay)
+        print(f"⚠ Ошибка Google Drive, повтор {attempt + 1}/{REQUEST_RETRIES} через {delay:.1f} с: {error}")
+        time.sleep(delay)
+
+    def _new_http(self) -> AuthorizedHttp:
+        """Новый HTTP-клиент с авторизацией для пула."""
+        return AuthorizedHttp(self.credentials, http=httplib2.Http())
+
+    def get_upload_status(self, session_uri: str,
+                          total_size: Optional[int]) -> Tuple[Optional[int], Optional[Dict]]:
+        """
+        Запрашивает состояние resumable-сессии загрузки.
+
+        Args:
+            session_uri: URI сессии загрузки
+            total_size: полный размер файла в байтах (None, если неизвестен)
+
+        Returns:
+            (подтвержденные байты, None) для незавершенной загрузки,
+            (None, метаданные файла) для завершенной,
+            (None, None), если сессия истекла
+        """
+        with self.http_pool.connection() as http:
+            resp, content = http.request(
+                session_uri,
+                method='PUT',
+                headers={
+                    'Content-Range': f"bytes */{'*' if total_size is None else total_size}",
+                    'Content-Length': '0'
+                }
+            )
+
+        if resp.status in (200, 201):
+            return None, json.loads(content)
+        if resp.status == 308:
+            # Заголовок Range вида 'bytes=0-N' означает, что получены байты 0..N
+            committed = 0
+            if 'range' in resp:
+                committed = int(resp['range'].rsplit('-', 1)[1]) + 1
+            return committed, None
+        if resp.status in (404, 410):
+            return None, None
+        raise HttpError(resp, content, uri=session_uri)
+
+    def _run_resumable(self, request, chunk_policy: AdaptiveChunkSize,
+                       resume_uri: Optional[str] = None, offset: int = 0,
+                       on_progress: Optional[Callable[[str, int], None]] = None) -> Dict:
+        """
+        Выполняет resumable-загрузку по фрагментам.
+
+        Размер каждого следующего фрагмента подбирается chunk_policy по
+        скорости предыдущих. При сетевой ошибке, превышении квоты или ответе
+        5xx фрагмент уменьшается, а загрузка после паузы продолжается с
+        подтвержденного сервером места.
+
+        Args:
+            request: запрос files().create с resumable media_body
+            chunk_policy: подбор размера фрагмента
+            resume_uri: URI ранее начатой сессии (опционально)
+            offset: сколько байт уже подтверждено в этой сессии
+            on_progress: вызывается после каждого фрагмента с URI сессии
+                и числом подтвержденных байт (для контрольных точек)
+
+        Returns:
+            Метаданные загруженного файла
+        """
+        if resume_uri:
+            request.resumable_uri = resume_uri
+            request.resumable_progress = offset
+
+        total_size = request.resumable.size()
+        file = None
+        errors = 0
+        while file is None:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            sent_before = request.resumable_progress
+            started = time.monotonic()
+            try:
+                with self.http_pool.connection() as http:
+                    status, file = request.next_chunk(http=http)
+            except Exception as e:
+                if errors == REQUEST_RETRIES or not _is_retryable_error(e):
+                    raise
+                chunk_policy.failed()
+                self._backoff(errors, e)
+                errors += 1
+                if request.resumable_uri:
+                    # Сервер мог принять часть фрагмента: узнаем, с какого места продолжать
+                    committed, file = self.get_upload_status(request.resumable_uri, total_size)
+                    if committed is None and file is None:
+                        raise
+                    if committed is not None:
+                        request.resumable_progress = committed
+                continue
+
+            errors = 0
+            sent_after = request.resumable_progress if file is None else (total_size or sent_before)
+            chunk_policy.record(sent_after - sent_before, time.monotonic() - started)
+            if on_progress and file is None:
+                on_progress(request.resumable_uri, request.resumable_progress)
+        return file
+
+    def _chunk_policy(self, max_size: Optional[int] = None) -> AdaptiveChunkSize:
+        """Новый подбор размера фрагмента с настройками загрузчика."""
+        return AdaptiveChunkSize(
+            self.chunk_min_size,
+            min(self.chunk_max_size, max_size) if max_size else self.chunk_max_size,
+            self.chunk_fixed_size
+        )
+
     def upload_file(self, filepath: str, filename: str,
-                   folder_id: Optional[str] = None, mime_type: str = 'video/mp4') -> str:
+                   folder_id: Optional[str] = None, mime_type: str = 'video/mp4',
+                   resume_uri: Optional[str] = None,
+                   on_progress: Optional[Callable[[str, int], None]] = None) -> str:
         """
         Загружает файл с диска на Google Drive.
 
@@ -91,6 +620,66 @@ class GoogleDriveUploader:
             filename: имя файла на Google Drive
             folder_id: ID папки для загрузки (опционально)
             mime_type: MIME-тип файла
+            resume_uri: URI прерванной сессии загрузки, чтобы продолжить ее
+            on_progress: вызывается после каждого фрагмента с URI сессии
+                и числом подтвержденных байт
+
+        Returns:
+            ID загруженного файла
+        """
+        file_metadata = {'name': filename}
+
+        if folder_id:
+            file_metadata['parents'] = [folder_id]
+
+        chunk_policy = self._chunk_policy()
+        media = AdaptiveMediaFileUpload(filepath, mimetype=mime_type, chunk_policy=chunk_policy)
+
+        request = self.service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields='id, name, size, md5Checksum'
+        )
+
+        # Продолжаем прерванную сессию с последнего подтвержденного фрагмента
+        offset = 0
+        file = None
+        if resume_uri:
+            offset, file = self.get_upload_status(resume_uri, media.size())
+            if file is None and offset is None:
+                print("⚠ Сессия загрузки истекла, начинаем загрузку заново")
+                resume_uri = None
+                offset = 0
+            elif file is None:
+                print(f"↻ Продолжаем загрузку на Google Drive с {offset / (1024*1024):.2f} MB")
+
+        if file is None:
+            file = self._run_resumable(request, chunk_policy, resume_uri, offset, on_progress)
+
+        self._index_file(folder_id, file)
+        return file.get('id')
+
+    def upload_stream(self, stream, filename: str, folder_id: Optional[str] = None,
+                      mime_type: str = 'video/mp4', size: Optional[int] = None,
+                      chunksize: int = 1024*1024, resume_uri: Optional[str] = None,
+                      offset: int = 0,
+                      on_progress: Optional[Callable[[str, int], None]] = None) -> str:
+        """
+        Загружает файл на Google Drive из потока, не сохраняя его на диск.
+
+        Args:
+            stream: источник данных с методом read(size)
+            filename: имя файла на Google Drive
+            folder_id: ID папки для загрузки (опционально)
+            mime_type: MIME-тип файла
+            size: полный размер файла в байтах, если известен
+            chunksize: максимальный размер фрагмента загрузки; ограничивает
+                объем неподтвержденных данных в памяти
+            resume_uri: URI прерванной сессии загрузки (см. get_upload_status)
+            offset: число байт, уже подтвержденных в сессии; поток должен
+                начинаться с этого смещения
+            on_progress: вызывается после каждого фрагмента с URI сессии
+                и числом подтвержденных байт
 
         Returns:
             ID загруженного файла
@@ -100,19 +689,23 @@ class GoogleDriveUploader:
         if folder_id:
             file_metadata['parents'] = [folder_id]
 
-        media = MediaFileUpload(
-            filepath,
+        chunk_policy = self._chunk_policy(max_size=chunksize)
+        media = StreamingMediaUpload(
+            stream,
             mimetype=mime_type,
-            resumable=True,
-            chunksize=256*1024  # 256KB chunks для экономии памяти
+            chunk_policy=chunk_policy,
+            size=size,
+            offset=offset if resume_uri else 0
         )
 
-        file = self.service.files().create(
+        request = self.service.files().create(
             body=file_metadata,
             media_body=media,
-            fields='id, name, size'
-        ).execute()
+            fields='id, name, size, md5Checksum'
+        )
+        file = self._run_resumable(request, chunk_policy, resume_uri, offset, on_progress)
 
+        self._index_file(folder_id, file)
         return file.get('id')
 
     def set_folder(self, folder_path: str):
@@ -123,20 +716,269 @@ class GoogleDriveUploader:
         Args:
             folder_path: путь к папке (например, 'Собесы/NLP' или 'Собесы')
         """
-        folders = folder_path.split('/')
-        parent_id = None
+        self.folder_id = self.resolve_folder_path(folder_path)
+        self.folder_files = self.list_folder_files(self.folder_id)
+        print(f"✓ В папке '{folder_path}' найдено файлов: {len(self.folder_files)}")
+
+    def list_folder_files(self, folder_id: str) -> Dict[str, Dict]:
+        """
+        Получает список всех файлов папки постранично.
+
+        Args:
+            folder_id: ID папки
+
+        Returns:
+            Словарь {имя файла: {'id', 'size', 'md5Checksum'}}
+        """
+        files = self._prefetched_files.pop(folder_id, None)
+        if files is not None:
+            return files
+
+        files = {}
+        page_token = None
+
+        while True:
+            results = self._execute(self._list_request(folder_id, page_token))
+            page_token = self._add_listing_page(files, results)
+            if not page_token:
+                return files
+
+    def _list_request(self, folder_id: str, page_token: Optional[str] = None):
+        """Запрос страницы списка файлов папки."""
+        return self.service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            spaces='drive',
+            fields='nextPageToken, files(id, name, size, md5Checksum)',
+            pageSize=1000,
+            pageToken=page_token
+        )
+
+    @staticmethod
+    def _add_listing_page(files: Dict[str, Dict], results: Dict) -> Optional[str]:
+        """Добавляет страницу списка в индекс и возвращает токен следующей страницы."""
+        for item in results.get('files', []):
+            files[item['name']] = {
+                'id': item['id'],
+                'size': item.get('size'),
+                'md5Checksum': item.get('md5Checksum')
+            }
+        return results.get('nextPageToken')
+
+    def prefetch_folders(self, folder_paths: List[str]):
+        """
+        Заранее проверяет папки и загружает их индексы пакетными запросами.
+
+        Проверка всех папок из кэша и первые страницы их списков файлов
+        выполняются двумя пакетными запросами вместо двух запросов на папку.
+        После этого set_folder() для этих путей обращается к API, только
+        если папки нет в кэше или в ней больше одной страницы файлов.
+
+        Args:
+            folder_paths: пути папок (например, ['Собесы/NLP', 'Собесы/CV'])
+        """
+        paths = list(dict.fromkeys(self._normalize_path(path) for path in folder_paths))
+        batch = DriveBatch(self, flush_interval=0)
+
+        with self._folder_cache_lock():
+            self._load_folder_cache()
+            checks = {
+                path: batch.submit(self.service.files().get(
+                    fileId=self._folder_cache[path],
+                    fields='id, trashed'
+                ))
+                for path in paths
+                if path in self._folder_cache and path not in self._validated_folders
+            }
+            batch.flush()
+
+            changed = False
+            for path, future in checks.items():
+                try:
+                    valid = not future.result().get('trashed', False)
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    valid = False
+                if valid:
+                    self._validated_folders.add(path)
+                elif path in self._folder_cache:
+                    self._invalidate_cached_folder(path)
+                    changed = True
+            if changed:
+                self._save_folder_cache()
+
+        # Проверенные папки определяются без запросов, недостающие создаются
+        folder_ids = {self.resolve_folder_path(path) for path in paths}
+        listings = {folder_id: batch.submit(self._list_request(folder_id)) for folder_id in folder_ids}
+        batch.flush()
+
+        for folder_id, future in listings.items():
+            files = {}
+            page_token = self._add_listing_page(files, future.result())
+            while page_token:
+                results = self._execute(self._list_request(folder_id, page_token))
+                page_token = self._add_listing_page(files, results)
+            self._prefetched_files[folder_id] = files
+
+    def _index_file(self, folder_id: Optional[str], file: Dict):
+        """Добавляет загруженный файл в индекс текущей папки."""
+        if self.folder_files is not None and folder_id and folder_id == self.folder_id:
+            self.folder_files[file['name']] = {
+                'id': file['id'],
+                'size': file.get('size'),
+                'md5Checksum': file.get('md5Checksum')
+            }
+
+    def resolve_folder_path(self, folder_path: str) -> str:
+        """
+        Возвращает ID папки по пути, создавая недостающие папки.
+
+        Пути кэшируются на диске. ID из кэша проверяется один раз за запуск;
+        если папка удалена или в корзине, путь определяется заново.
+        Поиск и создание выполняются под блокировкой (между потоками и
+        процессами), поэтому одна и та же папка не создается дважды.
+
+        Args:
+            folder_path: путь к папке (например, 'Собесы/NLP')
+
+        Returns:
+            ID папки
+        """
+        folders = [name for name in self._normalize_path(folder_path).split('/') if name]
+
+        with self._folder_cache_lock():
+            # Другой процесс мог дополнить кэш, пока мы ждали блокировку
+            self._load_folder_cache()
+
+            # Если путь целиком есть в кэше, достаточно проверить конечную папку:
+            # при удалении родителя в корзину попадают и вложенные папки
+            folder_id = self._cached_folder_id('/'.join(folders))
+            if folder_id is not None:
+                return folder_id
+
+            parent_id = None
+            path = ''
+            changed = False
+
+            for folder_name in folders:
+                path = f"{path}/{folder_name}" if path else folder_name
+                folder_id = self._cached_folder_id(path)
+
+                if folder_id is None:
+                    folder_id = self.get_or_create_folder(folder_name, parent_id)
+                    self._folder_cache[path] = folder_id
+                    self._validated_folders.add(path)
+                    changed = True
+
+                parent_id = folder_id
+
+            if changed:
+                self._save_folder_cache()
+
+        return parent_id
+
+    def _cached_folder_id(self, path: str) -> Optional[str]:
+        """Возвращает ID папки из кэша, проверяя, что она еще существует."""
+        folder_id = self._folder_cache.get(path)
+        if folder_id is None or path in self._validated_folders:
+            return folder_id
+
+        try:
+            folder = self._execute(self.service.files().get(
+                fileId=folder_id,
+                fields='id, trashed'
+            ))
+            valid = not folder.get('trashed', False)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            valid = False
+
+        if not valid:
+            self._invalidate_cached_folder(path)
+            return None
+
+        self._validated_folders.add(path)
+        return folder_id
+
+    def _invalidate_cached_folder(self, path: str):
+        """Удаляет из кэша удаленную папку вместе с вложенными."""
+        print(f"⚠ Папка '{path}' из кэша удалена, ищем заново")
+        for cached_path in list(self._folder_cache):
+            if cached_path == path or cached_path.startswith(path + '/'):
+                del self._folder_cache[cached_path]
+
+    @staticmethod
+    def _normalize_path(folder_path: str) -> str:
+        """Путь папки без лишних пробелов и разделителей."""
+        return '/'.join(name.strip() for name in folder_path.split('/') if name.strip())
+
+    @contextmanager
+    def _folder_cache_lock(self):
+        """Блокировка кэша папок между потоками и процессами."""
+        with self._folder_lock:
+            if fcntl is None:
+                yield
+                return
 
-        for folder_name in folders:
-            folder_name = folder_name.strip()
-            if folder_name:
-                parent_id = self.get_or_create_folder(folder_name, parent_id)
+            with open(self.folder_cache_file + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-        self.folder_id = parent_id
+    def _load_folder_cache(self):
+        """Загружает кэш папок с диска."""
+        if not os.path.exists(self.folder_cache_file):
+            return
+
+        try:
+            with open(self.folder_cache_file, 'r', encoding='utf-8') as f:
+                folders = json.load(f).get('folders', {})
+        except Exception as e:
+            print(f"⚠ Ошибка загрузки кэша папок: {e}")
+            return
+
+        for path, folder_id in folders.items():
+            if self._folder_cache.get(path) != folder_id:
+                self._folder_cache[path] = folder_id
+                self._validated_folders.discard(path)
+
+    def _save_folder_cache(self):
+        """Атомарно сохраняет кэш папок на диск."""
+        temp_file = self.folder_cache_file + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'folders': self._folder_cache}, f, indent=2, ensure_ascii=False)
+            os.replace(temp_file, self.folder_cache_file)
+        except Exception as e:
+            print(f"⚠ Ошибка сохранения кэша папок: {e}")
+
+    def for_folder(self, folder_path: str) -> 'GoogleDriveUploader':
+        """
+        Создает загрузчик, привязанный к указанной папке.
+
+        Копия использует те же учетные данные и клиенты API, но хранит
+        собственную текущую папку, поэтому каналы могут работать параллельно.
+
+        Args:
+            folder_path: путь к папке (например, 'Собесы/NLP')
+
+        Returns:
+            Загрузчик с установленной папкой
+        """
+        uploader = copy.copy(self)
+        uploader.set_folder(folder_path)
+        return uploader
 
     def file_exists_in_folder(self, filename: str) -> bool:
         """
         Проверяет, существует ли файл с заданным именем в текущей папке.
 
+        Если индекс папки загружен в set_folder, проверка выполняется без
+        запросов к API.
+
         Args:
             filename: имя файла для проверки
 
@@ -146,15 +988,18 @@ class GoogleDriveUploader:
         if not self.folder_id:
             return False
 
+        if self.folder_files is not None:
+            return filename in self.folder_files
+
         query = f"name='{filename}' and '{self.folder_id}' in parents and trashed=false"
 
         try:
-            results = self.service.files().list(
+            results = self._execute(self.service.files().list(
                 q=query,
                 spaces='drive',
                 fields='files(id, name)',
                 pageSize=1
-            ).execute()
+            ))
 
             items = results.get('files', [])
             return len(items) > 0
@@ -163,7 +1008,9 @@ class GoogleDriveUploader:
             return False
 
     def upload_to_folder(self, filepath: str, filename: str,
-                        mime_type: str = 'video/mp4', file_size_mb: float = 0) -> str:
+                        mime_type: str = 'video/mp4', file_size_mb: float = 0,
+                        resume_uri: Optional[str] = None,
+                        on_progress: Optional[Callable[[str, int], None]] = None) -> str:
         """
         Загружает файл с диска в установленную папку.
 
@@ -172,6 +1019,9 @@ class GoogleDriveUploader:
             filename: имя файла на Google Drive
             mime_type: MIME-тип файла
             file_size_mb: размер файла в MB (для отображения)
+            resume_uri: URI прерванной сессии загрузки, чтобы продолжить ее
+            on_progress: вызывается после каждого фрагмента с URI сессии
+                и числом подтвержденных байт
 
         Returns:
             ID загруженного файла
@@ -182,8 +1032,141 @@ class GoogleDriveUploader:
             filepath=filepath,
             filename=filename,
             folder_id=self.folder_id,
-            mime_type=mime_type
+            mime_type=mime_type,
+            resume_uri=resume_uri,
+            on_progress=on_progress
         )
 
         print(f"✓ Загружено на Google Drive (ID: {file_id})")
         return file_id
+
+    def upload_stream_to_folder(self, stream, filename: str, mime_type: str = 'video/mp4',
+                                size: Optional[int] = None, file_size_mb: float = 0,
+                                chunksize: int = 1024*1024, resume_uri: Optional[str] = None,
+                                offset: int = 0,
+                                on_progress: Optional[Callable[[str, int], None]] = None) -> str:
+        """
+        Загружает файл из потока в установленную папку.
+
+        Args:
+            stream: источник данных с методом read(size)
+            filename: имя файла на Google Drive
+            mime_type: MIME-тип файла
+            size: полный размер файла в байтах, если известен
+            file_size_mb: размер файла в MB (для отображения)
+            chunksize: размер фрагмента загрузки (кратен 256 KB)
+            resume_uri: URI прерванной сессии загрузки (опционально)
+            offset: число байт, уже подтвержденных в сессии
+            on_progress: вызывается после каждого фрагмента с URI сессии
+                и числом подтвержденных байт
+
+        Returns:
+            ID загруженного файла
+        """
+        print(f"📤 Потоковая загрузка на Google Drive: {filename} ({file_size_mb:.2f} MB)...")
+
+        file_id = self.upload_stream(
+            stream=stream,
+            filename=filename,
+            folder_id=self.folder_id,
+            mime_type=mime_type,
+            size=size,
+            chunksize=chunksize,
+            resume_uri=resume_uri,
+            offset=offset,
+            on_progress=on_progress
+        )
+
+        print(f"✓ Загружено на Google Drive (ID: {file_id})")
+        return file_id
+
+    def get_files_metadata(self, file_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Запрашивает метаданные файлов пакетными запросами, не скачивая их.
+
+        Args:
+            file_ids: ID файлов на Google Drive
+
+        Returns:
+            Словарь {ID файла: метаданные (id, name, size, md5Checksum,
+            trashed, mimeType) или None, если файла нет}
+        """
+        batch = DriveBatch(self, flush_interval=0)
+        futures = {
+            file_id: batch.submit(self.service.files().get(
+                fileId=file_id,
+                fields='id, name, size, md5Checksum, trashed, mimeType'
+            ))
+            for file_id in dict.fromkeys(file_ids)
+        }
+        batch.flush()
+
+        files = {}
+        for file_id, future in futures.items():
+            try:
+                files[file_id] = future.result()
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                files[file_id] = None
+        return files
+
+    def trash_file(self, file_id: str):
+        """Перемещает файл в корзину Google Drive (его можно восстановить)."""
+        self._execute(self.service.files().update(
+            fileId=file_id,
+            body={'trashed': True},
+            fields='id'
+        ))
+        if self.folder_files:
+            for name, file in list(self.folder_files.items()):
+                if file['id'] == file_id:
+                    del self.folder_files[name]
+
+    def copy_to_folder(self, file_id: str, filename: str, shortcut: bool = False) -> Optional[str]:
+        """
+        Копирует существующий файл Google Drive в установленную папку.
+
+        Копирование выполняется на стороне сервера, без передачи данных.
+
+        Args:
+            file_id: ID исходного файла
+            filename: имя копии
+            shortcut: создать ярлык на исходный файл вместо копии
+
+        Returns:
+            ID копии (ярлыка) или None, если исходного файла больше нет
+        """
+        try:
+            source = self._execute(self.service.files().get(
+                fileId=file_id,
+                fields='id, trashed'
+            ))
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            return None
+        if source.get('trashed', False):
+            return None
+
+        file_metadata = {'name': filename}
+        if self.folder_id:
+            file_metadata['parents'] = [self.folder_id]
+
+        if shortcut:
+            file_metadata['mimeType'] = 'application/vnd.google-apps.shortcut'
+            file_metadata['shortcutDetails'] = {'targetId': file_id}
+            file = self._execute(self.service.files().create(
+                body=file_metadata,
+                fields='id, name, size, md5Checksum'
+            ))
+        else:
+            file = self._execute(self.service.files().copy(
+                fileId=file_id,
+                body=file_metadata,
+                fields='id, name, size, md5Checksum'
+            ))
+
+        self._index_file(self.folder_id, file)
+        print(f"✓ {'Создан ярлык' if shortcut else 'Скопировано'} на Google Drive (ID: {file['id']})")
+        return file['id']
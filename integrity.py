@@ -0,0 +1,125 @@
+"""
+Проверка целостности переданных видео: MD5 и размер, вычисляемые по ходу
+передачи, и сверка с метаданными файла на Google Drive.
+"""
+import hashlib
+from typing import Dict, Optional, Tuple
+from progress_store import VERIFY_OK, VERIFY_SIZE, VERIFY_MISMATCH, VERIFY_MISSING
+
+
+SHORTCUT_MIME_TYPE = 'application/vnd.google-apps.shortcut'
+
+
+class IntegrityError(Exception):
+    """Файл на Google Drive не совпадает с переданными данными."""
+
+
+class TransferChecksum:
+    """
+    MD5 и размер данных, вычисляемые по мере их прохождения через передачу.
+
+    Данные должны поступать по порядку; части, пришедшие не по порядку
+    (параллельное скачивание), передаются в update_at() и ждут в памяти,
+    пока не будут получены все предыдущие. Если ждущих частей набирается
+    больше max_pending байт, они отбрасываются (overflowed) и MD5 нужно
+    посчитать по готовому файлу. Если начало файла не прошло через
+    передачу (skip()), MD5 неизвестен и сверяется только размер.
+    """
+
+    def __init__(self, max_pending: Optional[int] = None):
+        """
+        Args:
+            max_pending: сколько байт частей не по порядку можно держать в памяти
+                (None - без ограничения)
+        """
+        self._md5 = hashlib.md5()
+        self._pending = {}
+        self._pending_bytes = 0
+        self.max_pending = max_pending
+        # Части не поместились в память, данные дальше не учитываются
+        self.overflowed = False
+        # Сколько байт от начала файла учтено
+        self.size = 0
+
+    @classmethod
+    def from_file(cls, filepath: str, length: int) -> 'TransferChecksum':
+        """Учитывает первые length байт файла (например, скачанных до перезапуска)."""
+        checksum = cls()
+        remaining = length
+        with open(filepath, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(remaining, 1024 * 1024))
+                if not block:
+                    break
+                checksum.update(block)
+                remaining -= len(block)
+        return checksum
+
+    @property
+    def md5(self) -> Optional[str]:
+        """MD5 учтенных данных (None, если часть данных прошла мимо)."""
+        return self._md5.hexdigest() if self._md5 is not None else None
+
+    def update(self, data: bytes):
+        """Учитывает следующий фрагмент данных."""
+        if self._md5 is not None:
+            self._md5.update(data)
+        self.size += len(data)
+
+    def update_at(self, offset: int, data: bytes):
+        """Учитывает фрагмент со смещением offset от начала файла."""
+        if self.overflowed:
+            return
+        if offset != self.size:
+            self._pending[offset] = bytes(data)
+            self._pending_bytes += len(data)
+            if self.max_pending is not None and self._pending_bytes > self.max_pending:
+                self._pending.clear()
+                self._pending_bytes = 0
+                self._md5 = None
+                self.overflowed = True
+            return
+        self.update(data)
+        while self.size in self._pending:
+            data = self._pending.pop(self.size)
+            self._pending_bytes -= len(data)
+            self.update(data)
+
+    def skip(self, length: int):
+        """Отмечает, что length байт прошли без учета (MD5 становится неизвестен)."""
+        self._md5 = None
+        self.size += length
+
+
+def check_drive_file(drive_file: Optional[Dict], size: Optional[int] = None,
+                     md5: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """
+    Сверяет метаданные файла на Google Drive с ожидаемыми размером и MD5.
+
+    Args:
+        drive_file: метаданные файла (id, size, md5Checksum, trashed, mimeType)
+            или None, если файла нет
+        size: ожидаемый размер в байтах (размер документа Telegram)
+        md5: ожидаемый MD5 содержимого
+
+    Returns:
+        (результат проверки, описание расхождения). Результат None - сверять
+        нечего (например, ярлык или размер и MD5 неизвестны)
+    """
+    if drive_file is None or drive_file.get('trashed'):
+        return VERIFY_MISSING, 'файла нет на Google Drive'
+    if drive_file.get('mimeType') == SHORTCUT_MIME_TYPE:
+        # Содержимое ярлыка проверяется у исходного файла
+        return None, ''
+
+    drive_size = int(drive_file['size']) if drive_file.get('size') is not None else None
+    drive_md5 = drive_file.get('md5Checksum')
+    if size and drive_size is not None and drive_size != size:
+        return VERIFY_MISMATCH, f"размер на Google Drive {drive_size} байт, ожидалось {size}"
+    if md5 and drive_md5 and drive_md5 != md5:
+        return VERIFY_MISMATCH, f"MD5 на Google Drive {drive_md5}, ожидался {md5}"
+    if md5 and drive_md5:
+        return VERIFY_OK, ''
+    if size and drive_size is not None:
+        return VERIFY_SIZE, ''
+    return None, ''
@@ -0,0 +1,305 @@
+"""
+Метрики конвейера: счетчики, показатели и гистограммы в формате Prometheus.
+"""
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Границы гистограмм длительности в секундах
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+class _Metric:
+    """Общая часть метрик: имя, описание и значения по наборам меток."""
+
+    type_name = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str,
+                 labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple, extra: Optional[Dict] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        escaped = (
+            f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for name, value in pairs
+        )
+        return '{' + ','.join(escaped) + '}'
+
+    def _items(self) -> List[Tuple[Tuple, object]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._items()]
+
+    def snapshot(self) -> List[Dict]:
+        return [{'labels': dict(zip(self.labelnames, key)), 'value': value} for key, value in self._items()]
+
+
+class Gauge(_Metric):
+    """Текущее значение; может вычисляться функцией в момент чтения."""
+
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Значение будет вычисляться функцией при каждом чтении."""
+        self.set(function, **labels)
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def _current(self) -> List[Tuple[Tuple, float]]:
+        return [(key, value() if callable(value) else value) for key, value in self._items()]
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self._current()]
+
+    def snapshot(self) -> List[Dict]:
+        return [{'labels': dict(zip(self.labelnames, key)), 'value': value} for key, value in self._current()]
+
+
+class Histogram(_Metric):
+    """Распределение значений (длительностей) по корзинам."""
+
+    type_name = 'histogram'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str,
+                 labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Измеряет длительность блока with."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _items(self):
+        with self._lock:
+            return [(key, {'counts': list(state['counts']), 'sum': state['sum'], 'count': state['count']})
+                    for key, state in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, state in self._items():
+            for bound, count in zip(self.buckets, state['counts']):
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {state['count']}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {state['sum']}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        return [
+            {
+                'labels': dict(zip(self.labelnames, key)),
+                'count': state['count'],
+                'sum': round(state['sum'], 3),
+                'avg': round(state['sum'] / state['count'], 3) if state['count'] else None,
+                'buckets': dict(zip(map(str, self.buckets), state['counts']))
+            }
+            for key, state in self._items()
+        ]
+
+
+class MetricsRegistry:
+    """Набор метрик процесса."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return Counter(self, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return Gauge(self, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return Histogram(self, name, help_text, labelnames, buckets)
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict:
+        """Текущие значения всех метрик в виде словаря (для JSON)."""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def write_summary(self, filepath: str):
+        """Сохраняет значения метрик в JSON-файл."""
+        summary = {'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'metrics': self.snapshot()}
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+
+def start_http_server(registry: 'MetricsRegistry', port: int, host: str = '127.0.0.1'):
+    """
+    Запускает в фоновом потоке HTTP-сервер с эндпоинтами /metrics
+    (формат Prometheus) и /metrics.json.
+
+    Returns:
+        Сервер ThreadingHTTPServer; для остановки вызовите shutdown()
+    """
+    # http.server нужен только с METRICS_PORT, не загружаем его при каждом запуске
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = registry.render().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    return server
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'tvd_stage_seconds',
+    'Длительность стадий: scan, download, stream, upload, drive_metadata, drive_batch',
+    ('stage',)
+)
+STAGE_BYTES = REGISTRY.counter(
+    'tvd_stage_bytes_total', 'Передано байт по стадиям', ('stage',)
+)
+THROUGHPUT = REGISTRY.gauge(
+    'tvd_throughput_bytes_per_second', 'Скорость последней передачи по стадиям', ('stage',)
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    'tvd_queue_depth', 'Число видео в очередях конвейера', ('queue',)
+)
+CHANNEL_BACKLOG = REGISTRY.gauge(
+    'tvd_channel_backlog', 'Видео канала, поставленные в конвейер и еще не завершенные', ('channel',)
+)
+VIDEOS = REGISTRY.counter(
+    'tvd_videos_total', 'Обработанные видео по результату: uploaded, copied, skipped, failed',
+    ('channel', 'result')
+)
+RETRIES = REGISTRY.counter(
+    'tvd_retries_total', 'Повторы видео в конвейере по стадиям', ('stage',)
+)
+FLOOD_WAITS = REGISTRY.counter(
+    'tvd_telegram_flood_waits_total', 'Ответы FloodWait от Telegram'
+)
+FLOOD_WAIT_SECONDS = REGISTRY.counter(
+    'tvd_telegram_flood_wait_seconds_total', 'Суммарное время ожидания FloodWait'
+)
+SCAN_MESSAGES = REGISTRY.counter(
+    'tvd_scan_messages_total', 'Сообщения, полученные при сканировании топиков: fetched, matched (видео)',
+    ('channel', 'result')
+)
+TELEGRAM_SESSION_DOWNLOADS = REGISTRY.gauge(
+    'tvd_telegram_session_downloads', 'Видео, скачиваемые сейчас через аккаунт Telegram', ('session',)
+)
+DRIVE_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    'tvd_drive_pool_wait_seconds', 'Ожидание свободного HTTP-клиента Drive API в пуле',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+)
+DRIVE_POOL_CLIENTS = REGISTRY.gauge(
+    'tvd_drive_pool_clients', 'HTTP-клиенты Drive API в пуле: in_use, idle', ('state',)
+)
+ADMISSION_RESERVED = REGISTRY.gauge(
+    'tvd_admission_reserved_bytes', 'Зарезервировано передачами: disk (временные файлы), memory (буферы)',
+    ('resource',)
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    'tvd_admission_wait_seconds', 'Ожидание места на временном диске и памяти перед передачей'
+)
+VERIFICATIONS = REGISTRY.counter(
+    'tvd_verifications_total', 'Сверки файлов на Google Drive по результату: ok, size, mismatch, missing',
+    ('result',)
+)
+DRIVE_BACKOFFS = REGISTRY.counter(
+    'tvd_drive_backoffs_total', 'Повторы запросов к Google Drive по причине: rate_limit, error',
+    ('reason',)
+)
+
+
+def record_transfer(stage: str, size: int, seconds: float):
+    """Учитывает завершенную передачу файла: длительность, объем и скорость."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if size:
+        STAGE_BYTES.inc(size, stage=stage)
+        if seconds > 0:
+            THROUGHPUT.set(size / seconds, stage=stage)
+
+
+def record_flood_wait(seconds: int):
+    """Учитывает FloodWait от Telegram."""
+    FLOOD_WAITS.inc()
+    FLOOD_WAIT_SECONDS.inc(seconds)
@@ -0,0 +1,217 @@
+"""
+Параллельное скачивание больших файлов из Telegram по нескольким соединениям.
+"""
+import os
+import asyncio
+from typing import Callable, Dict, List, Optional
+from telethon import utils
+from telethon.errors import FloodWaitError
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+from telethon.tl.functions import InvokeWithLayerRequest
+from telethon.tl.functions.auth import ExportAuthorizationRequest, ImportAuthorizationRequest
+from telethon.tl.functions.upload import GetFileRequest
+from telethon.tl.types.upload import FileCdnRedirect
+import metrics
+from rate_limit import TokenBucket, backoff_delay
+
+
+# Telegram требует, чтобы размер части делил 1 MB и был кратен 4 KB
+MAX_PART_SIZE = 1024 * 1024
+PART_RETRIES = 3
+
+
+class CdnRedirectError(Exception):
+    """Файл отдается через CDN: его нужно скачать обычным способом."""
+
+
+class ParallelDownloader:
+    """
+    Скачивает файл частями одновременно по нескольким соединениям.
+
+    Файл заранее создается нужного размера, каждая часть записывается по
+    своему смещению, поэтому части могут приходить в любом порядке.
+    Соединения открываются к DC, где хранится файл (с переносом авторизации,
+    если он отличается от нашего), и переиспользуются между файлами.
+    """
+
+    def __init__(self, client, connections: int = 4, part_size: int = MAX_PART_SIZE,
+                 rate_limiter: Optional[TokenBucket] = None):
+        """
+        Args:
+            client: подключенный TelegramClient
+            connections: число параллельных соединений к DC файла
+            part_size: размер части в байтах (делитель 1 MB, кратный 4 KB)
+            rate_limiter: общий ограничитель частоты запросов к Telegram
+        """
+        if part_size % 4096 or MAX_PART_SIZE % part_size:
+            raise ValueError(f"Недопустимый размер части: {part_size}")
+
+        self.client = client
+        self.connections = max(1, connections)
+        self.part_size = part_size
+        self.rate_limiter = rate_limiter
+        self._senders: Dict[int, List[MTProtoSender]] = {}
+        self._auth_keys = {}
+        self._lock = asyncio.Lock()
+
+    async def _create_sender(self, dc_id: int) -> MTProtoSender:
+        """Открывает новое соединение к DC с нашей авторизацией."""
+        client = self.client
+        dc = await client._get_dc(dc_id)
+
+        if dc_id == client.session.dc_id:
+            auth_key = client.session.auth_key
+        else:
+            auth_key = self._auth_keys.get(dc_id)
+
+        sender = MTProtoSender(auth_key, loggers=client._log)
+        await sender.connect(client._connection(
+            dc.ip_address,
+            dc.port,
+            dc.id,
+            loggers=client._log,
+            proxy=client._proxy,
+            local_addr=client._local_addr
+        ))
+
+        if auth_key is None:
+            # Первое соединение к чужому DC: переносим авторизацию,
+            # остальные соединения используют полученный ключ
+            auth = await client(ExportAuthorizationRequest(dc_id))
+            client._init_request.query = ImportAuthorizationRequest(id=auth.id, bytes=auth.bytes)
+            await sender.send(InvokeWithLayerRequest(LAYER, client._init_request))
+            self._auth_keys[dc_id] = sender.auth_key
+
+        return sender
+
+    async def _get_senders(self, dc_id: int) -> List[MTProtoSender]:
+        """Возвращает пул соединений к DC, создавая его при первом обращении."""
+        async with self._lock:
+            senders = self._senders.get(dc_id)
+            if senders is None:
+                # Первое соединение создаем отдельно: оно может переносить авторизацию
+                senders = [await self._create_sender(dc_id)]
+                senders += await asyncio.gather(*(
+                    self._create_sender(dc_id) for _ in range(self.connections - 1)
+                ))
+                self._senders[dc_id] = senders
+            return senders
+
+    async def download(self, document, filepath: str, size: Optional[int] = None,
+                       offset: int = 0,
+                       on_progress: Optional[Callable[[int], None]] = None,
+                       on_data: Optional[Callable[[int, bytes], None]] = None) -> int:
+        """
+        Скачивает документ в файл.
+
+        Args:
+            document: документ Telegram (message.document)
+            filepath: путь к файлу для сохранения
+            size: размер файла в байтах (по умолчанию document.size)
+            offset: сколько байт от начала файла уже скачано (для продолжения)
+            on_progress: вызывается с числом байт от начала файла, скачанных
+                без пропусков (для контрольных точек)
+            on_data: вызывается для каждой записанной части со смещением и
+                данными (части приходят не по порядку); скачивание начинается
+                с части, содержащей offset
+
+        Returns:
+            Число скачанных байт
+        """
+        size = document.size if size is None else size
+        dc_id, location = utils.get_input_location(document)
+        senders = await self._get_senders(dc_id)
+
+        part_count = (size + self.part_size - 1) // self.part_size
+        first_part = offset // self.part_size if os.path.exists(filepath) else 0
+        parts = asyncio.Queue()
+        for index in range(first_part, part_count):
+            parts.put_nowait(index)
+
+        # Заранее выделяем файл, чтобы части записывались по своим смещениям
+        with open(filepath, 'r+b' if first_part else 'wb') as f:
+            f.truncate(size)
+
+        # Части завершаются не по порядку; прогресс - это начало файла без пропусков
+        finished_parts = set()
+        contiguous_part = first_part
+
+        def part_done(index: int):
+            nonlocal contiguous_part
+            finished_parts.add(index)
+            while contiguous_part in finished_parts:
+                finished_parts.discard(contiguous_part)
+                contiguous_part += 1
+            if on_progress:
+                on_progress(min(contiguous_part * self.part_size, size))
+
+        async def worker(sender: MTProtoSender):
+            with open(filepath, 'r+b') as f:
+                while True:
+                    try:
+                        index = parts.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    data = await self._fetch_part(sender, location, index)
+                    f.seek(index * self.part_size)
+                    f.write(data)
+                    f.flush()
+                    if on_data:
+                        on_data(index * self.part_size, data)
+                    part_done(index)
+
+        workers = [asyncio.ensure_future(worker(sender)) for sender in senders]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+        downloaded = os.path.getsize(filepath)
+        if downloaded != size:
+            raise IOError(f"Скачано {downloaded} байт из {size}")
+        return downloaded
+
+    async def _fetch_part(self, sender: MTProtoSender, location, index: int) -> bytes:
+        """
+        Скачивает одну часть файла с повторами при ошибках.
+
+        FloodWait не считается ошибкой части: после ожидания запрос
+        повторяется, не расходуя попытки PART_RETRIES.
+        """
+        errors = 0
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.wait()
+            try:
+                result = await sender.send(GetFileRequest(
+                    location,
+                    offset=index * self.part_size,
+                    limit=self.part_size
+                ))
+                if isinstance(result, FileCdnRedirect):
+                    raise CdnRedirectError('Файлы через CDN скачиваются обычным способом')
+                return result.bytes
+            except FloodWaitError as e:
+                metrics.record_flood_wait(e.seconds)
+                # Ограничение действует на весь аккаунт: приостанавливаем все соединения
+                if self.rate_limiter:
+                    self.rate_limiter.pause(e.seconds)
+                    continue
+                await asyncio.sleep(e.seconds)
+            except (ConnectionError, asyncio.TimeoutError):
+                errors += 1
+                if errors >= PART_RETRIES:
+                    raise
+                await asyncio.sleep(backoff_delay(errors - 1))
+
+    async def close(self):
+        """Закрывает все открытые соединения."""
+        async with self._lock:
+            for senders in self._senders.values():
+                for sender in senders:
+                    await sender.disconnect()
+            self._senders = {}
@@ -0,0 +1,425 @@
+"""
+Хранилище прогресса скачивания на SQLite.
+"""
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+# Видео загружено на Google Drive в этом или предыдущем запуске
+STATUS_UPLOADED = 'uploaded'
+# Файл уже был на Google Drive, видео только отмечено в базе
+STATUS_FOUND_ON_DRIVE = 'found_on_drive'
+# Такой же файл уже был на Google Drive, он скопирован без повторной передачи
+STATUS_COPIED = 'copied'
+
+# Файл на Google Drive не прошел сверку, видео будет передано заново
+STATUS_REQUEUED = 'requeued'
+
+DONE_STATUSES = (STATUS_UPLOADED, STATUS_FOUND_ON_DRIVE, STATUS_COPIED)
+
+# Результаты сверки файла на Google Drive: совпали размер и MD5, совпал
+# размер (MD5 неизвестен), есть расхождение, файла нет
+VERIFY_OK = 'ok'
+VERIFY_SIZE = 'size'
+VERIFY_MISMATCH = 'mismatch'
+VERIFY_MISSING = 'missing'
+
+
+class DownloadProgress:
+    """
+    Класс для отслеживания прогресса скачивания.
+
+    Каждое видео хранится отдельной строкой с ключом (chat_id, topic_id,
+    message_id), поэтому отметка о загрузке - это одна запись, а не
+    перезапись всей истории. База работает в режиме WAL и может
+    использоваться из нескольких потоков.
+    """
+
+    def __init__(self, db_file: str, legacy_json_file: Optional[str] = None):
+        """
+        Args:
+            db_file: путь к файлу базы SQLite
+            legacy_json_file: путь к старому download_progress.json для
+                однократного переноса данных (опционально)
+        """
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._init_schema()
+
+        if legacy_json_file:
+            self.migrate_json(legacy_json_file)
+
+        print(f"✓ Загружен прогресс: {self.count_downloaded()} файлов уже скачано")
+
+    def _init_schema(self):
+        """Создает таблицы и настраивает базу."""
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA busy_timeout=5000')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS downloads (
+                    chat_id INTEGER NOT NULL,
+                    topic_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    drive_file_id TEXT,
+                    size INTEGER,
+                    md5 TEXT,
+                    verified TEXT,
+                    verified_at TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (chat_id, topic_id, message_id)
+                ) WITHOUT ROWID
+            ''')
+            # Базы, созданные до сверки файлов, дополняются новыми столбцами
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(downloads)')}
+            for column in ('md5', 'verified', 'verified_at'):
+                if column not in columns:
+                    self._conn.execute(f'ALTER TABLE downloads ADD COLUMN {column} TEXT')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS channel_state (
+                    chat_id INTEGER NOT NULL,
+                    topic_id INTEGER NOT NULL,
+                    last_message_id INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (chat_id, topic_id)
+                ) WITHOUT ROWID
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS transfers (
+                    chat_id INTEGER NOT NULL,
+                    topic_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    temp_path TEXT,
+                    total_size INTEGER,
+                    downloaded_bytes INTEGER NOT NULL DEFAULT 0,
+                    upload_session_uri TEXT,
+                    uploaded_bytes INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (chat_id, topic_id, message_id)
+                ) WITHOUT ROWID
+            ''')
+            # Загруженные файлы по ID документа Telegram (общий для репостов)
+            # и по MD5 содержимого - для копирования вместо повторной передачи
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    document_id INTEGER PRIMARY KEY,
+                    md5 TEXT,
+                    size INTEGER,
+                    drive_file_id TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS documents_md5 ON documents (md5)')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            (key, value)
+        )
+
+    def migrate_json(self, json_file: str):
+        """Однократно переносит прогресс из старого JSON-файла."""
+        with self._lock:
+            if self._get_meta('json_migrated') or not os.path.exists(json_file):
+                return
+
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"⚠ Ошибка чтения {json_file}, перенос пропущен: {e}")
+                return
+
+            now = datetime.now().isoformat()
+            rows = []
+            for channel_key, message_ids in data.get('downloaded_ids', {}).items():
+                chat_id, topic_id = channel_key.rsplit('_', 1)
+                for message_id in message_ids:
+                    rows.append((int(chat_id), int(topic_id), int(message_id),
+                                 STATUS_UPLOADED, now, now))
+
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany('''
+                    INSERT OR IGNORE INTO downloads
+                        (chat_id, topic_id, message_id, status, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                self._set_meta('json_migrated', now)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+        print(f"✓ Прогресс перенесен из {json_file}: {len(rows)} записей")
+
+    def count_downloaded(self) -> int:
+        """Возвращает число обработанных видео."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM downloads WHERE status IN ({','.join('?' * len(DONE_STATUSES))})",
+                DONE_STATUSES
+            ).fetchone()
+        return row[0]
+
+    def is_downloaded(self, chat_id: int, topic_id: int, message_id: int) -> bool:
+        """Проверяет, был ли уже скачан файл."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status FROM downloads WHERE chat_id = ? AND topic_id = ? AND message_id = ?',
+                (chat_id, topic_id, message_id)
+            ).fetchone()
+        return row is not None and row[0] in DONE_STATUSES
+
+    def mark_downloaded(self, chat_id: int, topic_id: int, message_id: int,
+                        drive_file_id: Optional[str] = None, size: Optional[int] = None,
+                        status: str = STATUS_UPLOADED, md5: Optional[str] = None,
+                        verified: Optional[str] = None):
+        """
+        Отмечает файл как скачанный.
+
+        Args:
+            drive_file_id: ID файла на Google Drive (если известен)
+            size: размер файла в байтах (если известен)
+            status: STATUS_UPLOADED, STATUS_FOUND_ON_DRIVE или STATUS_COPIED
+            md5: MD5 переданных данных (если известен)
+            verified: результат сверки с файлом на Google Drive (VERIFY_*)
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO downloads
+                    (chat_id, topic_id, message_id, status, drive_file_id, size, md5,
+                     verified, verified_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chat_id, topic_id, message_id) DO UPDATE SET
+                    status = excluded.status,
+                    drive_file_id = COALESCE(excluded.drive_file_id, downloads.drive_file_id),
+                    size = COALESCE(excluded.size, downloads.size),
+                    md5 = COALESCE(excluded.md5, downloads.md5),
+                    verified = excluded.verified,
+                    verified_at = excluded.verified_at,
+                    updated_at = excluded.updated_at
+            ''', (chat_id, topic_id, message_id, status, drive_file_id, size, md5,
+                  verified, now if verified else None, now, now))
+
+    def list_uploaded(self) -> List[Dict]:
+        """
+        Возвращает видео, для которых известен файл на Google Drive.
+
+        Returns:
+            Список словарей с полями chat_id, topic_id, message_id, status,
+            drive_file_id, size, md5
+        """
+        with self._lock:
+            rows = self._conn.execute(f'''
+                SELECT chat_id, topic_id, message_id, status, drive_file_id, size, md5
+                FROM downloads
+                WHERE drive_file_id IS NOT NULL AND status IN ({','.join('?' * len(DONE_STATUSES))})
+                ORDER BY chat_id, topic_id, message_id
+            ''', DONE_STATUSES).fetchall()
+        columns = ('chat_id', 'topic_id', 'message_id', 'status', 'drive_file_id', 'size', 'md5')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def save_verification(self, chat_id: int, topic_id: int, message_id: int, verified: str):
+        """Сохраняет результат сверки видео с файлом на Google Drive."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute('''
+                UPDATE downloads SET verified = ?, verified_at = ?
+                WHERE chat_id = ? AND topic_id = ? AND message_id = ?
+            ''', (verified, now, chat_id, topic_id, message_id))
+
+    def requeue(self, chat_id: int, topic_id: int, message_id: int, verified: Optional[str] = None):
+        """
+        Снимает отметку о загрузке видео, чтобы оно было передано заново.
+
+        Отметка обработанных сообщений канала опускается до этого видео,
+        поэтому следующее сканирование канала до него дойдет.
+
+        Args:
+            verified: результат сверки, из-за которого видео передается заново
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.execute('''
+                    UPDATE downloads SET status = ?, drive_file_id = NULL, verified = ?,
+                        verified_at = ?, updated_at = ?
+                    WHERE chat_id = ? AND topic_id = ? AND message_id = ?
+                ''', (STATUS_REQUEUED, verified, now, now, chat_id, topic_id, message_id))
+                self._conn.execute('''
+                    UPDATE channel_state SET
+                        last_message_id = MIN(last_message_id, ?), updated_at = ?
+                    WHERE chat_id = ? AND topic_id = ?
+                ''', (message_id - 1, now, chat_id, topic_id))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def find_document(self, document_id: Optional[int] = None,
+                      md5: Optional[str] = None, size: Optional[int] = None) -> Optional[Dict]:
+        """
+        Ищет уже загруженный файл по ID документа Telegram или по MD5 и размеру.
+
+        Returns:
+            Словарь с полями document_id, md5, size, drive_file_id или None
+        """
+        with self._lock:
+            if document_id is not None:
+                row = self._conn.execute(
+                    'SELECT document_id, md5, size, drive_file_id FROM documents WHERE document_id = ?',
+                    (document_id,)
+                ).fetchone()
+            elif md5:
+                row = self._conn.execute(
+                    'SELECT document_id, md5, size, drive_file_id FROM documents WHERE md5 = ? AND size = ?',
+                    (md5, size)
+                ).fetchone()
+            else:
+                row = None
+
+        if row is None:
+            return None
+        return {'document_id': row[0], 'md5': row[1], 'size': row[2], 'drive_file_id': row[3]}
+
+    def save_document(self, document_id: int, drive_file_id: str,
+                      md5: Optional[str] = None, size: Optional[int] = None):
+        """Запоминает файл на Google Drive для документа Telegram."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO documents (document_id, md5, size, drive_file_id, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (document_id) DO UPDATE SET
+                    md5 = COALESCE(excluded.md5, documents.md5),
+                    size = COALESCE(excluded.size, documents.size),
+                    drive_file_id = excluded.drive_file_id,
+                    updated_at = excluded.updated_at
+            ''', (document_id, md5, size, drive_file_id, now))
+
+    def forget_drive_file(self, drive_file_id: str):
+        """Удаляет из индекса документов файл, которого больше нет на Google Drive."""
+        with self._lock:
+            self._conn.execute('DELETE FROM documents WHERE drive_file_id = ?', (drive_file_id,))
+
+    def get_high_water_mark(self, chat_id: int, topic_id: int) -> int:
+        """
+        Возвращает ID последнего сообщения канала, до которого (включительно)
+        все сообщения обработаны. 0, если канал еще не сканировался.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT last_message_id FROM channel_state WHERE chat_id = ? AND topic_id = ?',
+                (chat_id, topic_id)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_high_water_mark(self, chat_id: int, topic_id: int, message_id: int):
+        """Сохраняет отметку обработанных сообщений канала (только увеличивает ее)."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO channel_state (chat_id, topic_id, last_message_id, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (chat_id, topic_id) DO UPDATE SET
+                    last_message_id = MAX(channel_state.last_message_id, excluded.last_message_id),
+                    updated_at = excluded.updated_at
+            ''', (chat_id, topic_id, message_id, now))
+
+    def get_transfer(self, chat_id: int, topic_id: int, message_id: int) -> Optional[Dict]:
+        """
+        Возвращает контрольную точку незавершенной передачи видео.
+
+        Returns:
+            Словарь с полями temp_path, total_size, downloaded_bytes,
+            upload_session_uri, uploaded_bytes или None
+        """
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT temp_path, total_size, downloaded_bytes, upload_session_uri, uploaded_bytes
+                FROM transfers WHERE chat_id = ? AND topic_id = ? AND message_id = ?
+            ''', (chat_id, topic_id, message_id)).fetchone()
+
+        if row is None:
+            return None
+        return {
+            'temp_path': row[0],
+            'total_size': row[1],
+            'downloaded_bytes': row[2],
+            'upload_session_uri': row[3],
+            'uploaded_bytes': row[4]
+        }
+
+    def save_transfer(self, chat_id: int, topic_id: int, message_id: int, **fields):
+        """
+        Сохраняет контрольную точку передачи видео.
+
+        Args:
+            fields: обновляемые поля (temp_path, total_size, downloaded_bytes,
+                upload_session_uri, uploaded_bytes)
+        """
+        allowed = ('temp_path', 'total_size', 'downloaded_bytes', 'upload_session_uri', 'uploaded_bytes')
+        unknown = set(fields) - set(allowed)
+        if unknown:
+            raise ValueError(f"Неизвестные поля контрольной точки: {', '.join(sorted(unknown))}")
+
+        columns = list(fields)
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(f'''
+                INSERT INTO transfers (chat_id, topic_id, message_id, {', '.join(columns + ['updated_at'])})
+                VALUES (?, ?, ?, {', '.join('?' * (len(columns) + 1))})
+                ON CONFLICT (chat_id, topic_id, message_id) DO UPDATE SET
+                    {', '.join(f'{column} = excluded.{column}' for column in columns + ['updated_at'])}
+            ''', (chat_id, topic_id, message_id, *(fields[column] for column in columns), now))
+
+    def delete_transfer(self, chat_id: int, topic_id: int, message_id: int):
+        """Удаляет контрольную точку завершенной передачи."""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM transfers WHERE chat_id = ? AND topic_id = ? AND message_id = ?',
+                (chat_id, topic_id, message_id)
+            )
+
+    def pop_stale_transfers(self, max_age_days: int) -> List[Dict]:
+        """
+        Удаляет контрольные точки, которые не обновлялись дольше max_age_days.
+
+        Returns:
+            Список удаленных контрольных точек (для удаления их временных файлов)
+        """
+        cutoff = datetime.fromtimestamp(
+            datetime.now().timestamp() - max_age_days * 86400
+        ).isoformat()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT temp_path FROM transfers WHERE updated_at < ?', (cutoff,)
+            ).fetchall()
+            self._conn.execute('DELETE FROM transfers WHERE updated_at < ?', (cutoff,))
+        return [{'temp_path': row[0]} for row in rows]
+
+    def close(self):
+        """Закрывает базу."""
+        with self._lock:
+            self._conn.close()
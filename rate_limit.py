@@ -0,0 +1,78 @@
+"""
+Ограничение частоты запросов к Telegram и Google Drive.
+"""
+import time
+import random
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты запросов (token bucket).
+
+    Токены пополняются со скоростью rate в секунду, но не больше burst.
+    Каждый запрос забирает токен; если токенов нет, вызывающий ждет своей
+    очереди. Через pause() можно приостановить все запросы, например на
+    время FloodWait от Telegram или после ответа о превышении квоты Drive.
+    Используется и из потоков (acquire), и из корутин (wait).
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: запросов в секунду (0 - без ограничения)
+            burst: сколько запросов можно выполнить подряд без ожидания
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """Забирает токены и возвращает, сколько секунд ждать до запроса."""
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            if self.rate > 0:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Токен может уйти в минус: это очередь уже ожидающих запросов
+                self._tokens -= tokens
+                if self._tokens < 0:
+                    delay = -self._tokens / self.rate
+            return max(delay, self._paused_until - now)
+
+    def pause(self, seconds: float):
+        """Приостанавливает все запросы на seconds секунд."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, tokens: int = 1):
+        """Ждет разрешения на tokens запросов (блокирует поток)."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait(self, tokens: int = 1):
+        """Ждет разрешения на tokens запросов, не блокируя цикл событий."""
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """
+    Задержка перед повтором с экспоненциальным ростом и случайным разбросом.
+
+    Разброс (full jitter) не дает параллельным воркерам повторять запросы
+    одновременно.
+
+    Args:
+        attempt: номер повтора, начиная с 0
+        base: задержка первого повтора в секундах
+        cap: максимальная задержка в секундах
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
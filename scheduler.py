@@ -0,0 +1,167 @@
+"""
+Порядок передачи видео, ожидающих скачивания.
+"""
+import heapq
+import itertools
+from typing import Dict, Hashable, List, Tuple
+
+
+# fifo - по порядку сообщений; newest - сначала новые; smallest - сначала
+# маленькие; priority - по приоритету канала; round_robin - по очереди из
+# каждого канала
+SCHEDULE_POLICIES = ('fifo', 'newest', 'smallest', 'priority', 'round_robin')
+
+
+class _ChannelBacklog:
+    """Видео одного канала, ожидающие передачи, и число видео в передаче."""
+
+    def __init__(self, max_in_flight: int = 0, priority: int = 0):
+        self.max_in_flight = max_in_flight
+        self.priority = priority
+        self.in_flight = 0
+        # Кучи (ключ, элемент) отдельно для маленьких и больших файлов
+        self.small = []
+        self.large = []
+
+    def has_capacity(self) -> bool:
+        return not self.max_in_flight or self.in_flight < self.max_in_flight
+
+
+class BacklogScheduler:
+    """
+    Очередь видео, ожидающих передачи, упорядоченная по политике.
+
+    Каналы ограничены числом одновременно передаваемых видео, чтобы один
+    канал не занял все воркеры. Большие файлы чередуются с маленькими:
+    пока есть маленькие файлы, одновременно передается не больше max_large
+    больших, и один большой файл не задерживает очередь из маленьких.
+    """
+
+    def __init__(self, policy: str = 'fifo', large_file_size: int = 0, max_large: int = 1):
+        """
+        Args:
+            policy: политика из SCHEDULE_POLICIES
+            large_file_size: размер, начиная с которого файл считается большим (0 - не различать)
+            max_large: сколько больших файлов передается одновременно при наличии маленьких
+        """
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"Неизвестная политика очереди: {policy} (допустимо: {', '.join(SCHEDULE_POLICIES)})")
+        self.policy = policy
+        self.large_file_size = large_file_size
+        self.max_large = max(1, max_large)
+        self._channels: Dict[Hashable, _ChannelBacklog] = {}
+        # Каналы по порядку регистрации и следующий канал для round_robin
+        self._rotation: List[Hashable] = []
+        self._next_channel = 0
+        # Элементы в передаче: {элемент: (канал, большой ли файл)}
+        self._in_flight: Dict[object, Tuple[Hashable, bool]] = {}
+        self._large_in_flight = 0
+        self._sequence = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Число видео, ожидающих передачи."""
+        return self._size
+
+    def add_channel(self, channel: Hashable, max_in_flight: int = 0, priority: int = 0):
+        """
+        Регистрирует канал.
+
+        Args:
+            max_in_flight: сколько видео канала передается одновременно (0 - без ограничения)
+            priority: приоритет канала для политики priority (больше - раньше)
+        """
+        backlog = self._channels.get(channel)
+        if backlog is None:
+            self._channels[channel] = _ChannelBacklog(max_in_flight, priority)
+            self._rotation.append(channel)
+        else:
+            backlog.max_in_flight = max_in_flight
+            backlog.priority = priority
+
+    def push(self, channel: Hashable, item, size: int = 0, timestamp: float = 0.0):
+        """Добавляет видео канала в очередь."""
+        if channel not in self._channels:
+            self.add_channel(channel)
+        backlog = self._channels[channel]
+        sequence = next(self._sequence)
+
+        if self.policy == 'newest':
+            key = (-timestamp, -sequence)
+        elif self.policy == 'smallest':
+            key = (size, sequence)
+        elif self.policy == 'priority':
+            key = (-backlog.priority, sequence)
+        else:
+            key = (sequence,)
+
+        large = bool(self.large_file_size) and size >= self.large_file_size
+        heapq.heappush(backlog.large if large else backlog.small, (key, sequence, item))
+        self._size += 1
+
+    def pop(self):
+        """
+        Забирает следующее видео для передачи.
+
+        Returns:
+            Видео или None, если все ожидающие видео относятся к каналам,
+            исчерпавшим лимит одновременных передач
+        """
+        best = None
+        best_small = None
+        count = len(self._rotation)
+        for position in range(count):
+            index = (self._next_channel + position) % count
+            channel = self._rotation[index]
+            backlog = self._channels[channel]
+            if not backlog.has_capacity():
+                continue
+            # Для round_robin важнее очередь каналов, для остальных политик - ключ видео
+            prefix = (position,) if self.policy == 'round_robin' else ()
+            if backlog.small:
+                candidate = (prefix + backlog.small[0][0], index, backlog.small)
+                if best_small is None or candidate[0] < best_small[0]:
+                    best_small = candidate
+            if backlog.large:
+                candidate = (prefix + backlog.large[0][0], index, backlog.large)
+                if best is None or candidate[0] < best[0]:
+                    best = candidate
+
+        if best_small is not None and (best is None or best_small[0] < best[0]
+                                       or self._large_in_flight >= self.max_large):
+            best = best_small
+        if best is None:
+            return None
+
+        _, index, heap = best
+        channel = self._rotation[index]
+        backlog = self._channels[channel]
+        _, _, item = heapq.heappop(heap)
+        large = heap is backlog.large
+
+        self._size -= 1
+        backlog.in_flight += 1
+        self._large_in_flight += large
+        self._in_flight[item] = (channel, large)
+        if self.policy == 'round_robin':
+            self._next_channel = (index + 1) % count
+        return item
+
+    def release(self, item):
+        """Отмечает, что передача видео, выданного pop(), завершена."""
+        entry = self._in_flight.pop(item, None)
+        if entry is None:
+            return
+        channel, large = entry
+        self._channels[channel].in_flight -= 1
+        self._large_in_flight -= large
+
+    def drain(self) -> List:
+        """Забирает из очереди все ожидающие видео (без учета лимитов)."""
+        items = []
+        for backlog in self._channels.values():
+            for heap in (backlog.small, backlog.large):
+                items.extend(item for _, _, item in heap)
+                heap.clear()
+        self._size = 0
+        return items
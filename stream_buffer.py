@@ -0,0 +1,110 @@
+"""
+Ограниченный буфер для потоковой передачи данных из Telegram в Google Drive.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Optional
+
+
+class StreamAborted(Exception):
+    """Передача через буфер прервана одной из сторон."""
+
+
+class ChunkRingBuffer:
+    """
+    Потокобезопасный буфер фрагментов ограниченного размера.
+
+    Асинхронный производитель (скачивание из Telegram) добавляет фрагменты
+    через put(), потребитель в отдельном потоке (загрузка на Google Drive)
+    читает байты через read(). Когда в буфере накоплено capacity байт,
+    производитель ждет, поэтому расход памяти не зависит от размера файла.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: максимальный объем непрочитанных данных в байтах
+        """
+        self.capacity = capacity
+        self._chunks = deque()
+        self._buffered = 0
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    @property
+    def buffered(self) -> int:
+        """Объем непрочитанных данных в байтах."""
+        return self._buffered
+
+    def _has_room(self) -> bool:
+        # Один фрагмент принимается всегда, иначе большой фрагмент не пройдет никогда
+        return self._buffered < self.capacity or not self._chunks
+
+    def put_blocking(self, chunk: bytes):
+        """Добавляет фрагмент, ожидая освобождения места (для потоков)."""
+        with self._condition:
+            while not self._has_room() and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise StreamAborted(str(self._error))
+            self._chunks.append(bytes(chunk))
+            self._buffered += len(chunk)
+            self._condition.notify_all()
+
+    async def put(self, chunk: bytes):
+        """Добавляет фрагмент, не блокируя цикл событий при заполненном буфере."""
+        with self._condition:
+            if self._error is not None:
+                raise StreamAborted(str(self._error))
+            if self._has_room():
+                self._chunks.append(bytes(chunk))
+                self._buffered += len(chunk)
+                self._condition.notify_all()
+                return
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.put_blocking, chunk)
+
+    def close(self):
+        """Отмечает конец данных."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self, error: Optional[BaseException] = None):
+        """Прерывает передачу: ожидающие put() и read() получат StreamAborted."""
+        with self._condition:
+            self._error = error or StreamAborted('передача прервана')
+            self._chunks.clear()
+            self._buffered = 0
+            self._condition.notify_all()
+
+    def read(self, size: int) -> bytes:
+        """
+        Читает до size байт, ожидая данных от производителя.
+
+        Возвращает меньше size байт только в конце потока.
+        """
+        parts = []
+        remaining = size
+        with self._condition:
+            while remaining > 0:
+                while not self._chunks and not self._closed and self._error is None:
+                    self._condition.wait()
+                if self._error is not None:
+                    raise StreamAborted(str(self._error))
+                if not self._chunks:
+                    break
+
+                chunk = self._chunks.popleft()
+                if len(chunk) > remaining:
+                    self._chunks.appendleft(chunk[remaining:])
+                    chunk = chunk[:remaining]
+                parts.append(chunk)
+                remaining -= len(chunk)
+                self._buffered -= len(chunk)
+                self._condition.notify_all()
+
+        return b''.join(parts)
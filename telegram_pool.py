@@ -0,0 +1,127 @@
+"""
+Пул аккаунтов Telegram для распределения скачивания видео.
+"""
+import time
+from typing import List
+import metrics
+from rate_limit import TokenBucket
+
+
+class TelegramSession:
+    """Клиент одного аккаунта Telegram с собственным ограничителем и состоянием."""
+
+    def __init__(self, name: str, client, rate_limit: float = 0):
+        """
+        Args:
+            name: имя аккаунта для вывода и метрик
+            client: TelegramClient аккаунта
+            rate_limit: запросов в секунду для аккаунта (0 - без ограничения)
+        """
+        self.name = name
+        self.client = client
+        self.limiter = TokenBucket(rate_limit, burst=max(1, int(rate_limit)))
+        # Сколько видео аккаунт скачивает сейчас
+        self.active = 0
+        # До какого момента (time.monotonic) аккаунт выведен из ротации из-за FloodWait
+        self.flood_until = 0.0
+        # Чаты, сообщения которых аккаунту недоступны
+        self.unavailable_chats = set()
+        metrics.TELEGRAM_SESSION_DOWNLOADS.set_function(lambda: self.active, session=name)
+
+    @property
+    def healthy(self) -> bool:
+        """Аккаунт не ограничен FloodWait."""
+        return time.monotonic() >= self.flood_until
+
+    def flood_wait(self, seconds: int):
+        """Выводит аккаунт из ротации на время FloodWait."""
+        self.flood_until = max(self.flood_until, time.monotonic() + seconds)
+        self.limiter.pause(seconds)
+
+
+class TelegramSessionPool:
+    """
+    Набор аккаунтов Telegram, между которыми распределяется скачивание.
+
+    Каждое видео скачивается одним аккаунтом: выбирается наименее занятый
+    из аккаунтов, не ограниченных FloodWait и имеющих доступ к чату.
+    Первый аккаунт - основной: через него сканируется история и приходят
+    события о новых сообщениях.
+    """
+
+    def __init__(self, sessions: List[TelegramSession]):
+        if not sessions:
+            raise ValueError('Нужен хотя бы один аккаунт Telegram')
+        self.sessions = list(sessions)
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @property
+    def primary(self) -> TelegramSession:
+        """Основной аккаунт."""
+        return self.sessions[0]
+
+    async def connect(self) -> bool:
+        """
+        Подключает все аккаунты; неавторизованные дополнительные аккаунты
+        исключаются из пула.
+
+        Returns:
+            False, если не авторизован основной аккаунт
+        """
+        connected = []
+        for session in self.sessions:
+            await session.client.connect()
+            if await session.client.is_user_authorized():
+                connected.append(session)
+            elif session is self.primary:
+                return False
+            else:
+                print(f"⚠ Аккаунт {session.name} не авторизован и не будет использоваться")
+                await session.client.disconnect()
+        self.sessions = connected
+        return True
+
+    async def disconnect(self):
+        """Отключает все аккаунты."""
+        for session in self.sessions:
+            await session.client.disconnect()
+
+    def session_for(self, client) -> TelegramSession:
+        """Аккаунт, которому принадлежит клиент (по умолчанию основной)."""
+        for session in self.sessions:
+            if session.client is client:
+                return session
+        return self.primary
+
+    def has_healthy(self, chat_id: int) -> bool:
+        """Есть ли аккаунт с доступом к чату, не ограниченный FloodWait."""
+        return any(
+            session.healthy and chat_id not in session.unavailable_chats
+            for session in self.sessions
+        )
+
+    def choose(self, chat_id: int, key: int = 0) -> TelegramSession:
+        """
+        Выбирает аккаунт для скачивания видео из чата.
+
+        Args:
+            key: номер сообщения; распределяет видео между одинаково
+                занятыми аккаунтами
+
+        Returns:
+            Наименее занятый доступный аккаунт, а если все ограничены
+            FloodWait - тот, который освободится раньше
+        """
+        candidates = [
+            session for session in self.sessions
+            if chat_id not in session.unavailable_chats
+        ] or [self.primary]
+        healthy = [session for session in candidates if session.healthy]
+        if not healthy:
+            return min(candidates, key=lambda session: session.flood_until)
+
+        least = min(session.active for session in healthy)
+        least_loaded = [session for session in healthy if session.active == least]
+        return least_loaded[key % len(least_loaded)]
@@ -0,0 +1,44 @@
+"""
+Контрольные суммы передачи.
+
+Запуск из корня репозитория:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import hashlib
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrity import TransferChecksum
+
+
+DATA = bytes(range(256)) * 40
+PARTS = [(offset, DATA[offset:offset + 1024]) for offset in range(0, len(DATA), 1024)]
+
+
+class TransferChecksumTest(unittest.TestCase):
+    """Учет частей, пришедших не по порядку."""
+
+    def test_out_of_order_parts_within_limit(self):
+        checksum = TransferChecksum(max_pending=4 * 1024)
+        for offset, data in PARTS[2::-1] + PARTS[3:]:
+            checksum.update_at(offset, data)
+
+        self.assertFalse(checksum.overflowed)
+        self.assertEqual(checksum.size, len(DATA))
+        self.assertEqual(checksum.md5, hashlib.md5(DATA).hexdigest())
+
+    def test_lagging_part_drops_pending_parts(self):
+        checksum = TransferChecksum(max_pending=4 * 1024)
+        for offset, data in PARTS[1:] + PARTS[:1]:
+            checksum.update_at(offset, data)
+
+        self.assertTrue(checksum.overflowed)
+        self.assertIsNone(checksum.md5)
+        self.assertEqual(checksum._pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Сценарии конвейера передачи на имитациях Telegram и Google Drive.
+
+Запуск из корня репозитория:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+
+import download_videos as dv
+from admission import AdmissionController
+from progress_store import DownloadProgress
+from fake_drive import FakeDriveHttp
+from fake_telegram import FakeTelegramClient
+from run import MB, parse_args, sync_channels
+
+
+class FailingOnceTelegramClient(FakeTelegramClient):
+    """Клиент, у которого первое скачивание видео обрывается с ошибкой."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.failed = False
+
+    async def iter_download(self, document, offset: int = 0, **kwargs):
+        async for chunk in super().iter_download(document, offset=offset, **kwargs):
+            if not self.failed:
+                self.failed = True
+                raise ConnectionError('Соединение разорвано')
+            yield chunk
+
+
+class TransferPipelineAdmissionTest(unittest.TestCase):
+    """Допуск передач по бюджету временного диска."""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._workdir = tempfile.TemporaryDirectory(prefix='tvd-test-')
+        os.chdir(self._workdir.name)
+        self._config = {
+            name: getattr(dv, name) for name in (
+                'PARTIAL_DIR', 'TASK_RETRY_DELAY', 'PARALLEL_DOWNLOAD_THRESHOLD',
+                'TEMP_DISK_RESERVE', 'TEMP_DISK_LIMIT', 'MEMORY_LIMIT', 'DEDUP_MODE'
+            )
+        }
+        dv.PARTIAL_DIR = os.path.join(self._workdir.name, 'partial')
+        dv.TASK_RETRY_DELAY = 0.1
+        dv.PARALLEL_DOWNLOAD_THRESHOLD = 0
+        dv.TEMP_DISK_RESERVE = 0
+        dv.DEDUP_MODE = 'copy'
+
+    def tearDown(self):
+        for name, value in self._config.items():
+            setattr(dv, name, value)
+        os.chdir(self._cwd)
+        self._workdir.cleanup()
+
+    def test_retry_is_not_blocked_by_downloads_waiting_for_disk(self):
+        # Видео на повторе держит место на диске; воркеры скачивания, ждущие
+        # места для следующих видео, не должны помешать ему скачаться
+        dv.TEMP_DISK_LIMIT = 15 * MB
+        dv.MEMORY_LIMIT = 512 * MB
+        args = parse_args([
+            '--download-workers', '2', '--upload-workers', '2',
+            '--per-channel-transfers', '3', '--retry-delay', '0.1'
+        ])
+        client = FailingOnceTelegramClient(latency=0.001)
+        client.add_videos(-1001000000000, 1, [10 * MB] * 3)
+        channels = [(-1001000000000, 1, 'Tests/admission')]
+
+        stats, _, _ = asyncio.run(asyncio.wait_for(
+            sync_channels([client], FakeDriveHttp(), channels, args), timeout=60
+        ))
+
+        self.assertTrue(client.failed)
+        self.assertEqual(stats['downloaded'], 3)
+
+    def test_resumed_parallel_download_reserves_missing_bytes(self):
+        # Параллельное скачивание создает разреженный файл полного размера:
+        # занято только скачанное, а резервировать нужно остальное
+        dv.TEMP_DISK_LIMIT = 40 * MB
+        client = FakeTelegramClient()
+        message = client.add_videos(-1001000000000, 1, [10 * MB])[0]
+
+        async def scenario():
+            progress = DownloadProgress(dv.PROGRESS_DB)
+            pipeline = dv.TransferPipeline(progress, transfer_mode='file')
+            task = dv.VideoTask(message, -1001000000000, 1, 1, 'video.mp4', 'video/mp4', None, {})
+            path = pipeline._partial_path(task)
+            os.makedirs(dv.PARTIAL_DIR, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(bytes(4 * MB))
+                f.truncate(10 * MB)
+            progress.save_transfer(
+                task.chat_id, task.topic_id, message.id,
+                temp_path=path, total_size=10 * MB, downloaded_bytes=4 * MB,
+                upload_session_uri=None, uploaded_bytes=0
+            )
+            pipeline.admission = AdmissionController(disk_capacity=pipeline._temp_disk_capacity())
+            try:
+                self.assertLessEqual(pipeline.admission.disk_capacity, 36 * MB)
+                self.assertGreaterEqual(pipeline.admission.disk_capacity, 35 * MB)
+
+                self.assertTrue(await pipeline._reserve_disk(task))
+                self.assertEqual(pipeline.admission.disk_reserved, 6 * MB)
+
+                # Файл неудачного видео остается на диске вместе со своим местом
+                task.finish()
+                await asyncio.sleep(0)
+                self.assertEqual(pipeline.admission.disk_reserved, 6 * MB)
+
+                retry = dv.VideoTask(message, -1001000000000, 1, 1, 'video.mp4', 'video/mp4', None, {})
+                self.assertTrue(await pipeline._reserve_disk(retry))
+                self.assertEqual(pipeline.admission.disk_reserved, 6 * MB)
+
+                retry.succeeded = True
+                retry.temp_filepath = path
+                retry.finish()
+                await asyncio.sleep(0)
+                self.assertEqual(pipeline.admission.disk_reserved, 0)
+            finally:
+                progress.close()
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
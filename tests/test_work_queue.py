@@ -0,0 +1,48 @@
+"""
+Общая очередь видео распределенного режима.
+
+Запуск из корня репозитория:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work_queue import ITEM_FAILED, ITEM_PENDING, WorkItem, open_work_queue
+
+
+class SQLiteWorkQueueTest(unittest.TestCase):
+    """Неудачные видео и их возврат в очередь."""
+
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory(prefix='tvd-test-')
+        self.queue = open_work_queue(os.path.join(self._workdir.name, 'queue.db'), max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        self._workdir.cleanup()
+
+    def test_failed_items_are_retried_when_coordinator_starts(self):
+        items = [WorkItem(-1001, 1, message_id, 'Tests', f"video_{message_id}.mp4", 'video/mp4')
+                 for message_id in (1, 2)]
+        self.assertEqual(self.queue.enqueue(items), 2)
+        for _ in range(2):
+            for item in self.queue.claim('worker', 10, 60):
+                self.queue.release('worker', item.key, 'ошибка')
+        self.assertEqual(self.queue.stats()[ITEM_FAILED], 2)
+        self.assertEqual(self.queue.claim('worker', 10, 60), [])
+
+        self.assertEqual(self.queue.retry_failed(), 2)
+
+        self.assertEqual(self.queue.stats()[ITEM_PENDING], 2)
+        claimed = self.queue.claim('worker', 10, 60)
+        self.assertEqual(sorted(item.message_id for item in claimed), [1, 2])
+        self.assertEqual([item.attempts for item in claimed], [1, 1])
+        self.assertEqual(self.queue.retry_failed(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
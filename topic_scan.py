@@ -0,0 +1,150 @@
+"""
+Сканирование топика Telegram с фильтрацией медиа на стороне сервера.
+"""
+import itertools
+from collections import deque
+from typing import AsyncIterator, Optional
+from telethon import utils
+from telethon.errors import FloodWaitError, RPCError
+from telethon.tl.functions.messages import SearchRequest
+from telethon.tl.types import (
+    InputMessagesFilterDocument, InputMessagesFilterVideo, MessageEmpty
+)
+from rate_limit import TokenBucket
+
+
+# Видео, отправленные как видео, и файлы: видео, отправленные файлом,
+# попадают во второй фильтр вместе с остальными документами
+MEDIA_FILTERS = (InputMessagesFilterVideo, InputMessagesFilterDocument)
+
+# messages.search и messages.getReplies отдают не больше 100 сообщений за запрос
+SEARCH_PAGE_SIZE = 100
+
+
+class ScanStats:
+    """Статистика сканирования топика."""
+
+    def __init__(self, filtered: bool = True):
+        # Используется серверный фильтр (False - перебираются все сообщения)
+        self.filtered = filtered
+        # Сколько сообщений получено от Telegram
+        self.fetched = 0
+        # Сколько из них оказались видео (считает вызывающий)
+        self.matched = 0
+        # Сколько запросов истории выполнено
+        self.requests = 0
+
+
+class _TopicSearch:
+    """Постраничный поиск сообщений топика по одному фильтру, от старых к новым."""
+
+    def __init__(self, client, peer, topic_id: int, media_filter, min_id: int,
+                 page_size: int = SEARCH_PAGE_SIZE):
+        self.client = client
+        self.peer = peer
+        self.page_size = page_size
+        # Как в Telethon при reverse=True: страница из page_size сообщений,
+        # начиная с offset_id, в порядке убывания
+        self.request = SearchRequest(
+            peer=peer,
+            q='',
+            filter=media_filter(),
+            min_date=None,
+            max_date=None,
+            offset_id=min_id + 1,
+            add_offset=-page_size,
+            limit=page_size,
+            max_id=0,
+            min_id=0,
+            hash=0,
+            top_msg_id=topic_id
+        )
+        self.buffer = deque()
+        self.exhausted = False
+        self.last_id = min_id
+
+    async def load(self, stats: ScanStats):
+        """Загружает следующую страницу в буфер."""
+        result = await self.client(self.request)
+        stats.requests += 1
+        stats.fetched += len(result.messages)
+
+        entities = {
+            utils.get_peer_id(entity): entity
+            for entity in itertools.chain(result.users, result.chats)
+        }
+        for message in reversed(result.messages):
+            if isinstance(message, MessageEmpty) or message.id <= self.last_id:
+                continue
+            message._finish_init(self.client, entities, self.peer)
+            self.buffer.append(message)
+            self.last_id = message.id
+
+        # Неполная страница - дошли до последних сообщений топика
+        if not self.buffer or len(result.messages) < self.page_size:
+            self.exhausted = True
+        else:
+            self.request.offset_id = self.last_id + 1
+
+
+async def iter_topic_messages(client, chat_id: int, topic_id: int, min_id: int = 0,
+                              limiter: Optional[TokenBucket] = None,
+                              stats: Optional[ScanStats] = None) -> AsyncIterator:
+    """
+    Перебирает сообщения топика после min_id по возрастанию ID.
+
+    Со stats.filtered Telegram возвращает только сообщения с видео и
+    файлами (поиск по MEDIA_FILTERS в пределах топика), и переписка не
+    запрашивается. Если серверный поиск недоступен (например, для чата
+    без топиков), перебираются все сообщения, а stats.filtered
+    сбрасывается. Отбор видео среди полученных сообщений остается за
+    вызывающим.
+
+    FloodWaitError передается вызывающему: перебор можно продолжить с
+    последнего полученного сообщения.
+    """
+    stats = stats or ScanStats()
+    last_id = min_id
+
+    if stats.filtered:
+        try:
+            peer = await client.get_input_entity(chat_id)
+            searches = [
+                _TopicSearch(client, peer, topic_id, media_filter, min_id)
+                for media_filter in MEDIA_FILTERS
+            ]
+            while True:
+                for search in searches:
+                    if not search.buffer and not search.exhausted:
+                        if limiter:
+                            await limiter.wait()
+                        await search.load(stats)
+
+                # Сливаем результаты фильтров по возрастанию ID
+                ready = [search for search in searches if search.buffer]
+                if not ready:
+                    return
+                search = min(ready, key=lambda search: search.buffer[0].id)
+                message = search.buffer.popleft()
+                if message.id <= last_id:
+                    continue
+                last_id = message.id
+                yield message
+        except FloodWaitError:
+            raise
+        except RPCError as e:
+            print(f"⚠ Серверный фильтр медиа недоступен для топика {topic_id} ({e}), перебираем все сообщения")
+            stats.filtered = False
+
+    async for message in client.iter_messages(
+        chat_id,
+        reply_to=topic_id,
+        reverse=True,
+        min_id=last_id
+    ):
+        if stats.fetched % SEARCH_PAGE_SIZE == 0:
+            stats.requests += 1
+            if limiter:
+                await limiter.wait()
+        stats.fetched += 1
+        yield message
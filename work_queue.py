@@ -0,0 +1,334 @@
+"""
+Общая очередь видео для распределенного режима: координатор ставит видео
+в очередь, воркеры на разных машинах берут их в аренду и передают.
+"""
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+# Видео ждет воркера
+ITEM_PENDING = 'pending'
+# Видео взято воркером в аренду
+ITEM_LEASED = 'leased'
+# Видео передано на Google Drive
+ITEM_DONE = 'done'
+# Попытки исчерпаны; видео вернется в очередь при следующем запуске координатора
+ITEM_FAILED = 'failed'
+
+
+class WorkItem:
+    """Видео в общей очереди."""
+
+    def __init__(self, chat_id: int, topic_id: int, message_id: int, folder_path: str,
+                 filename: str, mime_type: str, size: int = 0, attempts: int = 0):
+        self.chat_id = chat_id
+        self.topic_id = topic_id
+        self.message_id = message_id
+        self.folder_path = folder_path
+        self.filename = filename
+        self.mime_type = mime_type
+        self.size = size
+        # Сколько раз видео выдавалось воркерам (включая текущую аренду)
+        self.attempts = attempts
+
+    @property
+    def key(self) -> Tuple[int, int, int]:
+        """Ключ видео: (chat_id, topic_id, message_id)."""
+        return self.chat_id, self.topic_id, self.message_id
+
+
+class WorkQueue(ABC):
+    """
+    Общая очередь видео с арендой.
+
+    Воркер берет видео в аренду на lease_seconds и продлевает ее через
+    heartbeat, пока передает их. Если воркер пропал, аренда истекает и
+    видео снова выдается воркерам, пока не исчерпано max_attempts попыток.
+    Хранилище очереди подключается через open_work_queue().
+    """
+
+    def __init__(self, max_attempts: int = 3):
+        self.max_attempts = max(1, max_attempts)
+
+    @abstractmethod
+    def enqueue(self, items: List[WorkItem]) -> int:
+        """
+        Ставит видео в очередь. Видео, уже стоящие в очереди или
+        переданные, пропускаются; неудачные ставятся заново.
+
+        Returns:
+            Сколько видео добавлено
+        """
+
+    @abstractmethod
+    def claim(self, worker_id: str, limit: int, lease_seconds: float) -> List[WorkItem]:
+        """Берет в аренду до limit видео (включая видео с истекшей арендой)."""
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, keys: List[Tuple[int, int, int]], lease_seconds: float) -> int:
+        """
+        Продлевает аренду видео воркера.
+
+        Returns:
+            Для скольких видео аренда продлена (остальные уже выданы другим)
+        """
+
+    @abstractmethod
+    def ack(self, worker_id: str, key: Tuple[int, int, int], drive_file_id: Optional[str] = None):
+        """Отмечает видео переданным."""
+
+    @abstractmethod
+    def release(self, worker_id: str, key: Tuple[int, int, int], error: str = '') -> bool:
+        """
+        Возвращает видео в очередь после неудачи.
+
+        Returns:
+            True, если попытки исчерпаны и видео отмечено неудачным
+        """
+
+    @abstractmethod
+    def requeue_expired(self) -> int:
+        """
+        Возвращает в очередь видео с истекшей арендой.
+
+        Returns:
+            Сколько видео возвращено или отмечено неудачными
+        """
+
+    @abstractmethod
+    def retry_failed(self) -> int:
+        """
+        Возвращает в очередь неудачные видео с новым запасом попыток.
+
+        Returns:
+            Сколько видео возвращено
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Число видео в очереди по статусам."""
+
+    def close(self):
+        """Закрывает очередь."""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Очередь в базе SQLite.
+
+    Выдача видео выполняется в транзакции BEGIN IMMEDIATE, поэтому несколько
+    процессов могут работать с одной базой, не получая одно видео дважды.
+    Подходит для воркеров на одной машине или на общем диске с надежными
+    блокировками файлов (сетевые ФС вроде NFS для SQLite не годятся).
+    """
+
+    def __init__(self, db_file: str, max_attempts: int = 3):
+        """
+        Args:
+            db_file: путь к файлу базы SQLite
+            max_attempts: сколько раз видео выдается воркерам до отметки неудачным
+        """
+        super().__init__(max_attempts)
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._init_schema()
+
+    def _init_schema(self):
+        """Создает таблицу очереди и настраивает базу."""
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA busy_timeout=30000')
+            # Порядок выдачи - порядок постановки в очередь (id)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS work_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    topic_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    folder_path TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    size INTEGER,
+                    status TEXT NOT NULL,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    drive_file_id TEXT,
+                    updated_at TEXT NOT NULL,
+                    UNIQUE (chat_id, topic_id, message_id)
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status, id)')
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой записи для всех процессов."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def enqueue(self, items: List[WorkItem]) -> int:
+        if not items:
+            return 0
+        now = datetime.now().isoformat()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany('''
+                INSERT INTO work_items
+                    (chat_id, topic_id, message_id, folder_path, filename, mime_type, size,
+                     status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chat_id, topic_id, message_id) DO UPDATE SET
+                    status = excluded.status,
+                    attempts = 0,
+                    last_error = NULL,
+                    updated_at = excluded.updated_at
+                WHERE work_items.status = ?
+            ''', [
+                (item.chat_id, item.topic_id, item.message_id, item.folder_path,
+                 item.filename, item.mime_type, item.size, ITEM_PENDING, now, ITEM_FAILED)
+                for item in items
+            ])
+            return conn.total_changes - before
+
+    def _requeue_expired(self, conn, now: float) -> int:
+        cursor = conn.execute('''
+            UPDATE work_items SET
+                status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                last_error = 'аренда истекла',
+                worker_id = NULL,
+                lease_expires = NULL,
+                updated_at = ?
+            WHERE status = ? AND lease_expires < ?
+        ''', (self.max_attempts, ITEM_FAILED, ITEM_PENDING,
+              datetime.now().isoformat(), ITEM_LEASED, now))
+        return cursor.rowcount
+
+    def claim(self, worker_id: str, limit: int, lease_seconds: float) -> List[WorkItem]:
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_expired(conn, now)
+            rows = conn.execute('''
+                SELECT id, chat_id, topic_id, message_id, folder_path, filename, mime_type,
+                       size, attempts
+                FROM work_items WHERE status = ? ORDER BY id LIMIT ?
+            ''', (ITEM_PENDING, limit)).fetchall()
+            conn.executemany('''
+                UPDATE work_items SET
+                    status = ?, worker_id = ?, lease_expires = ?, attempts = attempts + 1,
+                    updated_at = ?
+                WHERE id = ?
+            ''', [
+                (ITEM_LEASED, worker_id, now + lease_seconds, datetime.now().isoformat(), row[0])
+                for row in rows
+            ])
+
+        return [
+            WorkItem(row[1], row[2], row[3], row[4], row[5], row[6],
+                     size=row[7] or 0, attempts=row[8] + 1)
+            for row in rows
+        ]
+
+    def heartbeat(self, worker_id: str, keys: List[Tuple[int, int, int]], lease_seconds: float) -> int:
+        if not keys:
+            return 0
+        expires = time.time() + lease_seconds
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany('''
+                UPDATE work_items SET lease_expires = ?
+                WHERE chat_id = ? AND topic_id = ? AND message_id = ?
+                    AND status = ? AND worker_id = ?
+            ''', [(expires, *key, ITEM_LEASED, worker_id) for key in keys])
+            return conn.total_changes - before
+
+    def ack(self, worker_id: str, key: Tuple[int, int, int], drive_file_id: Optional[str] = None):
+        # Видео отмечается переданным, даже если аренда успела перейти к другому воркеру
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE work_items SET
+                    status = ?, drive_file_id = ?, worker_id = ?, lease_expires = NULL,
+                    last_error = NULL, updated_at = ?
+                WHERE chat_id = ? AND topic_id = ? AND message_id = ?
+            ''', (ITEM_DONE, drive_file_id, worker_id, datetime.now().isoformat(), *key))
+
+    def release(self, worker_id: str, key: Tuple[int, int, int], error: str = '') -> bool:
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE work_items SET
+                    status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                    worker_id = NULL, lease_expires = NULL, last_error = ?, updated_at = ?
+                WHERE chat_id = ? AND topic_id = ? AND message_id = ?
+                    AND status = ? AND worker_id = ?
+            ''', (self.max_attempts, ITEM_FAILED, ITEM_PENDING, error[:500],
+                  datetime.now().isoformat(), *key, ITEM_LEASED, worker_id))
+            row = conn.execute(
+                'SELECT status FROM work_items WHERE chat_id = ? AND topic_id = ? AND message_id = ?',
+                key
+            ).fetchone()
+        return row is not None and row[0] == ITEM_FAILED
+
+    def requeue_expired(self) -> int:
+        with self._transaction() as conn:
+            return self._requeue_expired(conn, time.time())
+
+    def retry_failed(self) -> int:
+        with self._transaction() as conn:
+            cursor = conn.execute('''
+                UPDATE work_items SET
+                    status = ?, worker_id = NULL, lease_expires = NULL,
+                    attempts = 0, last_error = NULL, updated_at = ?
+                WHERE status = ?
+            ''', (ITEM_PENDING, datetime.now().isoformat(), ITEM_FAILED))
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM work_items GROUP BY status').fetchall()
+        counts = {status: 0 for status in (ITEM_PENDING, ITEM_LEASED, ITEM_DONE, ITEM_FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Хранилища очереди по схеме адреса: sqlite:///queue.db (относительный путь)
+# или sqlite:////var/lib/queue.db (абсолютный), как в SQLAlchemy
+WORK_QUEUE_BACKENDS = {
+    'sqlite': SQLiteWorkQueue,
+}
+
+
+def open_work_queue(url: str, max_attempts: int = 3) -> WorkQueue:
+    """
+    Открывает общую очередь по адресу вида 'схема://расположение'.
+
+    Адрес без схемы считается путем к базе SQLite.
+    """
+    scheme, separator, location = url.partition('://')
+    if not separator:
+        scheme, location = 'sqlite', url
+    elif scheme == 'sqlite':
+        # Третья косая черта отделяет пустой адрес хоста от пути
+        location = location[1:] if location.startswith('/') else location
+    backend = WORK_QUEUE_BACKENDS.get(scheme)
+    if backend is None:
+        raise ValueError(f"Неизвестное хранилище очереди: {scheme} (доступно: {', '.join(WORK_QUEUE_BACKENDS)})")
+    return backend(location, max_attempts=max_attempts)